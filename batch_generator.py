@@ -0,0 +1,362 @@
+"""Offline bulk pre-generation of papers through the Message Batches API
+
+Usage:
+    python batch_generator.py --boards CBSE --grades 9 10       # plan, submit, poll and store
+    python batch_generator.py --once                            # one submit/poll pass, for cron
+    python batch_generator.py --status                          # progress from the state file
+    python batch_generator.py --api-url http://127.0.0.1:8765/v1/messages   # against a local stub
+
+Prompts are built with the same functions as interactive generation, so every
+stored paper lands in the paper cache under the key generate_questions looks
+up. Papers from any --api-url other than the real API are stored in a separate
+cache directory (paper_cache.cache_dir_for_api), never among production papers.
+Progress is kept in a state file that is rewritten atomically after every
+step; rerunning the command after a crash picks up the submitted batches and
+the papers that are still pending instead of starting again.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from src.components.claude_client import get_claude_client
+from src.components.paper_cache import PaperCache, cache_dir_for_api, make_cache_key
+from src.components.prompt_cache import cached_system_blocks, PROMPT_CACHING_BETA
+from src.components.usage_store import get_usage_store
+from src.components.mock_test_creator import (
+    CLAUDE_API_URL,
+    CLAUDE_MODEL,
+    PROMPT_TEMPLATE_VERSION,
+    get_api_headers,
+    get_comprehensive_curriculum_topics,
+    get_paper_types_by_board_and_grade,
+    get_question_counts,
+    select_model,
+    plan_generation_shards,
+    build_system_prompt,
+    build_generation_prompt,
+    estimate_max_tokens,
+    parse_generation_content,
+    remaining_question_counts,
+    merge_question_shards,
+    build_test_info
+)
+
+MESSAGE_BATCHES_BETA = "message-batches-2024-09-24"
+BATCH_STATE_FILE = os.environ.get("BATCH_STATE_FILE", ".batch_state.json")
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "5000"))
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", "60"))
+# Each round requests whatever a paper is still missing; give up on a paper after this many
+BATCH_MAX_ROUNDS = int(os.environ.get("BATCH_MAX_ROUNDS", "4"))
+
+PENDING = "pending"
+SUBMITTED = "submitted"
+STORED = "stored"
+FAILED = "failed"
+
+
+def batch_headers(api_key=None):
+    headers = get_api_headers()
+    headers["anthropic-beta"] = f"{PROMPT_CACHING_BETA},{MESSAGE_BATCHES_BETA}"
+    if api_key:
+        headers["x-api-key"] = api_key
+    return headers
+
+
+def enumerate_papers(boards=None, grades=None, subjects=None, paper_type_filter=None):
+    """Yield every (board, grade, subject, topic, paper_type) in the curriculum database"""
+    curriculum = get_comprehensive_curriculum_topics()
+    for board, board_subjects in curriculum.items():
+        if boards and board not in boards:
+            continue
+        for subject, subject_grades in board_subjects.items():
+            if subjects and subject not in subjects:
+                continue
+            for grade, topics in subject_grades.items():
+                if grades and grade not in grades:
+                    continue
+                for paper_type in get_paper_types_by_board_and_grade(board, grade):
+                    if paper_type_filter and paper_type_filter.lower() not in paper_type.lower():
+                        continue
+                    for topic in topics:
+                        yield board, grade, subject, topic, paper_type
+
+
+def request_id(paper_key, shard_index):
+    # custom_id must match ^[a-zA-Z0-9_-]{1,64}$
+    return f"{paper_key[:56]}-{shard_index}"
+
+
+class BatchRun:
+    """Resumable bulk generation: state file, batch submission, polling and result storage"""
+
+    def __init__(self, state_file=BATCH_STATE_FILE, api_url=CLAUDE_API_URL, api_key=None,
+                 batch_size=BATCH_MAX_REQUESTS, max_rounds=BATCH_MAX_ROUNDS):
+        self.state_file = state_file
+        self.api_url = api_url
+        self.batches_url = api_url.rstrip("/") + "/batches"
+        self.headers = batch_headers(api_key)
+        self.batch_size = batch_size
+        self.max_rounds = max_rounds
+        self.client = get_claude_client()
+        self.paper_cache = PaperCache(cache_dir_for_api(api_url))
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return self._empty_state()
+
+    def _empty_state(self):
+        return {"model": CLAUDE_MODEL, "template_version": PROMPT_TEMPLATE_VERSION, "papers": {}, "batches": {}}
+
+    def reset(self):
+        self.state = self._empty_state()
+        self.save()
+
+    def save(self):
+        # Write to a temp file and rename so a crash never leaves a half-written state file
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+            json.dump(self.state, temp_file)
+        os.replace(temp_path, self.state_file)
+
+    def is_compatible(self):
+        """False if the state was written for another model or prompt version"""
+        return (self.state.get("model") == CLAUDE_MODEL
+                and self.state.get("template_version") == PROMPT_TEMPLATE_VERSION)
+
+    def plan(self, combinations, limit=None):
+        """Add papers that are neither tracked yet nor already in the paper cache"""
+        added = 0
+        for board, grade, subject, topic, paper_type in combinations:
+            if limit is not None and added >= limit:
+                break
+            # Same routing as interactive generation, so the stored paper is found under the same cache key
+            model = select_model(grade, paper_type)["model"]
+            key = make_cache_key(board, grade, subject, topic, paper_type, model, PROMPT_TEMPLATE_VERSION, self.api_url)
+            if key in self.state["papers"] or self.paper_cache.contains(key):
+                continue
+            shards = plan_generation_shards(*get_question_counts(paper_type))
+            self.state["papers"][key] = {
+                "board": board, "grade": grade, "subject": subject, "topic": topic, "paper_type": paper_type, "model": model,
+                "shards": [list(shard) for shard in shards],
+                "questions": [[] for _ in shards],
+                "status": PENDING, "rounds": 0, "error": None
+            }
+            added += 1
+        self.save()
+        return added
+
+    def _paper_requests(self, key, paper):
+        """Batch requests for whatever each shard of a paper is still missing"""
+        system_prompt = build_system_prompt(paper["board"], paper["grade"], paper["subject"])
+        requests_for_paper = []
+        for shard_index, shard in enumerate(paper["shards"]):
+            have = paper["questions"][shard_index]
+            remaining = remaining_question_counts(shard, have)
+            if not any(remaining):
+                continue
+            prompt = build_generation_prompt(
+                paper["board"], paper["grade"], paper["subject"], paper["topic"], paper["paper_type"], *remaining,
+                exclude_questions=[question.get("question", "") for question in have] or None
+            )
+            requests_for_paper.append({
+                "custom_id": request_id(key, shard_index),
+                "params": {
+                    "model": paper["model"],
+                    "max_tokens": estimate_max_tokens(*remaining),
+                    "system": cached_system_blocks(system_prompt, paper["model"]),
+                    "messages": [{"role": "user", "content": prompt}]
+                }
+            })
+        return requests_for_paper
+
+    def submit_pending(self):
+        """Submit pending papers as batches of at most batch_size requests; returns the batch ids"""
+        submitted = []
+        batch_requests = []
+        batch_papers = []
+
+        def flush():
+            if not batch_requests:
+                return
+            response = self.client.post(self.batches_url, headers=self.headers, json={"requests": batch_requests}, timeout=120)
+            if response.status_code != 200:
+                raise RuntimeError(f"Batch submission failed with {response.status_code}: {response.text[:200]}")
+            batch_id = response.json()["id"]
+            self.state["batches"][batch_id] = {"papers": list(batch_papers), "status": "in_progress", "submitted_at": time.time()}
+            for key in batch_papers:
+                self.state["papers"][key]["status"] = SUBMITTED
+                self.state["papers"][key]["rounds"] += 1
+            # Saved straight away so a crash after this point resumes by polling, not resubmitting
+            self.save()
+            submitted.append(batch_id)
+            batch_requests.clear()
+            batch_papers.clear()
+
+        for key, paper in self.state["papers"].items():
+            if paper["status"] != PENDING:
+                continue
+            paper_requests = self._paper_requests(key, paper)
+            # A paper's shards always travel in the same batch
+            if batch_requests and len(batch_requests) + len(paper_requests) > self.batch_size:
+                flush()
+            batch_requests.extend(paper_requests)
+            batch_papers.append(key)
+        flush()
+        return submitted
+
+    def poll(self):
+        """Check every open batch once and store the results of those that ended"""
+        for batch_id, batch in self.state["batches"].items():
+            if batch["status"] != "in_progress":
+                continue
+            response = self.client.get(f"{self.batches_url}/{batch_id}", headers=self.headers, timeout=60)
+            if response.status_code != 200:
+                print(f"  {batch_id}: status check failed ({response.status_code})")
+                continue
+            info = response.json()
+            if info.get("processing_status") != "ended":
+                counts = info.get("request_counts", {})
+                print(f"  {batch_id}: {counts.get('processing', '?')} processing, {counts.get('succeeded', 0)} succeeded")
+                continue
+            self._apply_results(batch_id, batch, info.get("results_url") or f"{self.batches_url}/{batch_id}/results")
+
+    def _fetch_results(self, results_url):
+        response = self.client.get(results_url, headers=self.headers, timeout=300, stream=True)
+        if response.status_code != 200:
+            raise RuntimeError(f"Fetching batch results failed with {response.status_code}")
+        results = {}
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            entry = json.loads(line)
+            result = entry.get("result", {})
+            if result.get("type") == "succeeded":
+                message = result.get("message", {})
+                content = "".join(block.get("text", "") for block in message.get("content", []) if block.get("type") == "text")
+                parsed, error = parse_generation_content(content, message.get("stop_reason"))
+                results[entry["custom_id"]] = (parsed, error, message.get("usage"))
+            else:
+                error = result.get("error", {})
+                message = error.get("error", error).get("message", "") if isinstance(error, dict) else str(error)
+                results[entry["custom_id"]] = (None, f"{result.get('type', 'unknown')}: {message}".rstrip(": "), None)
+        return results
+
+    def _apply_results(self, batch_id, batch, results_url):
+        results = self._fetch_results(results_url)
+        for key in batch["papers"]:
+            paper = self.state["papers"][key]
+            errors = []
+            for shard_index in range(len(paper["shards"])):
+                custom_id = request_id(key, shard_index)
+                if custom_id not in results:
+                    continue
+                parsed, error, usage = results[custom_id]
+                if parsed is None:
+                    outcome = "parse_error" if usage else "errored"
+                else:
+                    outcome = "truncated" if parsed.get("truncated") else ("rejected" if parsed.get("rejected") else "ok")
+                # Batch latency is the turnaround from submission, not the model's own time
+                get_usage_store().record(
+                    paper["model"], usage, time.time() - batch.get("submitted_at", time.time()), outcome,
+                    questions=len(parsed["questions"]) if parsed else 0,
+                    labels={"paper_id": key, "board": paper["board"], "grade": paper["grade"],
+                            "subject": paper["subject"], "paper_type": paper["paper_type"]},
+                    kind="batch", batch=True
+                )
+                if parsed is None:
+                    errors.append(error)
+                else:
+                    paper["questions"][shard_index].extend(parsed["questions"])
+            self._settle(key, paper, errors)
+        batch["status"] = "processed"
+        self.save()
+
+    def _settle(self, key, paper, errors):
+        """Store a complete paper, or queue the missing questions for the next round"""
+        incomplete = any(any(remaining_question_counts(shard, questions))
+                         for shard, questions in zip(paper["shards"], paper["questions"]))
+        if not incomplete:
+            questions = merge_question_shards(paper["questions"])
+            test_data = {
+                "test_info": build_test_info(paper["board"], paper["grade"], paper["subject"], paper["topic"],
+                                             paper["paper_type"], questions, False),
+                "questions": questions
+            }
+            self.paper_cache.put(key, test_data)
+            paper.update({"status": STORED, "questions": [], "error": None})
+        elif paper["rounds"] >= self.max_rounds:
+            paper.update({"status": FAILED, "error": "; ".join(errors) or "paper still incomplete after the last round"})
+        else:
+            # Truncated, malformed or errored shards are requested again without the questions we already have
+            paper.update({"status": PENDING, "error": "; ".join(errors) or None})
+
+    def outstanding(self):
+        return any(batch["status"] == "in_progress" for batch in self.state["batches"].values())
+
+    def counts(self):
+        counts = {PENDING: 0, SUBMITTED: 0, STORED: 0, FAILED: 0}
+        for paper in self.state["papers"].values():
+            counts[paper["status"]] += 1
+        counts["open_batches"] = sum(1 for batch in self.state["batches"].values() if batch["status"] == "in_progress")
+        return counts
+
+    def run(self, poll_seconds=BATCH_POLL_SECONDS, once=False):
+        while True:
+            self.poll()
+            self.submit_pending()
+            counts = self.counts()
+            print(f"{counts[STORED]} stored, {counts[SUBMITTED]} in batches, {counts[PENDING]} pending, "
+                  f"{counts[FAILED]} failed ({counts['open_batches']} open batches)")
+            if once or not self.outstanding():
+                return counts
+            time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boards", nargs="+", help="limit to these boards")
+    parser.add_argument("--grades", nargs="+", type=int, help="limit to these grades")
+    parser.add_argument("--subjects", nargs="+", help="limit to these subjects")
+    parser.add_argument("--paper-type", help="only paper types containing this text")
+    parser.add_argument("--limit", type=int, help="plan at most this many new papers")
+    parser.add_argument("--state-file", default=BATCH_STATE_FILE)
+    parser.add_argument("--api-url", default=CLAUDE_API_URL, help="Messages API URL (batches live under <url>/batches)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_REQUESTS, help="maximum requests per batch")
+    parser.add_argument("--poll-seconds", type=float, default=BATCH_POLL_SECONDS)
+    parser.add_argument("--once", action="store_true", help="run a single poll/submit pass and exit")
+    parser.add_argument("--status", action="store_true", help="print progress from the state file and exit")
+    parser.add_argument("--fresh", action="store_true", help="discard a state file written for another model or prompt version")
+    args = parser.parse_args()
+
+    run = BatchRun(state_file=args.state_file, api_url=args.api_url, api_key=os.environ.get("CLAUDE_API_KEY"),
+                   batch_size=args.batch_size)
+
+    if args.status:
+        print(json.dumps(run.counts(), indent=2))
+        return 0
+
+    if not run.is_compatible():
+        if not args.fresh:
+            print(f"{args.state_file} was written for {run.state.get('model')} / {run.state.get('template_version')}; "
+                  f"rerun with --fresh to start over for {CLAUDE_MODEL} / {PROMPT_TEMPLATE_VERSION}")
+            return 1
+        run.reset()
+
+    added = run.plan(enumerate_papers(args.boards, args.grades, args.subjects, args.paper_type), limit=args.limit)
+    print(f"Planned {added} new papers ({len(run.state['papers'])} tracked in {args.state_file}, "
+          f"stored in {run.paper_cache.cache_dir})")
+
+    counts = run.run(poll_seconds=args.poll_seconds, once=args.once)
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Per-rerun cost of the curriculum lookups: rebuilding the tables on every call vs the shared index
+
+Usage:
+    python benchmark_curriculum_index.py
+    python benchmark_curriculum_index.py --reruns 5000
+    python benchmark_curriculum_index.py --reload-seconds 0    # hot-reload check on every lookup
+
+One rerun is what the create_test form and the dashboard do each time Streamlit
+re-executes the script: subjects for the grade, topics for the subject, topic
+validation (falling back to keyword relevance when the curriculum has no topics)
+and the curriculum totals. "before" replays the previous code, which built the
+dict literals on every call (the literals are compiled from curriculum_data/ and
+evaluated per lookup); "after" goes through the public functions, which read the
+index loaded once per process.
+
+"after" includes what the app does on every lookup at the configured settings:
+the hot-reload check (CURRICULUM_RELOAD_SECONDS), the validation cache and, when
+CURRICULUM_SNAPSHOT_FILE is set, the snapshot. The settings are printed with the
+results. "reload/0" repeats "after" with the reload check on every lookup, which
+stats every curriculum file each time and costs more than the lookups themselves.
+"""
+import argparse
+import time
+import tracemalloc
+from collections.abc import Mapping
+
+from src.components.mock_test_creator import (
+    get_available_subjects,
+    get_topics_by_board_grade_subject,
+    validate_topic_against_curriculum,
+    get_curriculum_index,
+    get_curriculum_source
+)
+from src.components.curriculum_store import get_curriculum_store
+from src.components.curriculum_snapshot import CURRICULUM_SNAPSHOT_FILE
+from src.components.model_ab_test import SAMPLE_SELECTIONS
+
+# IB passes its grade as a display string, and Sciences has no topic list so validation uses keywords
+SELECTIONS = SAMPLE_SELECTIONS + [
+    {"board": "IB", "grade": "Grade 9 (MYP)", "subject": "Sciences", "topic": "Photosynthesis"}
+]
+
+# Filled in by main() from compile_literals()
+LITERALS = None
+
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def compile_literals():
+    """Code objects that build each table the way the old literal functions did"""
+    index = get_curriculum_index()
+    return {
+        name: compile(repr(_thaw(table)), f"<{name}>", "eval")
+        for name, table in (("subjects", index.subjects_by_board), ("topics", index.curriculum_topics),
+                            ("keywords", index.subject_keywords))
+    }
+
+
+def _grade_number(board, grade):
+    if board == "IB" and isinstance(grade, str):
+        try:
+            return int(grade.split()[1])
+        except (IndexError, ValueError):
+            return None
+    return grade
+
+
+def _keyword_matches(topic_clean, keywords):
+    return [keyword for keyword in keywords if str(keyword).lower() in topic_clean or topic_clean in str(keyword).lower()]
+
+
+def rerun_before(selection):
+    """The previous code path: every lookup builds the literal tables again"""
+    board, grade, subject, topic = selection["board"], selection["grade"], selection["subject"], selection["topic"]
+    grade_num = _grade_number(board, grade)
+    eval(LITERALS["subjects"]).get(board, {}).get(grade_num, [])
+    eval(LITERALS["topics"]).get(board, {}).get(subject, {}).get(grade_num, [])
+    # validate_topic_against_curriculum looked the topics up a second time
+    topics = eval(LITERALS["topics"]).get(board, {}).get(subject, {}).get(grade_num, [])
+    topic_clean = topic.lower().strip()
+    if topics:
+        [t for t in topics if t.lower() in topic_clean or topic_clean in t.lower()]
+    else:
+        _keyword_matches(topic_clean, eval(LITERALS["keywords"]).get(subject, []))
+    curriculum = eval(LITERALS["topics"])
+    sum(len(grade_topics) for board_subjects in curriculum.values()
+        for subject_grades in board_subjects.values() for grade_topics in subject_grades.values())
+
+
+def rerun_after(selection):
+    board, grade, subject, topic = selection["board"], selection["grade"], selection["subject"], selection["topic"]
+    get_available_subjects(board, grade)
+    get_topics_by_board_grade_subject(board, grade, subject)
+    validate_topic_against_curriculum(board, grade, subject, topic)
+    dict(get_curriculum_source().totals)
+
+
+def measure(rerun, reruns):
+    """Mean microseconds per rerun and peak KB allocated during one rerun"""
+    # One pass first, so lazily built topic indexes and cold validation caches are not timed
+    for selection in SELECTIONS:
+        rerun(selection)
+    started = time.perf_counter()
+    for index in range(reruns):
+        rerun(SELECTIONS[index % len(SELECTIONS)])
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    rerun(SELECTIONS[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds / reruns * 1_000_000, peak / 1024
+
+
+def main():
+    global LITERALS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=2000, help="simulated reruns per variant")
+    parser.add_argument("--reload-seconds", help="override CURRICULUM_RELOAD_SECONDS for this run (\"off\" never checks)")
+    args = parser.parse_args()
+
+    store = get_curriculum_store()
+    if args.reload_seconds is not None:
+        store.reload_seconds = None if args.reload_seconds.lower() in ("off", "false", "") else float(args.reload_seconds)
+
+    started = time.perf_counter()
+    index = get_curriculum_index()
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"index: {index.totals['total_boards']} boards, {index.totals['total_topics']} topics, loaded in {build_ms:.1f} ms (once per process)")
+    reload_label = "off" if store.reload_seconds is None else f"every {store.reload_seconds:g}s"
+    print(f"settings: reload check {reload_label}, snapshot {CURRICULUM_SNAPSHOT_FILE or 'off'}")
+    LITERALS = compile_literals()
+
+    before_us, before_kb = measure(rerun_before, args.reruns)
+    after_us, after_kb = measure(rerun_after, args.reruns)
+    configured = store.reload_seconds
+    store.reload_seconds = 0.0
+    # Reschedules the next check for now instead of up to CURRICULUM_RELOAD_SECONDS later
+    store.reload()
+    try:
+        stat_us, stat_kb = measure(rerun_after, args.reruns)
+    finally:
+        store.reload_seconds = configured
+    print(f"{'variant':<10}{'us/rerun':>12}{'peak KB':>10}")
+    print(f"{'before':<10}{before_us:>12.1f}{before_kb:>10.1f}")
+    print(f"{'after':<10}{after_us:>12.1f}{after_kb:>10.1f}")
+    print(f"{'reload/0':<10}{stat_us:>12.1f}{stat_kb:>10.1f}")
+    print(f"after is {before_us / after_us:.1f}x faster per rerun than before")
+
+
+if __name__ == "__main__":
+    main()
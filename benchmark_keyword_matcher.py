@@ -0,0 +1,116 @@
+"""Topic relevance over thousands of topics: two-way substring loops vs the Aho–Corasick matcher
+
+Usage:
+    python benchmark_keyword_matcher.py
+    python benchmark_keyword_matcher.py --topics 20000 --seed 7
+
+Topics are every curriculum topic plus keywords, keyword fragments, phrases
+around keywords and unrelated text, each paired with a keyword subject, Science,
+Social Science or an unknown subject. Every topic is checked with the previous
+loop and with the matcher; any difference in the decision or the matched
+keywords is printed and makes the run exit 1.
+"""
+import argparse
+import random
+import time
+
+from src.components.mock_test_creator import get_curriculum_index
+from src.components.keyword_matcher import SCIENCE_SUBJECTS, SOCIAL_SCIENCE_SUBJECTS
+
+FILLER = ("introduction to", "advanced", "basics of", "worksheet on", "revision:", "applications of", "xyzzy", "test")
+
+
+def legacy_relevance(topic, subject, keywords_dict):
+    """The previous check_topic_relevance loop, returning the keywords it matched"""
+    topic_clean = str(topic).lower().strip()
+    matched_keywords = []
+    for keyword in keywords_dict.get(subject, []):
+        keyword_clean = str(keyword).lower()
+        if keyword_clean in topic_clean or topic_clean in keyword_clean:
+            matched_keywords.append(keyword)
+    for group_subject, members in (("Science", SCIENCE_SUBJECTS), ("Social Science", SOCIAL_SCIENCE_SUBJECTS)):
+        in_group = subject == "Science" if group_subject == "Science" else "Social Science" in subject
+        if matched_keywords or not in_group:
+            continue
+        for member in members:
+            for keyword in keywords_dict.get(member, []):
+                keyword_clean = str(keyword).lower()
+                if keyword_clean in topic_clean or topic_clean in keyword_clean:
+                    matched_keywords.append(keyword)
+                    break
+            if matched_keywords:
+                break
+    return bool(matched_keywords), matched_keywords
+
+
+def sample_topics(index, count, seed):
+    rng = random.Random(seed)
+    keywords_dict = index.subject_keywords
+    subjects = list(keywords_dict) + ["Science", "Social Science", "Unknown Subject"]
+    curriculum = [topic for board_subjects in index.curriculum_topics.values()
+                  for grades in board_subjects.values() for topics in grades.values() for topic in topics]
+    keywords = [keyword for subject_keywords in keywords_dict.values() for keyword in subject_keywords]
+    samples = [(topic, rng.choice(subjects)) for topic in curriculum]
+    while len(samples) < count:
+        keyword = rng.choice(keywords)
+        shape = rng.randrange(4)
+        if shape == 0:
+            topic = keyword
+        elif shape == 1:
+            start = rng.randrange(len(keyword))
+            topic = keyword[start:start + rng.randint(3, 8)]
+        elif shape == 2:
+            topic = f"{rng.choice(FILLER)} {keyword.title()} {rng.choice(FILLER)}"
+        else:
+            topic = " ".join(rng.choice(FILLER) for _ in range(3))
+        samples.append((topic, rng.choice(subjects)))
+    return samples[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--topics", type=int, default=5000, help="topic/subject pairs to check")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    index = get_curriculum_index()
+    started = time.perf_counter()
+    matcher = index.keyword_matcher
+    build_ms = (time.perf_counter() - started) * 1000
+    samples = sample_topics(index, args.topics, args.seed)
+    keywords_dict = index.subject_keywords
+
+    legacy, current = [], []
+    # category -> [topics, loop seconds, matcher seconds]; fallback subjects scan several keyword lists
+    timings = {}
+    for topic, subject in samples:
+        category = subject if subject in ("Science", "Social Science") else "other subjects"
+        row = timings.setdefault(category, [0, 0.0, 0.0])
+        started = time.perf_counter()
+        legacy.append(legacy_relevance(topic, subject, keywords_dict))
+        middle = time.perf_counter()
+        current.append(matcher.relevance(topic, subject))
+        row[0] += 1
+        row[1] += middle - started
+        row[2] += time.perf_counter() - middle
+
+    mismatches = 0
+    for (topic, subject), (legacy_match, legacy_keywords), (match, hits) in zip(samples, legacy, current):
+        if legacy_match != match or legacy_keywords != [keyword for keyword, _, _ in hits]:
+            mismatches += 1
+            if mismatches <= 10:
+                print(f"mismatch: {topic!r} / {subject}: {legacy_keywords} vs {hits}")
+
+    relevant = sum(1 for match, _ in current if match)
+    print(f"{len(samples)} topics ({relevant} relevant), automata compiled in {build_ms:.1f} ms (once per index)")
+    print(f"{'subject':<16}{'topics':>8}{'loops us':>10}{'matcher us':>12}{'speedup':>9}")
+    timings["all"] = [sum(row[column] for row in timings.values()) for column in range(3)]
+    for category, (count, legacy_seconds, matcher_seconds) in timings.items():
+        print(f"{category:<16}{count:>8}{legacy_seconds / count * 1_000_000:>10.1f}"
+              f"{matcher_seconds / count * 1_000_000:>12.1f}{legacy_seconds / matcher_seconds:>8.1f}x")
+    print(f"{mismatches} mismatch(es)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,170 @@
+"""Compare output tokens per question for the verbose and compact paper formats
+
+Usage:
+    python benchmark_wire_schema.py                  # sample paper, ~4 characters per token
+    python benchmark_wire_schema.py --cache-dir .paper_cache
+    python benchmark_wire_schema.py --count-tokens   # exact counts from the token counting API
+
+Papers are read from the paper cache when available, so the numbers reflect
+real generated content; otherwise a small built-in sample paper is used.
+"""
+import argparse
+import json
+import os
+
+import requests
+
+from src.components.compact_schema import dump_compact
+from src.components.paper_cache import PAPER_CACHE_DIR
+
+SAMPLE_PAPER = {
+    "test_info": {
+        "board": "CBSE",
+        "grade": "10",
+        "subject": "Science",
+        "topic": "Chemical Reactions and Equations",
+        "paper_type": "Unit Test",
+        "total_questions": 4,
+        "mcq_count": 2,
+        "short_count": 1,
+        "long_count": 1,
+        "show_answers_on_screen": False
+    },
+    "questions": [
+        {
+            "question_number": 1,
+            "type": "mcq",
+            "question": "Which of the following is an example of a decomposition reaction?",
+            "options": {
+                "A": "2H2 + O2 -> 2H2O",
+                "B": "CaCO3 -> CaO + CO2",
+                "C": "Zn + CuSO4 -> ZnSO4 + Cu",
+                "D": "NaOH + HCl -> NaCl + H2O"
+            },
+            "correct_answer": "B",
+            "explanation": "Calcium carbonate breaks down into two simpler substances when heated."
+        },
+        {
+            "question_number": 2,
+            "type": "mcq",
+            "question": "What is observed when an iron nail is kept in copper sulphate solution for some time?",
+            "options": {
+                "A": "The solution turns green and a brown coating forms on the nail",
+                "B": "The solution turns colourless",
+                "C": "The nail dissolves completely",
+                "D": "No change is observed"
+            },
+            "correct_answer": "A",
+            "explanation": "Iron displaces copper, forming green ferrous sulphate and depositing copper on the nail."
+        },
+        {
+            "question_number": 3,
+            "type": "short",
+            "question": "Why should a magnesium ribbon be cleaned before burning it in air?",
+            "sample_answer": "Magnesium reacts with air to form a layer of magnesium oxide that prevents burning; cleaning removes it.",
+            "marks": 3
+        },
+        {
+            "question_number": 4,
+            "type": "long",
+            "question": "Explain oxidation and reduction with the example of copper oxide reacting with hydrogen.",
+            "sample_answer": "When heated copper oxide reacts with hydrogen, copper oxide loses oxygen and is reduced to copper while hydrogen gains oxygen and is oxidised to water. Both processes happen together, so it is a redox reaction.",
+            "marks": 6
+        }
+    ]
+}
+
+
+def load_papers(cache_dir):
+    papers = []
+    if cache_dir and os.path.isdir(cache_dir):
+        for entry in sorted(os.scandir(cache_dir), key=lambda entry: entry.name):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as cache_file:
+                    test_data = json.load(cache_file).get("test_data")
+            except (OSError, json.JSONDecodeError):
+                continue
+            if test_data and test_data.get("questions"):
+                papers.append(test_data)
+    return papers or [SAMPLE_PAPER]
+
+
+def verbose_text(test_data):
+    """The paper as the previous prompt asked for it: pretty-printed with test_info"""
+    return json.dumps(test_data, indent=4, ensure_ascii=False)
+
+
+def estimate_tokens(text):
+    return len(text) / 4
+
+
+def make_api_counter(api_url, api_key, model):
+    """Count tokens for text as an assistant turn via the token counting endpoint"""
+    url = api_url.rstrip("/") + "/count_tokens"
+    headers = {
+        "Content-Type": "application/json",
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+        "anthropic-beta": "token-counting-2024-11-01"
+    }
+
+    def count(text):
+        body = {"model": model, "messages": [{"role": "user", "content": "Paper"}, {"role": "assistant", "content": text}]}
+        response = requests.post(url, headers=headers, json=body, timeout=30)
+        response.raise_for_status()
+        return response.json()["input_tokens"]
+
+    # Subtract the fixed cost of the wrapper messages
+    baseline = count("{}") - estimate_tokens("{}")
+    return lambda text: count(text) - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cache-dir", default=PAPER_CACHE_DIR, help="paper cache directory to read generated papers from")
+    parser.add_argument("--count-tokens", action="store_true", help="use the token counting API instead of the 4 chars/token estimate")
+    parser.add_argument("--api-url", default=os.environ.get("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages"))
+    parser.add_argument("--model", default="claude-3-5-sonnet-20241022")
+    args = parser.parse_args()
+
+    count = estimate_tokens
+    if args.count_tokens:
+        api_key = os.environ.get("CLAUDE_API_KEY")
+        if not api_key:
+            parser.error("--count-tokens needs CLAUDE_API_KEY in the environment")
+        count = make_api_counter(args.api_url, api_key, args.model)
+
+    papers = load_papers(args.cache_dir)
+    totals = {"questions": 0, "verbose": 0.0, "compact": 0.0}
+    by_type = {}
+    for test_data in papers:
+        questions = test_data["questions"]
+        verbose = count(verbose_text(test_data))
+        compact = count(dump_compact(questions))
+        totals["questions"] += len(questions)
+        totals["verbose"] += verbose
+        totals["compact"] += compact
+        for question in questions:
+            question_type = str(question.get("type", "")).replace("_answer", "")
+            row = by_type.setdefault(question_type, {"questions": 0, "verbose": 0.0, "compact": 0.0})
+            row["questions"] += 1
+            row["verbose"] += count(json.dumps(question, indent=4, ensure_ascii=False))
+            row["compact"] += count(dump_compact([question]))
+
+    method = "token counting API" if args.count_tokens else "~4 chars/token estimate"
+    print(f"{len(papers)} paper(s), {totals['questions']} questions ({method})")
+    print(f"{'type':<8}{'questions':>10}{'verbose/q':>12}{'compact/q':>12}{'saved':>8}")
+    for question_type, row in sorted(by_type.items()):
+        verbose_per = row["verbose"] / row["questions"]
+        compact_per = row["compact"] / row["questions"]
+        print(f"{question_type:<8}{row['questions']:>10}{verbose_per:>12.1f}{compact_per:>12.1f}{(1 - compact_per / verbose_per) * 100:>7.1f}%")
+
+    verbose_per = totals["verbose"] / totals["questions"]
+    compact_per = totals["compact"] / totals["questions"]
+    print(f"{'paper':<8}{totals['questions']:>10}{verbose_per:>12.1f}{compact_per:>12.1f}{(1 - compact_per / verbose_per) * 100:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
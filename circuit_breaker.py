@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Trip when at least half of the recent calls failed, judged over a one minute window
+CLAUDE_BREAKER_WINDOW_SECONDS = float(os.environ.get("CLAUDE_BREAKER_WINDOW_SECONDS", "60"))
+CLAUDE_BREAKER_MIN_CALLS = int(os.environ.get("CLAUDE_BREAKER_MIN_CALLS", "5"))
+CLAUDE_BREAKER_FAILURE_RATE = float(os.environ.get("CLAUDE_BREAKER_FAILURE_RATE", "0.5"))
+CLAUDE_BREAKER_OPEN_SECONDS = float(os.environ.get("CLAUDE_BREAKER_OPEN_SECONDS", "30"))
+CLAUDE_BREAKER_HALF_OPEN_CALLS = int(os.environ.get("CLAUDE_BREAKER_HALF_OPEN_CALLS", "1"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit is open"""
+
+    def __init__(self, retry_in):
+        self.retry_in = retry_in
+        super().__init__(f"Claude API is temporarily unavailable - retrying automatically in {retry_in:.0f}s")
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker driven by the recent error rate"""
+
+    def __init__(self, window_seconds=CLAUDE_BREAKER_WINDOW_SECONDS, min_calls=CLAUDE_BREAKER_MIN_CALLS,
+                 failure_rate=CLAUDE_BREAKER_FAILURE_RATE, open_seconds=CLAUDE_BREAKER_OPEN_SECONDS,
+                 half_open_calls=CLAUDE_BREAKER_HALF_OPEN_CALLS):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._outcomes = deque()
+        self._stats = {"rejected": 0, "trips": 0}
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _current_state(self, now):
+        # Open moves to half-open lazily once the cool-down has passed
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    def _trip(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._stats["trips"] += 1
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not go out; otherwise reserve a slot"""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == OPEN:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.open_seconds - (now - self._opened_at))
+            if state == HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_calls:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(1)
+                self._half_open_in_flight += 1
+
+    def release(self):
+        """Give back a half-open slot for a call that ended without an outcome"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._current_state(now) == HALF_OPEN:
+                # The probe got through: close and start a fresh window
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == HALF_OPEN:
+                self._trip(now)
+                return
+            self._outcomes.append((now, False))
+            self._prune(now)
+            if state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for _, ok in self._outcomes if not ok)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._trip(now)
+
+    def is_open(self):
+        with self._lock:
+            return self._current_state(time.monotonic()) == OPEN
+
+    def get_status(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            status = dict(self._stats)
+        status.update({
+            "state": state,
+            "recent_calls": calls,
+            "recent_failures": failures,
+            "error_rate": round(failures / calls * 100, 1) if calls else 0.0,
+            "retry_in": max(self.open_seconds - (now - self._opened_at), 0.0) if state == OPEN else 0.0
+        })
+        return status
+
+
+_claude_breaker = CircuitBreaker()
+
+
+def get_claude_breaker():
+    """Return the process-wide breaker guarding CLAUDE_API_URL"""
+    return _claude_breaker
@@ -0,0 +1,228 @@
+import json
+import os
+import socket
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Connection pool configuration - shared by every Streamlit session in this process
+CLAUDE_POOL_SIZE = int(os.environ.get("CLAUDE_POOL_SIZE", "10"))
+CLAUDE_POOL_WARMUP_CONNECTIONS = int(os.environ.get("CLAUDE_POOL_WARMUP_CONNECTIONS", "2"))
+CLAUDE_POOL_BLOCK = os.environ.get("CLAUDE_POOL_BLOCK", "false").lower() == "true"
+
+# Enable TCP keep-alive probes so idle pooled connections are not silently dropped
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+]
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class ConnectionStats:
+    """Thread-safe counters for pooled connection usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            "requests": 0,
+            "checkouts": 0,
+            "handshakes": 0,
+            "warmups": 0,
+            "errors": 0
+        }
+
+    def record(self, name, amount=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def snapshot(self):
+        """Return a copy of the counters with derived pool-hit figures"""
+        with self._lock:
+            counts = dict(self._counts)
+        counts["pool_hits"] = max(counts["checkouts"] - counts["handshakes"], 0)
+        counts["pool_hit_rate"] = (
+            round(counts["pool_hits"] / counts["checkouts"] * 100, 1) if counts["checkouts"] else 0.0
+        )
+        return counts
+
+    def reset(self):
+        with self._lock:
+            for name in self._counts:
+                self._counts[name] = 0
+
+
+def _build_pool_classes(stats):
+    """Build urllib3 pool classes that report checkouts and new handshakes to stats"""
+
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            super().connect()
+            stats.record("handshakes")
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            super().connect()
+            stats.record("handshakes")
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+        def _get_conn(self, timeout=None):
+            stats.record("checkouts")
+            return super()._get_conn(timeout)
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+        def _get_conn(self, timeout=None):
+            stats.record("checkouts")
+            return super()._get_conn(timeout)
+
+    return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with keep-alive sockets and handshake accounting"""
+
+    def __init__(self, stats, pool_size=CLAUDE_POOL_SIZE, pool_block=CLAUDE_POOL_BLOCK):
+        self._stats = stats
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=pool_block)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = _build_pool_classes(self._stats)
+
+
+class ClaudeClient:
+    """Process-wide HTTP client for the Claude API backed by a keep-alive connection pool"""
+
+    def __init__(self, pool_size=CLAUDE_POOL_SIZE, pool_block=CLAUDE_POOL_BLOCK):
+        self.pool_size = pool_size
+        self.stats = ConnectionStats()
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        adapter = PooledHTTPAdapter(self.stats, pool_size=pool_size, pool_block=pool_block)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._warmed_origins = set()
+        self._warm_lock = threading.Lock()
+
+    def post(self, url, **kwargs):
+        """Drop-in replacement for requests.post that reuses pooled connections"""
+        self.stats.record("requests")
+        try:
+            return self.session.post(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.stats.record("errors")
+            raise
+
+    def get(self, url, **kwargs):
+        """Drop-in replacement for requests.get that reuses pooled connections"""
+        self.stats.record("requests")
+        try:
+            return self.session.get(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.stats.record("errors")
+            raise
+
+    def warm_up(self, url, connections=CLAUDE_POOL_WARMUP_CONNECTIONS, timeout=5):
+        """Open keep-alive connections to the API host so the first generation skips DNS and TLS"""
+        origin = _origin(url)
+
+        with self._warm_lock:
+            if origin in self._warmed_origins:
+                return False
+            self._warmed_origins.add(origin)
+
+        def open_connection():
+            try:
+                # Any response keeps the socket in the pool; the status code is irrelevant here
+                self.session.head(origin, timeout=timeout)
+                self.stats.record("warmups")
+            except requests.exceptions.RequestException:
+                self.stats.record("errors")
+
+        # Open connections concurrently so each one lands in the pool as a separate socket
+        workers = [threading.Thread(target=open_connection, daemon=True)
+                   for _ in range(max(1, min(connections, self.pool_size)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout)
+        return True
+
+    def warm_up_in_background(self, url, connections=CLAUDE_POOL_WARMUP_CONNECTIONS):
+        """Warm the pool without blocking the Streamlit script thread"""
+        if _origin(url) in self._warmed_origins:
+            return None
+        thread = threading.Thread(target=self.warm_up, args=(url, connections), daemon=True)
+        thread.start()
+        return thread
+
+    def get_stats(self):
+        stats = self.stats.snapshot()
+        stats["pool_size"] = self.pool_size
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a streamed Server-Sent Events response"""
+    # SSE is always UTF-8; without this requests yields raw bytes for text/event-stream
+    response.encoding = "utf-8"
+    event_name = None
+    data_lines = []
+
+    def dispatch():
+        raw = "\n".join(data_lines)
+        try:
+            return event_name or "message", json.loads(raw)
+        except json.JSONDecodeError:
+            return event_name or "message", raw
+
+    # chunk_size=None hands over each network chunk as soon as it arrives
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield dispatch()
+            event_name = None
+            data_lines = []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event_name = value
+        elif field == "data":
+            data_lines.append(value)
+
+    if data_lines:
+        yield dispatch()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_claude_client():
+    """Return the shared ClaudeClient, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ClaudeClient()
+    return _client
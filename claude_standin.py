@@ -0,0 +1,433 @@
+"""Local stand-in for the parts of the Claude Messages API this app uses
+
+Usage:
+    python claude_standin.py --port 8765 --latency 0.8 --tokens-per-second 150
+    python claude_standin.py --rate-429 0.05 --rate-500 0.02 --truncate-rate 0.1 --malformed-rate 0.05
+
+    CLAUDE_API_URL=http://127.0.0.1:8765/v1/messages CLAUDE_API_KEY=sk-ant-api03-standin streamlit run main.py
+
+Serves POST /v1/messages (streaming and not), /v1/messages/count_tokens and the
+Message Batches endpoints. Papers are synthetic but schema-valid compact rows
+for exactly the counts the prompt asks for, so load tests exercise the same
+parsing, repair and caching paths as real traffic without spending API credit.
+Latency, error rates, truncation and malformed output are all configurable.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.components.prompt_cache import prompt_cache_min_tokens
+
+STANDIN_HOST = os.environ.get("CLAUDE_STANDIN_HOST", "127.0.0.1")
+STANDIN_PORT = int(os.environ.get("CLAUDE_STANDIN_PORT", "8765"))
+
+# Characters per synthetic token, matching the rough estimate used elsewhere in the app
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_CHARS = 24
+# Cached system prefixes are reported as cache reads for this long, like the ephemeral cache
+PROMPT_CACHE_TTL_SECONDS = 300
+
+COUNT_PATTERNS = {
+    "mcq": re.compile(r"-\s*(\d+)\s+multiple choice"),
+    "short": re.compile(r"-\s*(\d+)\s+short answer"),
+    "long": re.compile(r"-\s*(\d+)\s+long answer")
+}
+TOPIC_PATTERN = re.compile(r'TOPIC:\s*"([^"]*)"')
+
+
+class StandinConfig:
+    """Behaviour knobs; every rate is a probability per request between 0 and 1"""
+
+    def __init__(self, latency=None, latency_jitter=None, tokens_per_second=None, rate_401=None, rate_429=None,
+                 rate_500=None, truncate_rate=None, malformed_rate=None, batch_seconds=None, retry_after=None, seed=None):
+        env = os.environ.get
+        # Seconds before the first byte, plus up to latency_jitter more
+        self.latency = latency if latency is not None else float(env("CLAUDE_STANDIN_LATENCY", "0.5"))
+        self.latency_jitter = latency_jitter if latency_jitter is not None else float(env("CLAUDE_STANDIN_LATENCY_JITTER", "0.2"))
+        # Output speed; streamed chunks and non-streamed responses are paced by it
+        self.tokens_per_second = tokens_per_second if tokens_per_second is not None else float(env("CLAUDE_STANDIN_TOKENS_PER_SECOND", "200"))
+        self.rate_401 = rate_401 if rate_401 is not None else float(env("CLAUDE_STANDIN_RATE_401", "0"))
+        self.rate_429 = rate_429 if rate_429 is not None else float(env("CLAUDE_STANDIN_RATE_429", "0"))
+        self.rate_500 = rate_500 if rate_500 is not None else float(env("CLAUDE_STANDIN_RATE_500", "0"))
+        # Cut the paper short with stop_reason max_tokens
+        self.truncate_rate = truncate_rate if truncate_rate is not None else float(env("CLAUDE_STANDIN_TRUNCATE_RATE", "0"))
+        # Corrupt the JSON while still ending the turn normally
+        self.malformed_rate = malformed_rate if malformed_rate is not None else float(env("CLAUDE_STANDIN_MALFORMED_RATE", "0"))
+        self.batch_seconds = batch_seconds if batch_seconds is not None else float(env("CLAUDE_STANDIN_BATCH_SECONDS", "2"))
+        self.retry_after = retry_after if retry_after is not None else float(env("CLAUDE_STANDIN_RETRY_AFTER", "1"))
+        self.seed = seed if seed is not None else (int(env("CLAUDE_STANDIN_SEED")) if env("CLAUDE_STANDIN_SEED") else None)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def prompt_text(content):
+    """Plain text of a message or system value, which may be a string or a list of blocks"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(block.get("text", "") for block in content if isinstance(block, dict))
+    return ""
+
+
+def requested_counts(prompt):
+    """(mcq, short, long) asked for by a generation prompt, or None for any other prompt"""
+    counts = []
+    for question_type in ("mcq", "short", "long"):
+        match = COUNT_PATTERNS[question_type].search(prompt)
+        counts.append(int(match.group(1)) if match else 0)
+    return tuple(counts) if any(counts) else None
+
+
+def synthetic_rows(counts, topic, rng):
+    """Schema-valid compact rows for the requested counts"""
+    mcq_count, short_count, long_count = counts
+    rows = []
+    for index in range(1, mcq_count + 1):
+        correct = rng.choice("ABCD")
+        rows.append(["m", f"Which statement about {topic} is correct? (item {index})",
+                     f"{topic} statement {index}A", f"{topic} statement {index}B",
+                     f"{topic} statement {index}C", f"{topic} statement {index}D",
+                     correct, f"Statement {index}{correct} matches the definition of {topic}."])
+    for index in range(1, short_count + 1):
+        rows.append(["s", f"Briefly explain one idea from {topic}. (item {index})",
+                     f"A short model answer describing idea {index} of {topic} with one example.", 3])
+    for index in range(1, long_count + 1):
+        rows.append(["l", f"Describe {topic} in detail with examples and a diagram where useful. (item {index})",
+                     f"A detailed model answer for {topic}: definitions, two worked examples, "
+                     f"common mistakes and a conclusion tying point {index} back to the syllabus.", 6])
+    return rows
+
+
+class StandinState:
+    """Shared server state: random source, prompt cache entries, batches and request counters"""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.cached_prefixes = {}
+        self.batches = {}
+        self.stats = {"requests": 0, "streamed": 0, "401": 0, "429": 0, "500": 0, "truncated": 0, "malformed": 0, "batches": 0,
+                      "cache_below_minimum": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def roll(self, rate):
+        with self.lock:
+            return self.rng.random() < rate
+
+    def latency(self):
+        with self.lock:
+            return self.config.latency + self.rng.random() * self.config.latency_jitter
+
+    def injected_error(self):
+        """Status code for an injected failure, or None"""
+        for status, rate in ((401, self.config.rate_401), (429, self.config.rate_429), (500, self.config.rate_500)):
+            if rate and self.roll(rate):
+                self.count(str(status))
+                return status
+        return None
+
+    def prompt_cache_usage(self, system, input_tokens, model):
+        """Usage fields for the request, reporting cache writes and reads for cache_control'd system blocks
+
+        Like the real API, a prefix shorter than the model's minimum cacheable length
+        is processed normally and reports no cache reads or writes.
+        """
+        usage = {"input_tokens": input_tokens}
+        if not isinstance(system, list):
+            return usage
+        marked = [index for index, block in enumerate(system) if isinstance(block, dict) and block.get("cache_control")]
+        if not marked:
+            return usage
+        # The cached prefix runs up to and including the last breakpoint
+        prefix = prompt_text(system[:marked[-1] + 1])
+        prefix_tokens = estimate_tokens(prefix)
+        if prefix_tokens < prompt_cache_min_tokens(model):
+            self.count("cache_below_minimum")
+            return usage
+        now = time.time()
+        with self.lock:
+            warm = self.cached_prefixes.get(prefix, 0) > now
+            self.cached_prefixes[prefix] = now + PROMPT_CACHE_TTL_SECONDS
+        usage["input_tokens"] = max(1, input_tokens - prefix_tokens)
+        usage["cache_read_input_tokens" if warm else "cache_creation_input_tokens"] = prefix_tokens
+        return usage
+
+    def build_message(self, body):
+        """The assistant message for a Messages request body, with injected truncation or corruption"""
+        messages = body.get("messages", [])
+        prompt = prompt_text(messages[-1].get("content")) if messages else ""
+        system = body.get("system")
+        input_tokens = estimate_tokens(prompt_text(system) + "".join(prompt_text(message.get("content")) for message in messages))
+        counts = requested_counts(prompt)
+        stop_reason = "end_turn"
+
+        if counts is None:
+            # Connection tests and anything else that is not a paper request
+            text = "OK"
+        else:
+            topic_match = TOPIC_PATTERN.search(prompt)
+            with self.lock:
+                rows = synthetic_rows(counts, topic_match.group(1) if topic_match else "the topic", self.rng)
+            text = json.dumps({"q": rows}, ensure_ascii=False, separators=(",", ":"))
+            if self.roll(self.config.truncate_rate):
+                self.count("truncated")
+                with self.lock:
+                    cut = int(len(text) * (0.3 + self.rng.random() * 0.6))
+                text, stop_reason = text[:cut], "max_tokens"
+            elif self.roll(self.config.malformed_rate):
+                self.count("malformed")
+                # A stray quote in the middle of a row breaks the JSON without looking truncated
+                middle = len(text) // 2
+                text = text[:middle] + '"' + text[middle:]
+
+        max_chars = int(body.get("max_tokens", 4096)) * CHARS_PER_TOKEN
+        if len(text) > max_chars:
+            text, stop_reason = text[:max_chars], "max_tokens"
+
+        usage = self.prompt_cache_usage(system, input_tokens, body.get("model"))
+        usage["output_tokens"] = estimate_tokens(text)
+        return {
+            "id": f"msg_standin_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "claude-standin"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage
+        }
+
+    def create_batch(self, requests_list):
+        batch_id = f"msgbatch_standin_{uuid.uuid4().hex[:20]}"
+        with self.lock:
+            self.batches[batch_id] = {"requests": requests_list, "created_at": time.time(), "results": None}
+        self.count("batches")
+        return batch_id
+
+    def batch_info(self, batch_id, base_url):
+        with self.lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        ended = time.time() - batch["created_at"] >= self.config.batch_seconds
+        total = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else total, "succeeded": total if ended else 0,
+                               "errored": 0, "canceled": 0, "expired": 0},
+            "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None
+        }
+
+    def batch_results(self, batch_id):
+        """JSONL results, computed once so repeated downloads agree"""
+        with self.lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        if batch["results"] is None:
+            lines = []
+            for entry in batch["requests"]:
+                if self.roll(self.config.rate_500):
+                    result = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": "Injected server error"}}}
+                else:
+                    result = {"type": "succeeded", "message": self.build_message(entry.get("params", {}))}
+                lines.append(json.dumps({"custom_id": entry.get("custom_id"), "result": result}))
+            batch["results"] = "\n".join(lines) + "\n"
+        return batch["results"]
+
+
+ERROR_TYPES = {
+    401: ("authentication_error", "invalid x-api-key"),
+    404: ("not_found_error", "Not found"),
+    429: ("rate_limit_error", "Number of request tokens has exceeded your per-minute rate limit"),
+    500: ("api_error", "Internal server error")
+}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status):
+        error_type, message = ERROR_TYPES[status]
+        headers = {"retry-after": f"{self.state.config.retry_after:g}"} if status == 429 else None
+        self.send_json(status, {"type": "error", "error": {"type": error_type, "message": message}}, headers)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return None
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+
+    def do_POST(self):
+        body = self.read_body()
+        if body is None:
+            self.send_json(400, {"type": "error", "error": {"type": "invalid_request_error", "message": "Body is not valid JSON"}})
+            return
+        if not self.headers.get("x-api-key"):
+            self.send_error_json(401)
+            return
+
+        path = self.path.rstrip("/")
+        if path == "/v1/messages":
+            self.handle_message(body)
+        elif path == "/v1/messages/count_tokens":
+            text = prompt_text(body.get("system")) + "".join(prompt_text(message.get("content")) for message in body.get("messages", []))
+            self.send_json(200, {"input_tokens": estimate_tokens(text)})
+        elif path == "/v1/messages/batches":
+            batch_id = self.state.create_batch(body.get("requests", []))
+            self.send_json(200, self.state.batch_info(batch_id, self.base_url()))
+        else:
+            self.send_error_json(404)
+
+    def do_GET(self):
+        if not self.headers.get("x-api-key"):
+            self.send_error_json(401)
+            return
+        match = re.fullmatch(r"/v1/messages/batches/([\w-]+)(/results)?", self.path.rstrip("/"))
+        if not match:
+            self.send_error_json(404)
+            return
+        if match.group(2):
+            results = self.state.batch_results(match.group(1))
+            if results is None:
+                self.send_error_json(404)
+                return
+            data = results.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-jsonl")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        info = self.state.batch_info(match.group(1), self.base_url())
+        if info is None:
+            self.send_error_json(404)
+        else:
+            self.send_json(200, info)
+
+    def handle_message(self, body):
+        state = self.state
+        state.count("requests")
+        time.sleep(state.latency())
+        status = state.injected_error()
+        if status is not None:
+            self.send_error_json(status)
+            return
+
+        message = state.build_message(body)
+        text = message["content"][0]["text"]
+        seconds_per_char = 1.0 / (state.config.tokens_per_second * CHARS_PER_TOKEN) if state.config.tokens_per_second > 0 else 0
+        if not body.get("stream"):
+            time.sleep(len(text) * seconds_per_char)
+            self.send_json(200, message)
+            return
+
+        state.count("streamed")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        usage = message["usage"]
+        start = dict(message, content=[], stop_reason=None, usage=dict(usage, output_tokens=1))
+        try:
+            self.send_event("message_start", {"type": "message_start", "message": start})
+            self.send_event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            self.send_event("ping", {"type": "ping"})
+            for offset in range(0, len(text), STREAM_CHUNK_CHARS):
+                chunk = text[offset:offset + STREAM_CHUNK_CHARS]
+                time.sleep(len(chunk) * seconds_per_char)
+                self.send_event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+            self.send_event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self.send_event("message_delta", {"type": "message_delta", "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                                              "usage": {"output_tokens": usage["output_tokens"]}})
+            self.send_event("message_stop", {"type": "message_stop"})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the generation and dropped the stream
+            self.close_connection = True
+
+    def send_event(self, name, payload):
+        data = f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def start_standin_server(config=None, host=STANDIN_HOST, port=STANDIN_PORT):
+    """Serve the stand-in on a background thread; returns the server (server.api_url, server.shutdown())"""
+    state = StandinState(config or StandinConfig())
+    handler = type("BoundStandinHandler", (StandinHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.standin_state = state
+    server.api_url = f"http://{host}:{server.server_address[1]}/v1/messages"
+    threading.Thread(target=server.serve_forever, name="claude-standin", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=STANDIN_HOST)
+    parser.add_argument("--port", type=int, default=STANDIN_PORT)
+    parser.add_argument("--latency", type=float, help="seconds before the first byte of every response")
+    parser.add_argument("--latency-jitter", type=float, help="up to this many extra seconds, chosen at random")
+    parser.add_argument("--tokens-per-second", type=float, help="output speed; 0 sends everything at once")
+    parser.add_argument("--rate-401", type=float, help="share of requests rejected as unauthenticated")
+    parser.add_argument("--rate-429", type=float, help="share of requests rate limited (with retry-after)")
+    parser.add_argument("--rate-500", type=float, help="share of requests failing with a server error")
+    parser.add_argument("--truncate-rate", type=float, help="share of papers cut short with stop_reason max_tokens")
+    parser.add_argument("--malformed-rate", type=float, help="share of papers with corrupted JSON")
+    parser.add_argument("--batch-seconds", type=float, help="seconds before a message batch ends")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable runs")
+    args = parser.parse_args()
+
+    config = StandinConfig(latency=args.latency, latency_jitter=args.latency_jitter, tokens_per_second=args.tokens_per_second,
+                           rate_401=args.rate_401, rate_429=args.rate_429, rate_500=args.rate_500,
+                           truncate_rate=args.truncate_rate, malformed_rate=args.malformed_rate,
+                           batch_seconds=args.batch_seconds, seed=args.seed)
+    server = start_standin_server(config, host=args.host, port=args.port)
+    print(f"Claude stand-in listening on {server.api_url}")
+    print(f"  CLAUDE_API_URL={server.api_url} CLAUDE_API_KEY=sk-ant-api03-standin streamlit run main.py")
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(server.standin_state.stats))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import json
+
+# The model returns {"q": [row, ...]} with one positional array per question:
+#   ["m", question, option A, option B, option C, option D, correct letter, explanation]
+#   ["s", question, sample answer, marks]
+#   ["l", question, sample answer, marks]
+# Rows are expanded locally into the question dicts the display and PDF code expect.
+COMPACT_ARRAY_KEY = "q"
+TYPE_CODES = {"m": "mcq", "s": "short", "l": "long"}
+DEFAULT_MARKS = {"short": 3, "long": 6}
+OPTION_LETTERS = ("A", "B", "C", "D")
+
+COMPACT_FORMAT_INSTRUCTIONS = """Respond with ONLY compact JSON on a single line - no markdown, no extra text, no indentation:
+{"q":[ROW,ROW,...]}
+
+Each ROW is a positional array, one per question:
+- Multiple choice: ["m","question","option A","option B","option C","option D","correct letter","brief explanation"]
+- Short answer: ["s","question","expected short answer",marks]
+- Long answer: ["l","question","expected detailed answer",marks]
+
+Example:
+{"q":[["m","Sample MCQ question about the topic?","Option A","Option B","Option C","Option D","A","Brief explanation"],["s","Sample short answer question about the topic?","Expected short answer",3],["l","Sample long answer question about the topic?","Expected detailed answer",6]]}"""
+
+
+class CompactSchemaError(ValueError):
+    """Raised when a compact question row cannot be expanded"""
+
+
+def _text(value, field):
+    # Numeric options and answers ("4", "0.5" in maths papers) often arrive as JSON numbers
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        raise CompactSchemaError(f"{field} must be a non-empty string")
+    return value.strip()
+
+
+def _marks(value, question_type):
+    try:
+        marks = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_MARKS[question_type]
+    return marks if marks > 0 else DEFAULT_MARKS[question_type]
+
+
+def expand_question(row, question_number=0):
+    """Expand one compact row into the verbose question dict, validating it on the way"""
+    if not isinstance(row, list) or not row:
+        raise CompactSchemaError("question row must be a non-empty array")
+
+    question_type = TYPE_CODES.get(str(row[0]).strip().lower()[:1])
+    if question_type is None:
+        raise CompactSchemaError(f"unknown question type {row[0]!r}")
+
+    if question_type == "mcq":
+        if len(row) < 7:
+            raise CompactSchemaError("multiple choice row needs a question, four options and the answer")
+        correct_answer = str(row[6]).strip().upper()[:1]
+        if correct_answer not in OPTION_LETTERS:
+            raise CompactSchemaError(f"correct answer {row[6]!r} is not one of A-D")
+        return {
+            "question_number": question_number,
+            "type": "mcq",
+            "question": _text(row[1], "question"),
+            "options": {letter: _text(option, f"option {letter}") for letter, option in zip(OPTION_LETTERS, row[2:6])},
+            "correct_answer": correct_answer,
+            "explanation": str(row[7]).strip() if len(row) > 7 and row[7] is not None else ""
+        }
+
+    if len(row) < 3:
+        raise CompactSchemaError(f"{question_type} answer row needs a question and a sample answer")
+    return {
+        "question_number": question_number,
+        "type": question_type,
+        "question": _text(row[1], "question"),
+        "sample_answer": _text(row[2], "sample answer"),
+        "marks": _marks(row[3] if len(row) > 3 else None, question_type)
+    }
+
+
+def expand_questions(rows):
+    """Expand every valid row; returns (questions, rejected_count)"""
+    questions = []
+    rejected = 0
+    for row in rows:
+        try:
+            questions.append(expand_question(row, len(questions) + 1))
+        except CompactSchemaError:
+            rejected += 1
+    return questions, rejected
+
+
+def compact_question(question):
+    """Inverse of expand_question, used to measure the wire format against the verbose one"""
+    question_type = str(question.get("type", "")).replace("_answer", "")
+    if question_type == "mcq":
+        options = question.get("options", {})
+        return ["m", question.get("question", "")] + [options.get(letter, "") for letter in OPTION_LETTERS] + [
+            question.get("correct_answer", ""), question.get("explanation", "")]
+    return [question_type[:1], question.get("question", ""), question.get("sample_answer", ""),
+            question.get("marks", DEFAULT_MARKS.get(question_type, 3))]
+
+
+def dump_compact(questions):
+    return json.dumps({COMPACT_ARRAY_KEY: [compact_question(question) for question in questions]},
+                      ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,104 @@
+import re
+from functools import cached_property, lru_cache
+from types import MappingProxyType
+
+from src.components.keyword_matcher import SubjectKeywordMatcher
+from src.components.topic_index import TopicIndex
+
+
+# Only board and subject names pass through here, so the memo stays small
+@lru_cache(maxsize=1024)
+def canonical_name(value):
+    """Board or subject name as an index key: casefolded with whitespace collapsed"""
+    return re.sub(r"\s+", " ", str(value)).strip().casefold()
+
+
+def canonical_grade(grade):
+    """Grade as an int from 7, "7" or "Grade 7 (MYP)"; None if there is no number in it"""
+    if isinstance(grade, int):
+        return grade
+    match = re.search(r"\d+", str(grade))
+    return int(match.group()) if match else None
+
+
+def curriculum_key(board, grade, subject):
+    return (canonical_name(board), canonical_grade(grade), canonical_name(subject))
+
+
+def freeze(value):
+    """Read-only copy of nested dicts and lists: mappingproxy and tuple all the way down"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class CurriculumIndex:
+    """Immutable curriculum tables plus flat lookups keyed by canonical (board, grade, subject)
+
+    Built once per process and shared by every session; nothing in it can be
+    modified, so it needs no locking.
+    """
+
+    def __init__(self, subjects_by_board, curriculum_topics, subject_keywords, digests=None):
+        self.subjects_by_board = freeze(subjects_by_board)
+        self.curriculum_topics = freeze(curriculum_topics)
+        self.subject_keywords = freeze(subject_keywords)
+
+        subjects = {}
+        for board, grades in self.subjects_by_board.items():
+            for grade, grade_subjects in grades.items():
+                subjects[(canonical_name(board), canonical_grade(grade))] = grade_subjects
+        topics = {}
+        subject_names = set()
+        topic_count = 0
+        for board, board_subjects in self.curriculum_topics.items():
+            for subject, grades in board_subjects.items():
+                subject_names.add(subject)
+                for grade, grade_topics in grades.items():
+                    topics[curriculum_key(board, grade, subject)] = grade_topics
+                    topic_count += len(grade_topics)
+        keywords = {canonical_name(subject): subject_keywords for subject, subject_keywords in self.subject_keywords.items()}
+
+        self._subjects = MappingProxyType(subjects)
+        self._topics = MappingProxyType(topics)
+        self._keywords = MappingProxyType(keywords)
+        # Per-(board, grade, subject) TopicIndex objects, built on first validation of that key
+        self._topic_indexes = {}
+        # Content hashes of the files this index was built from: canonical board name or "keywords" -> sha256
+        self.digests = MappingProxyType(dict(digests or {}))
+        self.totals = MappingProxyType({
+            "total_boards": len(self.curriculum_topics),
+            "total_subjects": len(subject_names),
+            "total_topics": topic_count
+        })
+
+    def data_version(self, board):
+        """Identifies the data a board's validations are computed from: its file and the keywords file"""
+        return (self.digests.get(canonical_name(board)), self.digests.get("keywords"))
+
+    def subjects(self, board, grade):
+        """Subjects offered for a board and grade, as a tuple (empty if unknown)"""
+        return self._subjects.get((canonical_name(board), canonical_grade(grade)), ())
+
+    def topics(self, board, grade, subject):
+        """Curriculum topics for a board, grade and subject, as a tuple (empty if unknown)"""
+        return self._topics.get(curriculum_key(board, grade, subject), ())
+
+    def keywords(self, subject):
+        """Relevance keywords for a subject, as a tuple (empty if unknown)"""
+        return self._keywords.get(canonical_name(subject), ())
+
+    @cached_property
+    def keyword_matcher(self):
+        """Keyword automata for topic relevance, compiled on first use and kept with this index"""
+        return SubjectKeywordMatcher(self.subject_keywords)
+
+    def topic_index(self, board, grade, subject):
+        """TopicIndex over the topics for a board, grade and subject, built once per key"""
+        key = curriculum_key(board, grade, subject)
+        topic_index = self._topic_indexes.get(key)
+        if topic_index is None:
+            topic_index = self._topic_indexes.setdefault(key, TopicIndex(self._topics.get(key, ())))
+        return topic_index
@@ -0,0 +1,418 @@
+"""Compiled, memory-mapped curriculum snapshot shared by every server process on a host
+
+Usage:
+    python curriculum_snapshot.py build                    # curriculum_data/ -> CURRICULUM_SNAPSHOT_FILE
+    python curriculum_snapshot.py build --output /srv/curriculum.snapshot
+    python curriculum_snapshot.py verify                   # compare every lookup with the JSON-backed index
+
+The snapshot holds topics, subjects, keywords and paper types as open-addressing
+hash tables keyed by the canonical (board, grade, subject), each entry storing its
+key and its strings back to back. Processes map it read-only, so the pages live
+once in the OS page cache, and opening it reads a few header bytes (plus one
+hash over curriculum_data/ to check that it is current); a lookup
+hashes the key, probes the table and decodes only the entry it returns. Rebuild
+it after editing curriculum_data/; the file is replaced atomically and running
+processes pick the new one up. Until then a process notices that the snapshot no
+longer matches curriculum_data/ and serves from the JSON curriculum instead.
+
+With CURRICULUM_SNAPSHOT_FILE set, mock_test_creator answers every per-selection
+read from the snapshot: subjects, topics, paper types, topic validation and
+ranking, keyword relevance and the curriculum totals. The topic indexes and
+keyword automata behind validation and relevance are still compiled per process,
+on first use, from the snapshot's strings. The whole-table views
+(get_comprehensive_curriculum_topics, get_subjects_by_board,
+get_comprehensive_subject_keywords, the timings page's curriculum versions and
+the batch planner) keep reading curriculum_data/, so a process that calls one of
+them loads the JSON index as well.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from functools import cached_property
+from types import MappingProxyType
+
+from src.components.curriculum_index import canonical_name, canonical_grade
+from src.components.keyword_matcher import SubjectKeywordMatcher
+from src.components.topic_index import TopicIndex
+from src.components.curriculum_store import CURRICULUM_DATA_DIR, CURRICULUM_RELOAD_SECONDS, MANIFEST_FILE
+
+logger = logging.getLogger(__name__)
+
+# Set to a path (e.g. curriculum_data/curriculum.snapshot) to serve lookups from the snapshot; empty keeps the JSON index
+CURRICULUM_SNAPSHOT_FILE = os.environ.get("CURRICULUM_SNAPSHOT_FILE", "")
+DEFAULT_SNAPSHOT_FILE = os.path.join(CURRICULUM_DATA_DIR, "curriculum.snapshot")
+
+MAGIC = b"CURSNAP\0"
+FORMAT_VERSION = 2
+# "meta" holds the keyword subjects' display names and the curriculum totals
+TABLES = ("topics", "subjects", "keywords", "paper_types", "meta")
+# magic, format, sha256 of the source files
+HEADER = struct.Struct("<8sI32s")
+# table name, slots offset, slot count
+TABLE = struct.Struct("<16sII")
+# key hash, entry offset (0 marks an empty slot)
+SLOT = struct.Struct("<II")
+# key length, string count, strings length; followed by the key and the strings joined by KEY_SEPARATOR
+ENTRY = struct.Struct("<III")
+KEY_SEPARATOR = "\x1f"
+KEYWORD_SUBJECTS_KEY = b"keyword_subjects"
+TOTALS_KEY = b"totals"
+TOTALS_FIELDS = ("total_boards", "total_subjects", "total_topics")
+
+
+def snapshot_key(*parts):
+    return KEY_SEPARATOR.join(str(part) for part in parts).encode("utf-8")
+
+
+def _hash(key):
+    return zlib.crc32(key)
+
+
+def source_digest(data_dir=CURRICULUM_DATA_DIR):
+    """sha256 over the manifest and every file it lists, to tell a stale snapshot"""
+    digest = hashlib.sha256()
+    manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+    with open(manifest_path, "rb") as manifest_file:
+        raw = manifest_file.read()
+    digest.update(raw)
+    manifest = json.loads(raw.decode("utf-8"))
+    for name in [entry["file"] for entry in manifest["boards"]] + [manifest["keywords"]]:
+        with open(os.path.join(data_dir, name), "rb") as data_file:
+            digest.update(data_file.read())
+    return digest.digest()
+
+
+def snapshot_tables(index, paper_types_for):
+    """The lookup tables as {key bytes: [strings]} from a CurriculumIndex"""
+    tables = {name: {} for name in TABLES}
+    for board, board_subjects in index.curriculum_topics.items():
+        for subject, grades in board_subjects.items():
+            for grade, topics in grades.items():
+                tables["topics"][snapshot_key(canonical_name(board), canonical_grade(grade), canonical_name(subject))] = list(topics)
+    for board, grades in index.subjects_by_board.items():
+        for grade, subjects in grades.items():
+            key = snapshot_key(canonical_name(board), canonical_grade(grade))
+            tables["subjects"][key] = list(subjects)
+            tables["paper_types"][key] = list(paper_types_for(board, grade))
+    for subject, keywords in index.subject_keywords.items():
+        tables["keywords"][snapshot_key(canonical_name(subject))] = list(keywords)
+    tables["meta"][KEYWORD_SUBJECTS_KEY] = list(index.subject_keywords)
+    tables["meta"][TOTALS_KEY] = [str(index.totals[field]) for field in TOTALS_FIELDS]
+    return tables
+
+
+def write_snapshot(tables, path, digest=b"\0" * 32):
+    """Serialize the tables and atomically replace path with the result"""
+    table_offset = HEADER.size
+    position = table_offset + TABLE.size * len(TABLES)
+    entries = bytearray()
+    table_slots = {}
+    for name in TABLES:
+        slot_count = 1
+        while slot_count < max(len(tables[name]), 1) * 2:
+            slot_count *= 2
+        slots = [None] * slot_count
+        for key, values in tables[name].items():
+            if any(KEY_SEPARATOR in value for value in values):
+                raise ValueError(f"{name} entry {key!r} holds the reserved separator {KEY_SEPARATOR!r}")
+            data = KEY_SEPARATOR.join(values).encode("utf-8")
+            entry_offset = position + len(entries)
+            entries += ENTRY.pack(len(key), len(values), len(data)) + key + data
+            slot = _hash(key) & (slot_count - 1)
+            while slots[slot] is not None:
+                slot = (slot + 1) & (slot_count - 1)
+            slots[slot] = (_hash(key), entry_offset)
+        table_slots[name] = slots
+
+    header = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, digest))
+    slots_data = bytearray()
+    slots_offset = position + len(entries)
+    for name in TABLES:
+        header += TABLE.pack(name.encode("ascii"), slots_offset + len(slots_data), len(table_slots[name]))
+        for slot in table_slots[name]:
+            slots_data += SLOT.pack(*(slot or (0, 0)))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(header + entries + slots_data)
+    # Processes that already mapped the old file keep reading it until they reopen
+    os.replace(temp_path, path)
+    return path
+
+
+class CurriculumSnapshot:
+    """Read-only view over a snapshot file, answering the same lookups as CurriculumIndex"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(snapshot_file.fileno())
+        # Identifies this file, so results cached against it are not served from a rebuilt one
+        self.version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        try:
+            magic, format_version, self.digest = HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            magic = format_version = None
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self._map.close()
+            raise ValueError(f"{path} is not a format {FORMAT_VERSION} curriculum snapshot")
+        self._tables = {}
+        for position in range(len(TABLES)):
+            name, slots_offset, slot_count = TABLE.unpack_from(self._map, HEADER.size + position * TABLE.size)
+            self._tables[name.rstrip(b"\0").decode("ascii")] = (slots_offset, slot_count)
+        # Per-(board, grade, subject) TopicIndex objects, built on first validation of that key
+        self._topic_indexes = {}
+
+    def _lookup(self, table, key):
+        slots_offset, slot_count = self._tables[table]
+        key_hash = _hash(key)
+        slot = key_hash & (slot_count - 1)
+        while True:
+            stored_hash, entry_offset = SLOT.unpack_from(self._map, slots_offset + slot * SLOT.size)
+            if entry_offset == 0:
+                return []
+            if stored_hash == key_hash:
+                key_length, count, data_length = ENTRY.unpack_from(self._map, entry_offset)
+                key_start = entry_offset + ENTRY.size
+                if self._map[key_start:key_start + key_length] == key:
+                    if not count:
+                        return []
+                    data_start = key_start + key_length
+                    return self._map[data_start:data_start + data_length].decode("utf-8").split(KEY_SEPARATOR)
+            slot = (slot + 1) & (slot_count - 1)
+
+    def data_version(self, board):
+        """Every board's data comes from this one file"""
+        return self.version
+
+    def topics(self, board, grade, subject):
+        return self._lookup("topics", snapshot_key(canonical_name(board), canonical_grade(grade), canonical_name(subject)))
+
+    def subjects(self, board, grade):
+        return self._lookup("subjects", snapshot_key(canonical_name(board), canonical_grade(grade)))
+
+    def keywords(self, subject):
+        return self._lookup("keywords", snapshot_key(canonical_name(subject)))
+
+    def paper_types(self, board, grade):
+        return self._lookup("paper_types", snapshot_key(canonical_name(board), canonical_grade(grade)))
+
+    @cached_property
+    def totals(self):
+        counts = self._lookup("meta", TOTALS_KEY)
+        return MappingProxyType({field: int(count) for field, count in zip(TOTALS_FIELDS, counts)})
+
+    @cached_property
+    def subject_keywords(self):
+        """Subject -> keywords for every subject with keywords, decoded on first use"""
+        return MappingProxyType({subject: tuple(self.keywords(subject)) for subject in self._lookup("meta", KEYWORD_SUBJECTS_KEY)})
+
+    @cached_property
+    def keyword_matcher(self):
+        """Keyword automata for topic relevance, compiled on first use and kept with this mapping"""
+        return SubjectKeywordMatcher(self.subject_keywords)
+
+    def topic_index(self, board, grade, subject):
+        """TopicIndex over the snapshot's topics for a board, grade and subject, built once per key"""
+        key = (canonical_name(board), canonical_grade(grade), canonical_name(subject))
+        topic_index = self._topic_indexes.get(key)
+        if topic_index is None:
+            topic_index = self._topic_indexes.setdefault(key, TopicIndex(self.topics(board, grade, subject)))
+        return topic_index
+
+    def close(self):
+        self._map.close()
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _data_signature(data_dir):
+    """Stat signatures of every JSON file under curriculum_data/, to notice edits without hashing them"""
+    signatures = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                signatures.append((path, _signature(path)))
+    return tuple(signatures)
+
+
+class SnapshotLoader:
+    """Keeps one snapshot file mapped, reopening it after a rebuild and refusing it while it is stale
+
+    At most every CURRICULUM_RELOAD_SECONDS it stats the snapshot and the
+    curriculum files. When either moved, it remaps a rebuilt snapshot and
+    compares its source digest with curriculum_data/; a snapshot built from
+    other data is not served, so lookups fall back to the JSON index that the
+    hot reload keeps current instead of mixing old and new curriculum.
+    """
+
+    def __init__(self, path, data_dir=CURRICULUM_DATA_DIR, reload_seconds=CURRICULUM_RELOAD_SECONDS):
+        self.path = path
+        self.data_dir = data_dir
+        self.reload_seconds = None if str(reload_seconds).lower() in ("off", "false", "") else float(reload_seconds)
+        self._lock = threading.Lock()
+        # The mapping being served: None while the file is missing, unreadable or stale
+        self._snapshot = None
+        # The last mapping opened, stale or not
+        self._mapped = None
+        # (snapshot signature, curriculum files signature) at the last check; False until the first one
+        self._signatures = False
+        self._next_check = 0.0
+
+    def get(self):
+        if time.monotonic() < self._next_check:
+            return self._snapshot
+        with self._lock:
+            if time.monotonic() >= self._next_check:
+                self._refresh_locked()
+                if self.reload_seconds is None:
+                    self._next_check = float("inf") if self._snapshot is not None else 0.0
+                else:
+                    self._next_check = time.monotonic() + self.reload_seconds
+            return self._snapshot
+
+    def _refresh_locked(self):
+        signature = _signature(self.path)
+        signatures = (signature, _data_signature(self.data_dir))
+        if signatures == self._signatures:
+            return
+        self._signatures = signatures
+        mapped = self._mapped
+        if signature is None:
+            # A mapping that is already open stays valid after its file is removed
+            logger.warning("curriculum snapshot %s not found; %s", self.path,
+                           "keeping the mapped one" if mapped else "serving from the JSON curriculum")
+        elif mapped is None or mapped.version != signature:
+            try:
+                # The old mapping is left to the garbage collector: other threads may still be reading it
+                mapped = CurriculumSnapshot(self.path)
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning("could not map curriculum snapshot %s: %s", self.path, e)
+        self._mapped = mapped
+        if mapped is None:
+            self._snapshot = None
+            return
+        try:
+            digest = source_digest(self.data_dir)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Half-saved files; the JSON store keeps its last good index too, so leave things as they are
+            logger.warning("could not check curriculum snapshot %s against %s: %s", self.path, self.data_dir, e)
+            return
+        if mapped.digest != digest:
+            logger.warning("curriculum snapshot %s was built from other curriculum data than %s; "
+                           "serving from the JSON curriculum until it is rebuilt", self.path, self.data_dir)
+            self._snapshot = None
+        else:
+            self._snapshot = mapped
+
+
+# One loader per snapshot path
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+
+def get_curriculum_snapshot(path=None):
+    """The mapped snapshot for path (CURRICULUM_SNAPSHOT_FILE by default); None when disabled, missing or stale"""
+    path = path or CURRICULUM_SNAPSHOT_FILE
+    if not path or path.lower() == "off":
+        return None
+    loader = _loaders.get(path)
+    if loader is None:
+        with _loaders_lock:
+            loader = _loaders.setdefault(path, SnapshotLoader(path))
+    return loader.get()
+
+
+def get_topics_by_board_grade_subject(board, grade, subject, path=None):
+    """Snapshot-backed equivalent of mock_test_creator.get_topics_by_board_grade_subject"""
+    snapshot = get_curriculum_snapshot(path)
+    return snapshot.topics(board, grade, subject) if snapshot else []
+
+
+def get_available_subjects(board, grade, path=None):
+    """Snapshot-backed equivalent of mock_test_creator.get_available_subjects"""
+    snapshot = get_curriculum_snapshot(path)
+    return snapshot.subjects(board, grade) if snapshot else []
+
+
+def build(output, data_dir=CURRICULUM_DATA_DIR):
+    from src.components.curriculum_store import CurriculumStore
+    from src.components.mock_test_creator import _paper_types_by_rules
+
+    index = CurriculumStore(data_dir, reload_seconds="off").index()
+    return write_snapshot(snapshot_tables(index, _paper_types_by_rules), output, source_digest(data_dir))
+
+
+def verify(path, data_dir=CURRICULUM_DATA_DIR):
+    """Every lookup the snapshot serves, compared with the JSON-backed index; returns the mismatches"""
+    from src.components.curriculum_store import CurriculumStore
+    # The rules themselves: get_paper_types_by_board_and_grade reads the snapshot when one is configured
+    from src.components.mock_test_creator import _paper_types_by_rules, get_ib_grade_options
+
+    index = CurriculumStore(data_dir, reload_seconds="off").index()
+    snapshot = CurriculumSnapshot(path)
+    mismatches = []
+    try:
+        if snapshot.digest != source_digest(data_dir):
+            mismatches.append(("stale", path, "curriculum_data/ changed since the snapshot was built"))
+        for board, grades in index.subjects_by_board.items():
+            # The app passes IB grades as "Grade N (PYP)" strings and everything else as ints
+            ib_labels = {canonical_grade(label): label for label in get_ib_grade_options()} if board == "IB" else {}
+            for grade, subjects in grades.items():
+                app_grade = ib_labels.get(grade, grade)
+                if snapshot.subjects(board, app_grade) != list(subjects):
+                    mismatches.append(("subjects", board, grade))
+                if snapshot.paper_types(board, app_grade) != _paper_types_by_rules(board, app_grade):
+                    mismatches.append(("paper_types", board, grade))
+                for subject in subjects:
+                    if snapshot.topics(board, app_grade, subject) != list(index.topics(board, grade, subject)):
+                        mismatches.append(("topics", board, grade, subject))
+        for subject, keywords in index.subject_keywords.items():
+            if snapshot.keywords(subject) != list(keywords):
+                mismatches.append(("keywords", subject))
+        if list(snapshot.subject_keywords) != list(index.subject_keywords):
+            mismatches.append(("keyword_subjects", path))
+        if dict(snapshot.totals) != dict(index.totals):
+            mismatches.append(("totals", path))
+    finally:
+        snapshot.close()
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("build", "verify"))
+    parser.add_argument("--output", default=CURRICULUM_SNAPSHOT_FILE or DEFAULT_SNAPSHOT_FILE, help="snapshot file to write or check")
+    parser.add_argument("--data-dir", default=CURRICULUM_DATA_DIR, help="curriculum_data directory to compile")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        path = build(args.output, args.data_dir)
+        print(f"wrote {path} ({os.path.getsize(path) / 1024:.1f} KB) in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return 0
+    mismatches = verify(args.output, args.data_dir)
+    for mismatch in mismatches:
+        print("mismatch:", *mismatch)
+    print(f"{args.output}: {'OK' if not mismatches else f'{len(mismatches)} mismatch(es)'}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
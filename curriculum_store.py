@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.components.curriculum_index import CurriculumIndex, canonical_name
+
+logger = logging.getLogger(__name__)
+
+# Versioned curriculum files: manifest.json lists one file per board plus the subject keywords
+CURRICULUM_DATA_DIR = os.environ.get("CURRICULUM_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "curriculum_data"))
+# How often (at most) a lookup checks the files for edits; "off" loads once and never reloads
+CURRICULUM_RELOAD_SECONDS = os.environ.get("CURRICULUM_RELOAD_SECONDS", "2")
+# Cached topic validations kept per board
+CURRICULUM_VALIDATION_CACHE_SIZE = int(os.environ.get("CURRICULUM_VALIDATION_CACHE_SIZE", "2048"))
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _grade_key(grade):
+    """JSON object keys are strings; grades are ints everywhere else"""
+    return int(grade) if str(grade).isdigit() else grade
+
+
+def _read_json(path):
+    """Parsed file plus the sha256 of its bytes"""
+    with open(path, "rb") as data_file:
+        raw = data_file.read()
+    return json.loads(raw.decode("utf-8")), hashlib.sha256(raw).hexdigest()
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class CurriculumStore:
+    """Loads the curriculum files on first use and hot-reloads them when they change
+
+    Lookups read self._index, which is only ever replaced whole, so a session
+    sees either the old curriculum or the new one and never a mix. Files are
+    re-read when their mtime or size moves and the index is rebuilt only when a
+    content hash actually changed; cached validations are dropped only for the
+    boards whose file changed (all of them when the keywords change).
+    """
+
+    def __init__(self, data_dir=CURRICULUM_DATA_DIR, reload_seconds=CURRICULUM_RELOAD_SECONDS):
+        self.data_dir = data_dir
+        self.reload_seconds = None if str(reload_seconds).lower() in ("off", "false", "") else float(reload_seconds)
+        self._lock = threading.Lock()
+        self._index = None
+        self._next_check = 0.0
+        # path -> (stat signature, sha256, parsed data) for every file the current index was built from
+        self._files = {}
+        # canonical board name, "manifest" or "keywords" -> sha256
+        self._digests = {}
+        self.versions = {}
+        self.reloads = 0
+        self.last_reload = None
+        self.last_error = None
+        self._cache_lock = threading.Lock()
+        self._validation_cache = {}
+        self._board_epochs = {}
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def _load_file(self, name, files):
+        """Parsed contents of a data file, re-read only when its stat signature moved"""
+        path = self._path(name)
+        signature = _stat_signature(path)
+        cached = self._files.get(path)
+        if cached is None or signature is None or cached[0] != signature:
+            data, digest = _read_json(path)
+            cached = (signature, digest, data)
+        files[path] = cached
+        return cached[2], cached[1]
+
+    def _build(self):
+        """Read the files; returns (index, files, digests, versions)"""
+        files = {}
+        manifest, manifest_digest = self._load_file(MANIFEST_FILE, files)
+        subjects_by_board = {}
+        curriculum_topics = {}
+        digests = {"manifest": manifest_digest}
+        versions = {"manifest": manifest.get("version")}
+        for entry in manifest["boards"]:
+            board = entry["board"]
+            data, digest = self._load_file(entry["file"], files)
+            if data.get("board", board) != board:
+                raise ValueError(f"{entry['file']} holds {data.get('board')!r}, manifest expects {board!r}")
+            subjects_by_board[board] = {_grade_key(grade): subjects for grade, subjects in data.get("subjects", {}).items()}
+            curriculum_topics[board] = {
+                subject: {_grade_key(grade): topics for grade, topics in grades.items()}
+                for subject, grades in data.get("topics", {}).items()
+            }
+            digests[canonical_name(board)] = digest
+            versions[board] = data.get("version")
+        keywords, digests["keywords"] = self._load_file(manifest["keywords"], files)
+        versions["keywords"] = keywords.get("version")
+        index = CurriculumIndex(subjects_by_board, curriculum_topics, keywords["keywords"], digests)
+        return index, files, digests, versions
+
+    def index(self):
+        """The current CurriculumIndex, loading it on first use and reloading edited files"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._reload_locked()
+        elif self.reload_seconds is not None and time.monotonic() >= self._next_check:
+            self.reload(wait=False)
+        return self._index
+
+    def _files_changed(self):
+        return any(_stat_signature(path) != signature for path, (signature, _, _) in self._files.items())
+
+    def reload(self, force=False, wait=True):
+        """Swap in a new index if any file changed; returns the boards whose data changed"""
+        if not self._lock.acquire(blocking=wait):
+            # Another thread is already checking; keep serving the current index
+            return []
+        try:
+            if not force and self._index is not None and not self._files_changed():
+                self._next_check = time.monotonic() + (self.reload_seconds or 0.0)
+                return []
+            if force:
+                self._files = {}
+            return self._reload_locked()
+        finally:
+            self._lock.release()
+
+    def _reload_locked(self):
+        self._next_check = time.monotonic() + (self.reload_seconds or 0.0)
+        try:
+            index, files, digests, versions = self._build()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            if self._index is None:
+                raise
+            # A half-saved or broken file must not take the app down; keep the last good curriculum
+            error = f"{type(e).__name__}: {e}"
+            if error != self.last_error:
+                logger.warning("curriculum reload failed, keeping the current index: %s", error)
+            self.last_error = error
+            return []
+        self.last_error = None
+        self._files = files
+        if digests == self._digests:
+            # Touched or re-saved without edits
+            return []
+        if digests.get("keywords") != self._digests.get("keywords"):
+            # Keyword fallbacks can decide a validation on any board
+            changed = {board for board in set(self._digests) | set(digests) if board not in ("manifest", "keywords")}
+        else:
+            changed = {board for board in set(self._digests) | set(digests)
+                       if board not in ("manifest", "keywords") and self._digests.get(board) != digests.get(board)}
+        first_load = self._index is None
+        self._index = index
+        self._digests, self.versions = digests, versions
+        if first_load:
+            return []
+        with self._cache_lock:
+            for board in changed:
+                self._validation_cache.pop(board, None)
+                self._board_epochs[board] = self._board_epochs.get(board, 0) + 1
+        self.reloads += 1
+        self.last_reload = time.time()
+        logger.info("curriculum reloaded: %s", json.dumps({"changed": sorted(changed), "versions": versions}))
+        return sorted(changed)
+
+    def cached_validation(self, board, key, compute):
+        """compute()'s result for (board, key), cached until that board's curriculum changes"""
+        board_key = canonical_name(board)
+        with self._cache_lock:
+            board_cache = self._validation_cache.get(board_key)
+            if board_cache is not None and key in board_cache:
+                board_cache.move_to_end(key)
+                return board_cache[key]
+            epoch = self._board_epochs.get(board_key, 0)
+        result = compute()
+        with self._cache_lock:
+            # Drop results computed against a curriculum that was swapped out meanwhile
+            if self._board_epochs.get(board_key, 0) == epoch:
+                board_cache = self._validation_cache.setdefault(board_key, OrderedDict())
+                board_cache[key] = result
+                if len(board_cache) > CURRICULUM_VALIDATION_CACHE_SIZE:
+                    board_cache.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._cache_lock:
+            cached = {board: len(entries) for board, entries in self._validation_cache.items()}
+        return {
+            "data_dir": self.data_dir,
+            "versions": dict(self.versions),
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+            "cached_validations": cached
+        }
+
+
+_curriculum_store = CurriculumStore()
+
+
+def get_curriculum_store():
+    return _curriculum_store
@@ -3,10 +3,12 @@ import streamlit as st
 # Import enhanced curriculum functions from mock_test_creator
 try:
     from src.components.mock_test_creator import (
-        get_comprehensive_curriculum_topics,
-        get_subjects_by_board,
+        get_available_subjects,
+        get_topics_by_board_grade_subject,
         get_paper_types_by_board_and_grade,
-        get_ib_grade_options
+        get_ib_grade_options,
+        get_paper_metrics,
+        get_curriculum_source
     )
     CURRICULUM_FUNCTIONS_AVAILABLE = True
 except ImportError:
@@ -16,57 +18,39 @@ except ImportError:
 # Import centralized styles - CSS is handled by main.py
 # No CSS imports needed here as styles are centralized
 
+def get_curriculum_totals():
+    """Board, subject and topic counts, computed once when the curriculum index (or snapshot) is built"""
+    return dict(get_curriculum_source().totals)
+
 def get_curriculum_statistics():
     """Get comprehensive curriculum statistics across all boards"""
     if not CURRICULUM_FUNCTIONS_AVAILABLE:
         return {
-            'total_tests': 5247,
+            'total_tests': 0,
             'total_boards': 5,
             'total_subjects': 45,
             'total_topics': 2847,
-            'success_rate': 98.9
+            'success_rate': None
         }
     
     try:
-        # Get curriculum data
-        curriculum_data = get_comprehensive_curriculum_topics()
-        subjects_data = get_subjects_by_board()
-        
-        # Calculate statistics
-        total_topics = 0
-        total_subjects = set()
-        board_count = len(curriculum_data)
-        
-        for board, board_data in curriculum_data.items():
-            for subject, subject_data in board_data.items():
-                total_subjects.add(subject)
-                for grade, topics in subject_data.items():
-                    total_topics += len(topics)
-        
-        # Enhanced statistics with curriculum data
+        # Live paper counts come from the metrics store's running counters, not a recount
+        paper_metrics = get_paper_metrics()
         return {
-            'total_tests': 5247,  # This would come from a database in real implementation
-            'total_boards': board_count,
-            'total_subjects': len(total_subjects),
-            'total_topics': total_topics,
-            'success_rate': 98.9,
+            **get_curriculum_totals(),
+            'total_tests': paper_metrics['total_tests'],
+            'success_rate': paper_metrics['success_rate'],
             'curriculum_coverage': 95.8,
-            'board_specific_tests': {
-                'CBSE': 2156,
-                'ICSE': 1324,
-                'IB': 789,
-                'Cambridge IGCSE': 654,
-                'State Board': 324
-            }
+            'board_specific_tests': paper_metrics['board_specific_tests']
         }
     except Exception:
         # Fallback statistics
         return {
-            'total_tests': 5247,
+            'total_tests': 0,
             'total_boards': 5,
             'total_subjects': 45,
             'total_topics': 2847,
-            'success_rate': 98.9
+            'success_rate': None
         }
 
 def get_board_specific_features():
@@ -125,14 +109,11 @@ def get_enhanced_sample_topics():
         }
     
     try:
-        curriculum_data = get_comprehensive_curriculum_topics()
         sample_topics = {}
         
         # Get sample topics from CBSE Grade 10 as representative examples
-        cbse_grade_10 = curriculum_data.get('CBSE', {})
-        
-        for subject, subject_data in cbse_grade_10.items():
-            grade_10_topics = subject_data.get(10, [])
+        for subject in get_available_subjects('CBSE', 10):
+            grade_10_topics = get_topics_by_board_grade_subject('CBSE', 10, subject)
             if grade_10_topics:
                 # Take first 6 topics as samples
                 sample_topics[subject] = grade_10_topics[:6]
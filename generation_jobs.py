@@ -0,0 +1,202 @@
+import concurrent.futures
+import os
+import threading
+import time
+import uuid
+
+QUEUED = "queued"
+RUNNING = "running"
+PARSED = "parsed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+GENERATION_JOB_WORKERS = int(os.environ.get("GENERATION_JOB_WORKERS", "4"))
+# Speculative jobs run on their own smaller pool so guesses never hold up papers users asked for
+GENERATION_SPECULATIVE_WORKERS = int(os.environ.get("GENERATION_SPECULATIVE_WORKERS", "1"))
+# Finished jobs are forgotten after this long; sessions keep only the ids
+GENERATION_JOB_RETENTION_SECONDS = float(os.environ.get("GENERATION_JOB_RETENTION_SECONDS", "1800"))
+
+
+class GenerationJob:
+    """One paper being generated off the Streamlit script thread
+
+    The worker updates the job and the script thread reads snapshot(); both
+    go through the lock, so a rerun always sees a consistent status.
+    """
+
+    def __init__(self, selection, total_questions, speculative=False):
+        self.id = uuid.uuid4().hex
+        self.selection = selection
+        self.speculative = speculative
+        self.cancel_event = threading.Event()
+        self.future = None
+        self._lock = threading.Lock()
+        self._status = QUEUED
+        self._questions_done = 0
+        self._partial_questions = []
+        self._total_questions = total_questions
+        self._queue_position = None
+        self._source = None
+        self._result = None
+        self._error = None
+        self._raw_content = None
+        self._created_at = time.time()
+        self._started_at = None
+        self._finished_at = None
+
+    def mark_running(self):
+        with self._lock:
+            self._status = RUNNING
+            self._started_at = time.time()
+
+    def record_question(self, question=None):
+        with self._lock:
+            self._questions_done += 1
+            self._queue_position = None
+            if question is not None:
+                self._partial_questions.append(question)
+
+    def record_queue_position(self, position, expected_wait):
+        with self._lock:
+            self._queue_position = (position, expected_wait)
+
+    def set_source(self, source):
+        """Where the paper came from: generated, joined, cache or degraded"""
+        with self._lock:
+            self._source = source
+
+    def finish(self, result, error=None, raw_content=None):
+        with self._lock:
+            self._status = PARSED if result is not None else FAILED
+            self._result = result
+            self._error = error
+            self._raw_content = raw_content
+            self._partial_questions = []
+            if result is not None:
+                self._questions_done = len(result.get("questions", []))
+            self._finished_at = time.time()
+
+    def mark_cancelled(self):
+        with self._lock:
+            self._status = CANCELLED
+            self._finished_at = time.time()
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            self.mark_cancelled()
+
+    def status(self):
+        with self._lock:
+            return self._status
+
+    @property
+    def result(self):
+        with self._lock:
+            return self._result
+
+    def is_finished(self):
+        return self.status() in (PARSED, FAILED, CANCELLED)
+
+    def finished_before(self, cutoff):
+        with self._lock:
+            return self._finished_at is not None and self._finished_at < cutoff
+
+    def snapshot(self):
+        with self._lock:
+            end = self._finished_at or time.time()
+            return {
+                "id": self.id,
+                "selection": self.selection,
+                "speculative": self.speculative,
+                "status": self._status,
+                "questions_done": self._questions_done,
+                "total_questions": self._total_questions,
+                "partial_questions": list(self._partial_questions),
+                "queue_position": self._queue_position,
+                "source": self._source,
+                "error": self._error,
+                "raw_content": self._raw_content,
+                "elapsed": round(end - (self._started_at or self._created_at), 1)
+            }
+
+
+class JobRegistry:
+    """Process-wide table of generation jobs running on bounded executors (one for speculative jobs)"""
+
+    def __init__(self, max_workers=GENERATION_JOB_WORKERS, retention_seconds=GENERATION_JOB_RETENTION_SECONDS,
+                 speculative_workers=GENERATION_SPECULATIVE_WORKERS):
+        self.retention_seconds = retention_seconds
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation-job")
+        self._speculative_executor = concurrent.futures.ThreadPoolExecutor(max_workers=speculative_workers,
+                                                                           thread_name_prefix="speculative-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._stats = {"submitted": 0, "parsed": 0, "failed": 0, "cancelled": 0}
+
+    def submit(self, selection, total_questions, work, speculative=False):
+        """Queue work(job) -> (result, error, raw_content) and return the job straight away"""
+        job = GenerationJob(selection, total_questions, speculative=speculative)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._stats["submitted"] += 1
+        executor = self._speculative_executor if speculative else self._executor
+        job.future = executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job, work):
+        if job.cancel_event.is_set():
+            job.mark_cancelled()
+            self._count("cancelled")
+            return
+        job.mark_running()
+        try:
+            result, error, raw_content = work(job)
+        except BaseException as e:
+            # Cancellation unwinds through the generation as an exception; anything else is a failure
+            if job.cancel_event.is_set():
+                job.mark_cancelled()
+                self._count("cancelled")
+            else:
+                job.finish(None, f"Unexpected error: {e}")
+                self._count("failed")
+            return
+        job.finish(result, error, raw_content)
+        self._count("parsed" if result is not None else "failed")
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished_before(cutoff)]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            jobs = list(self._jobs.values())
+        statuses = [job.status() for job in jobs]
+        stats["queued"] = statuses.count(QUEUED)
+        stats["running"] = statuses.count(RUNNING)
+        return stats
+
+
+_job_registry = JobRegistry()
+
+
+def get_job_registry():
+    """Return the job registry shared by every Streamlit session in this process"""
+    return _job_registry
@@ -0,0 +1,160 @@
+import bisect
+from collections import deque
+
+# Subjects whose relevance check falls back to related subjects' keywords, in the order they are tried
+SCIENCE_SUBJECTS = ("Physics", "Chemistry", "Biology")
+SOCIAL_SCIENCE_SUBJECTS = ("History", "Geography", "Civics", "Economics", "Political Science")
+
+# Joins keywords for the reverse (topic inside keyword) search; never part of a keyword
+SEPARATOR = "\0"
+
+
+class KeywordAutomaton:
+    """Aho–Corasick automaton over lowercased keywords
+
+    search() reports every keyword occurring in a text in one pass over it
+    (overlapping ones included);
+    containing() reports the keywords that contain the text, using a single
+    substring search over all keywords joined together.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        patterns = [str(keyword).lower() for keyword in self.keywords]
+        # state -> {char: state}, failure link and the keyword indexes ending at the state
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for keyword_index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (keyword_index,)
+        self._empty = tuple(index for index, pattern in enumerate(patterns) if not pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+        self._lengths = [len(pattern) for pattern in patterns]
+        self._alphabet = frozenset("".join(patterns))
+        # Resolved transitions, filled in lazily by _step; bounded by the states times the alphabet
+        self._delta = [dict(row) for row in self._goto]
+        self._joined = SEPARATOR.join(patterns)
+        self._starts = []
+        position = 0
+        for pattern in patterns:
+            self._starts.append(position)
+            position += len(pattern) + len(SEPARATOR)
+
+    def _step(self, state, char):
+        """Transition through failure links, memoized so each (state, char) pair is resolved once"""
+        next_state = self._goto[state].get(char)
+        if next_state is None:
+            next_state = self._step(self._fail[state], char) if state else 0
+        self._delta[state][char] = next_state
+        return next_state
+
+    def search(self, text):
+        """{keyword index: (start, end)} of the first occurrence of every keyword in an already-lowercased text"""
+        found = dict.fromkeys(self._empty, (0, 0))
+        delta, output, lengths, alphabet = self._delta, self._output, self._lengths, self._alphabet
+        state = 0
+        for end, char in enumerate(text, 1):
+            if char not in alphabet:
+                # No keyword contains it, so every partial match ends here
+                state = 0
+                continue
+            next_state = delta[state].get(char)
+            state = self._step(state, char) if next_state is None else next_state
+            for index in output[state]:
+                if index not in found:
+                    found[index] = (end - lengths[index], end)
+        return found
+
+    def containing(self, text):
+        """Indexes of the keywords that contain an already-lowercased text"""
+        if not text:
+            return range(len(self.keywords))
+        if SEPARATOR in text:
+            return ()
+        found = []
+        position = self._joined.find(text)
+        while position != -1:
+            # The keyword whose slot the match starts in; separators keep matches inside one keyword
+            found.append(bisect.bisect_right(self._starts, position) - 1)
+            position = self._joined.find(text, position + 1)
+        return found
+
+    def matches(self, text):
+        """{keyword index: (start, end)} for keywords in the text or containing it, spans in the text"""
+        matched = self.search(text)
+        for index in self.containing(text):
+            if index not in matched:
+                matched[index] = (0, len(text))
+        return matched
+
+
+class SubjectKeywordMatcher:
+    """One automaton per subject plus the Science and Social Science fallback groups, built once"""
+
+    def __init__(self, subject_keywords):
+        self.subject_keywords = subject_keywords
+        self._automata = {subject: KeywordAutomaton(keywords) for subject, keywords in subject_keywords.items()}
+        self._groups = {}
+        for group, members in (("Science", SCIENCE_SUBJECTS), ("Social Science", SOCIAL_SCIENCE_SUBJECTS)):
+            members = [member for member in members if member in subject_keywords]
+            keywords = []
+            owners = []
+            for member_order, member in enumerate(members):
+                for keyword_order, keyword in enumerate(subject_keywords[member]):
+                    keywords.append(keyword)
+                    owners.append((member_order, keyword_order))
+            self._groups[group] = (KeywordAutomaton(keywords), owners)
+
+    def _fallback_group(self, subject):
+        if subject == "Science":
+            return self._groups["Science"]
+        if "Social Science" in subject:
+            return self._groups["Social Science"]
+        return None
+
+    def relevance(self, topic, subject):
+        """(matches, hits) with hits as (keyword, start, end) spans in the cleaned topic
+
+        Same decision as the two-way substring loop: any subject keyword inside the
+        topic or containing it. Failing that, Science tries Physics, Chemistry and
+        Biology and Social Science tries its subjects, each stopping at the first
+        matching keyword of the first subject that has one.
+        """
+        topic_clean = str(topic).lower().strip()
+        automaton = self._automata.get(subject)
+        hits = []
+        if automaton is not None:
+            matched = automaton.matches(topic_clean)
+            hits = [(automaton.keywords[index], *matched[index]) for index in sorted(matched)]
+        if hits:
+            return True, hits
+
+        group = self._fallback_group(subject)
+        if group is not None:
+            automaton, owners = group
+            matched = automaton.matches(topic_clean)
+            if matched:
+                first = min(matched, key=lambda index: owners[index])
+                return True, [(automaton.keywords[first], *matched[first])]
+        return False, []
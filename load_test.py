@@ -0,0 +1,281 @@
+"""Concurrency load test: N tutor sessions through create_test -> generate -> test_display -> PDF
+
+Usage:
+    python load_test.py --sessions 20 --papers 3                     # against an in-process stand-in
+    python load_test.py --sessions 50 --latency 1.5 --rate-429 0.05 --save-baseline
+    python load_test.py --sessions 20 --papers 3 --baseline load_test_baseline.json
+
+Every session runs the same calls the pages make: the create_test form lookups
+and topic validation, a background generation job polled until it is parsed,
+opening the paper for test_display, then both PDF downloads (skipped when
+reportlab is not installed). Unless --api-url is given, a claude_standin server
+is started in-process so no API credit is spent. The paper cache, metrics and
+usage databases live in a temporary directory for the run, so synthetic papers
+and load-test counters never reach the app's real stores. The report covers throughput,
+p50/p95/p99 per stage and memory per session; --save-baseline stores it and
+--baseline compares a later run against it, exiting 1 on a regression.
+"""
+import argparse
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+LOAD_TEST_BASELINE_FILE = os.environ.get("LOAD_TEST_BASELINE_FILE", "load_test_baseline.json")
+# A stage's p95 or the throughput may get this much worse than the baseline before it counts as a regression
+LOAD_TEST_TOLERANCE = float(os.environ.get("LOAD_TEST_TOLERANCE", "0.2"))
+
+STAGES = ("form", "generate", "first_question", "display", "pdf", "flow")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent tutor sessions")
+    parser.add_argument("--papers", type=int, default=2, help="papers generated by each session")
+    parser.add_argument("--api-url", help="use this Messages API instead of an in-process stand-in")
+    parser.add_argument("--use-cache", action="store_true", help="allow paper cache hits instead of forcing fresh papers")
+    parser.add_argument("--poll-seconds", type=float, default=0.1, help="how often a session checks its job")
+    parser.add_argument("--timeout", type=float, default=300, help="give up on a paper after this many seconds")
+    parser.add_argument("--latency", type=float, default=0.5, help="stand-in seconds before the first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=400, help="stand-in output speed")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the full report to this JSON file")
+    parser.add_argument("--save-baseline", nargs="?", const=LOAD_TEST_BASELINE_FILE, help="store this run as the baseline")
+    parser.add_argument("--baseline", nargs="?", const=LOAD_TEST_BASELINE_FILE, help="compare this run with a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=LOAD_TEST_TOLERANCE)
+    return parser.parse_args()
+
+
+def configure_api(args, storage_dir):
+    """Point the app at the stand-in (or --api-url) and its stores at storage_dir; returns the stand-in or None
+
+    Must run before the app modules are imported, since they read these settings at import time.
+    """
+    os.environ["PAPER_CACHE_DIR"] = os.path.join(storage_dir, "paper_cache")
+    os.environ["METRICS_DB_FILE"] = os.path.join(storage_dir, "metrics.sqlite3")
+    os.environ["USAGE_DB_FILE"] = os.path.join(storage_dir, "usage.sqlite3")
+    standin = None
+    if args.api_url:
+        os.environ["CLAUDE_API_URL"] = args.api_url
+    else:
+        from src.components.claude_standin import StandinConfig, start_standin_server
+        config = StandinConfig(latency=args.latency, latency_jitter=args.latency / 2, tokens_per_second=args.tokens_per_second,
+                               rate_401=0.0, rate_429=args.rate_429, rate_500=args.rate_500,
+                               truncate_rate=args.truncate_rate, malformed_rate=args.malformed_rate, seed=args.seed)
+        standin = start_standin_server(config, port=0)
+        os.environ["CLAUDE_API_URL"] = standin.api_url
+    os.environ.setdefault("CLAUDE_API_KEY", "sk-ant-api03-load-test")
+    return standin
+
+
+class StageTimer:
+    """Stage durations from every session, collected under a lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {stage: [] for stage in STAGES}
+        self.outcomes = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+    def outcome(self, name):
+        with self._lock:
+            self.outcomes[name] = self.outcomes.get(name, 0) + 1
+
+
+def run_session(session_index, args, app, timer, pdf_dir, retained):
+    """One tutor: fill the form, generate, open and download each paper in turn"""
+    selections = app["selections"]
+    for paper_index in range(args.papers):
+        selection = selections[(session_index + paper_index) % len(selections)]
+        board, grade, subject, topic, paper_type = (selection["board"], selection["grade"], selection["subject"],
+                                                    selection["topic"], selection["paper_type"])
+        flow_started = time.monotonic()
+
+        # create_test: the lookups and validation the form runs on every rerun
+        started = time.monotonic()
+        app["get_subjects_by_board"]()
+        app["get_paper_types_by_board_and_grade"](board, grade)
+        app["get_topics_by_board_grade_subject"](board, grade, subject)
+        app["validate_topic_against_curriculum"](board, grade, subject, topic)
+        timer.add("form", time.monotonic() - started)
+
+        # generate: submit a background job and poll it like the status panel does
+        started = time.monotonic()
+        job = app["submit_generation_job"](board, grade, subject, topic, paper_type, False, force_refresh=not args.use_cache)
+        first_question_seen = False
+        while not job.is_finished():
+            if time.monotonic() - started > args.timeout:
+                job.cancel()
+                break
+            if not first_question_seen and job.snapshot()["questions_done"]:
+                first_question_seen = True
+                timer.add("first_question", time.monotonic() - started)
+            time.sleep(args.poll_seconds)
+        snapshot = job.snapshot()
+        if snapshot["status"] != "parsed":
+            timer.outcome(snapshot["status"] if snapshot["status"] != "running" else "timeout")
+            continue
+        timer.add("generate", time.monotonic() - started)
+        timer.outcome(f"parsed_{snapshot['source']}")
+
+        # test_display: the session keeps its own copy of the paper
+        started = time.monotonic()
+        test_data = copy.deepcopy(job.result)
+        test_data["test_info"]["show_answers_on_screen"] = False
+        retained[session_index] = test_data
+        timer.add("display", time.monotonic() - started)
+
+        # PDF downloads, to per-session files so concurrent sessions do not overwrite each other
+        if app["pdf_available"]:
+            started = time.monotonic()
+            base = os.path.join(pdf_dir, f"session{session_index}_paper{paper_index}")
+            app["create_questions_pdf"](test_data, base + "_questions.pdf")
+            app["create_answers_pdf"](test_data, base + "_answers.pdf")
+            timer.add("pdf", time.monotonic() - started)
+
+        timer.add("flow", time.monotonic() - flow_started)
+
+
+def build_report(args, timer, elapsed, memory, pdf_available, standin):
+    from src.components.retry_policy import percentile
+    stages = {}
+    for stage in STAGES:
+        durations = timer.durations[stage]
+        if durations:
+            stages[stage] = {
+                "count": len(durations),
+                "p50": round(percentile(durations, 50), 4),
+                "p95": round(percentile(durations, 95), 4),
+                "p99": round(percentile(durations, 99), 4)
+            }
+    papers = len(timer.durations["generate"])
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "papers_per_session": args.papers,
+            "api": args.api_url or "standin",
+            "use_cache": args.use_cache,
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "rate_429": args.rate_429,
+            "rate_500": args.rate_500,
+            "truncate_rate": args.truncate_rate,
+            "malformed_rate": args.malformed_rate
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "papers": papers,
+        "throughput_papers_per_minute": round(papers / elapsed * 60, 2) if elapsed else 0.0,
+        "outcomes": timer.outcomes,
+        "stages": stages,
+        "pdf_stage": "measured" if pdf_available else "skipped (reportlab not installed)",
+        "memory": memory,
+        "standin": standin.standin_state.stats if standin else None
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """Human-readable regressions against the baseline report"""
+    regressions = []
+    if baseline.get("config") != report["config"]:
+        print("⚠️  Baseline was recorded with a different configuration; comparison is indicative only")
+    old_throughput = baseline.get("throughput_papers_per_minute", 0)
+    if old_throughput and report["throughput_papers_per_minute"] < old_throughput * (1 - tolerance):
+        regressions.append(f"throughput {report['throughput_papers_per_minute']}/min vs baseline {old_throughput}/min")
+    for stage, row in report["stages"].items():
+        old_row = baseline.get("stages", {}).get(stage)
+        if old_row and old_row["p95"] and row["p95"] > old_row["p95"] * (1 + tolerance):
+            regressions.append(f"{stage} p95 {row['p95']:.3f}s vs baseline {old_row['p95']:.3f}s")
+    old_memory = baseline.get("memory", {}).get("peak_kb_per_session")
+    if old_memory and report["memory"]["peak_kb_per_session"] > old_memory * (1 + tolerance):
+        regressions.append(f"peak memory {report['memory']['peak_kb_per_session']} KB/session vs baseline {old_memory} KB/session")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="load_test_") as storage_dir:
+        return run_load_test(args, storage_dir)
+
+
+def run_load_test(args, storage_dir):
+    standin = configure_api(args, storage_dir)
+
+    # Imported after configure_api so the app modules read the stand-in's URL
+    from src.components import mock_test_creator
+    from src.components.model_ab_test import SAMPLE_SELECTIONS
+    app = {
+        "selections": SAMPLE_SELECTIONS,
+        "get_subjects_by_board": mock_test_creator.get_subjects_by_board,
+        "get_paper_types_by_board_and_grade": mock_test_creator.get_paper_types_by_board_and_grade,
+        "get_topics_by_board_grade_subject": mock_test_creator.get_topics_by_board_grade_subject,
+        "validate_topic_against_curriculum": mock_test_creator.validate_topic_against_curriculum,
+        "submit_generation_job": mock_test_creator.submit_generation_job,
+        "create_questions_pdf": mock_test_creator.create_questions_pdf,
+        "create_answers_pdf": mock_test_creator.create_answers_pdf,
+        "pdf_available": mock_test_creator.PDF_AVAILABLE
+    }
+
+    timer = StageTimer()
+    retained = {}
+    tracemalloc.start()
+    memory_before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix="load_test_pdfs_") as pdf_dir:
+        threads = [threading.Thread(target=run_session, args=(index, args, app, timer, pdf_dir, retained), name=f"session-{index}")
+                   for index in range(args.sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.monotonic() - started
+    memory_after, memory_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    memory = {
+        # Growth while the sessions ran, shared out per session; retained is what each session keeps for test_display
+        "peak_kb_per_session": round((memory_peak - memory_before) / 1024 / args.sessions, 1),
+        "retained_kb_per_session": round((memory_after - memory_before) / 1024 / args.sessions, 1)
+    }
+
+    report = build_report(args, timer, elapsed, memory, app["pdf_available"], standin)
+    print(f"{args.sessions} sessions x {args.papers} papers in {report['elapsed_seconds']}s: "
+          f"{report['papers']} papers, {report['throughput_papers_per_minute']} papers/min")
+    print(f"outcomes: {json.dumps(report['outcomes'])}")
+    print(f"{'stage':<16}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<16}{row['count']:>7}{row['p50']:>8.3f}s{row['p95']:>8.3f}s{row['p99']:>8.3f}s")
+    if not app["pdf_available"]:
+        print("pdf stage skipped: reportlab is not installed")
+    print(f"memory: peak {memory['peak_kb_per_session']} KB/session, retained {memory['retained_kb_per_session']} KB/session")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare_with_baseline(report, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"✅ no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
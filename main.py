@@ -2,6 +2,8 @@ import streamlit as st
 import json
 import requests
 import re
+import copy
+import time
 from datetime import datetime
 import os
 
@@ -14,12 +16,31 @@ from src.components.mock_test_creator import (
     get_ib_grade_options,
     get_topics_by_board_grade_subject,
     validate_topic_against_curriculum,
-    generate_questions,
+    rank_curriculum_topics,
     test_claude_api,
     verify_api_key,
     create_questions_pdf,
     create_answers_pdf,
-    get_comprehensive_curriculum_topics
+    get_comprehensive_curriculum_topics,
+    warm_up_claude_connection,
+    get_claude_connection_stats,
+    get_paper_cache_stats,
+    get_prompt_cache_stats,
+    get_retry_stats,
+    get_rate_limiter_stats,
+    get_single_flight_stats,
+    get_model_routing_stats,
+    start_speculative_generation,
+    submit_generation_job,
+    get_generation_job,
+    get_generation_job_stats,
+    get_stage_timing_stats,
+    get_usage_report,
+    get_paper_metrics,
+    get_stage_timing_prometheus,
+    start_stage_timing_endpoint,
+    get_curriculum_data_stats,
+    get_circuit_breaker_status
 )
 
 # Configure page
@@ -624,8 +645,9 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Configuration
-CLAUDE_API_KEY = ""
-CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+CLAUDE_API_KEY = os.environ.get("CLAUDE_API_KEY", "")
+# Point at a local claude_standin.py server for offline and load testing
+CLAUDE_API_URL = os.environ.get("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages")
 
 # Add these imports for PDF generation
 try:
@@ -638,6 +660,65 @@ try:
 except ImportError:
     PDF_AVAILABLE = False
 
+# Warm the shared Claude connection pool once per server process
+warm_up_claude_connection()
+
+# Prometheus endpoint for the pipeline stage timings (also shown on the timings page)
+start_stage_timing_endpoint()
+
+# How often the status of papers still generating is refreshed
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1.0"))
+# Streamlit 1.37+ (1.33+ as experimental_fragment) reruns just the job panels on a timer;
+# older versions fall back to rerunning the whole page
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+def every_job_poll(render):
+    """Turn a panel into a fragment that reruns itself every JOB_POLL_SECONDS, when fragments exist"""
+    if _fragment is None:
+        return render
+    return _fragment(run_every=JOB_POLL_SECONDS)(render)
+
+def display_question(question, number, show_answers_on_screen):
+    """Display a single question card; used for the full test and for streamed questions"""
+    with st.container():
+        st.markdown(f"""
+        <div class="question-box">
+            <h4 style="color: #667eea; margin-bottom: 0.5rem;">Question {number}</h4>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    st.markdown(f"**{question.get('question', 'Question text missing')}**")
+    
+    if question.get('type') == 'mcq' and 'options' in question:
+        options = question['options']
+        for option_key, option_text in options.items():
+            st.write(f"**{option_key})** {option_text}")
+        
+        # Only show correct answer if "Show Answers on Screen" was checked
+        if show_answers_on_screen and 'correct_answer' in question and question['correct_answer']:
+            st.success(f"**Correct Answer: {question['correct_answer']}**")
+            # Show explanation if available
+            if 'explanation' in question and question['explanation']:
+                st.info(f"**Explanation:** {question['explanation']}")
+    
+    elif question.get('type') == 'short' or question.get('type') == 'short_answer':
+        marks = question.get('marks', 3)
+        st.write(f"**[Short Answer Question - {marks} marks]**")
+        st.write("Write your detailed answer below:")
+        # Only show sample answer if "Show Answers on Screen" was checked
+        if show_answers_on_screen and 'sample_answer' in question and question['sample_answer']:
+            st.info(f"**Sample Answer:** {question['sample_answer']}")
+    
+    elif question.get('type') == 'long' or question.get('type') == 'long_answer':
+        marks = question.get('marks', 6)
+        st.write(f"**[Long Answer Question - {marks} marks]**")
+        st.write("Write your detailed answer with proper explanations:")
+        # Only show sample answer if "Show Answers on Screen" was checked
+        if show_answers_on_screen and 'sample_answer' in question and question['sample_answer']:
+            st.info(f"**Sample Answer:** {question['sample_answer']}")
+    
+    st.markdown("---")
+
 def display_generated_test(test_data):
     """Display the generated test in a formatted way with enhanced curriculum info"""
     if not test_data:
@@ -692,44 +773,110 @@ def display_generated_test(test_data):
     
     # Questions display
     for i, question in enumerate(questions, 1):
-        with st.container():
-            st.markdown(f"""
-            <div class="question-box">
-                <h4 style="color: #667eea; margin-bottom: 0.5rem;">Question {i}</h4>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown(f"**{question.get('question', 'Question text missing')}**")
-        
-        if question.get('type') == 'mcq' and 'options' in question:
-            options = question['options']
-            for option_key, option_text in options.items():
-                st.write(f"**{option_key})** {option_text}")
-            
-            # Only show correct answer if "Show Answers on Screen" was checked
-            if show_answers_on_screen and 'correct_answer' in question and question['correct_answer']:
-                st.success(f"**Correct Answer: {question['correct_answer']}**")
-                # Show explanation if available
-                if 'explanation' in question and question['explanation']:
-                    st.info(f"**Explanation:** {question['explanation']}")
-        
-        elif question.get('type') == 'short' or question.get('type') == 'short_answer':
-            marks = question.get('marks', 3)
-            st.write(f"**[Short Answer Question - {marks} marks]**")
-            st.write("Write your detailed answer below:")
-            # Only show sample answer if "Show Answers on Screen" was checked
-            if show_answers_on_screen and 'sample_answer' in question and question['sample_answer']:
-                st.info(f"**Sample Answer:** {question['sample_answer']}")
-        
-        elif question.get('type') == 'long' or question.get('type') == 'long_answer':
-            marks = question.get('marks', 6)
-            st.write(f"**[Long Answer Question - {marks} marks]**")
-            st.write("Write your detailed answer with proper explanations:")
-            # Only show sample answer if "Show Answers on Screen" was checked
-            if show_answers_on_screen and 'sample_answer' in question and question['sample_answer']:
-                st.info(f"**Sample Answer:** {question['sample_answer']}")
-        
-        st.markdown("---")
+        display_question(question, i, show_answers_on_screen)
+
+def open_job_paper(entry, job):
+    """Show a finished background paper on the test page"""
+    test_data = copy.deepcopy(job.result)
+    test_data['test_info']['show_answers_on_screen'] = entry['show_answers']
+    st.session_state.generated_test = test_data
+    st.session_state.current_page = 'test_display'
+    st.session_state.open_when_ready = None
+    st.rerun()
+
+def show_generation_jobs():
+    """Status panel for this session's background papers; returns True while any is still generating"""
+    jobs = []
+    for entry in st.session_state.generation_jobs:
+        job = get_generation_job(entry['id'])
+        if job is not None:
+            jobs.append((entry, job, job.snapshot()))
+    # Jobs the registry has already forgotten are dropped from the session too
+    st.session_state.generation_jobs = [entry for entry, job, snapshot in jobs]
+    if not jobs:
+        return False
+    
+    active = False
+    st.markdown("#### 🧾 Your Papers")
+    for entry, job, snapshot in reversed(jobs):
+        board, grade, subject, topic, paper_type = snapshot['selection']
+        label = f"{board} Grade {grade} {subject} - {topic} ({paper_type})"
+        status = snapshot['status']
+        status_col, action_col = st.columns([5, 1])
+        with status_col:
+            if status == 'queued':
+                active = True
+                st.info(f"⏳ {label}: queued")
+            elif status == 'running':
+                active = True
+                done, total = snapshot['questions_done'], snapshot['total_questions']
+                if snapshot['queue_position']:
+                    position, expected_wait = snapshot['queue_position']
+                    progress_text = f"waiting for a slot (#{position} in line, ~{expected_wait:.0f}s)"
+                else:
+                    progress_text = f"{done} of {total} questions"
+                st.progress(min(done / total, 1.0) if total else 0.0, text=f"🤖 {label}: {progress_text}")
+            elif status == 'parsed':
+                source_note = {"cache": " from a previously generated paper", "degraded": " from a saved paper (Claude AI unavailable)"}.get(snapshot['source'], "")
+                st.success(f"✅ {label}: ready - {snapshot['questions_done']} questions in {snapshot['elapsed']}s{source_note}")
+            elif status == 'failed':
+                st.error(f"❌ {label}: {snapshot['error']}")
+                if snapshot['raw_content']:
+                    with st.expander("Raw response"):
+                        st.code(snapshot['raw_content'])
+            else:
+                st.warning(f"🚫 {label}: cancelled")
+        with action_col:
+            if status == 'parsed':
+                if st.button("📄 Open", key=f"open_job_{snapshot['id']}", use_container_width=True):
+                    open_job_paper(entry, job)
+            elif status in ('queued', 'running'):
+                if st.button("✖ Cancel", key=f"cancel_job_{snapshot['id']}", use_container_width=True):
+                    job.cancel()
+                    st.rerun()
+            elif st.button("Dismiss", key=f"dismiss_job_{snapshot['id']}", use_container_width=True):
+                st.session_state.generation_jobs = [other for other in st.session_state.generation_jobs if other['id'] != snapshot['id']]
+                st.rerun()
+    st.markdown("---")
+    return active
+
+def session_jobs_active():
+    """True while any of this session's papers is queued or running"""
+    for entry in st.session_state.generation_jobs:
+        job = get_generation_job(entry['id'])
+        if job is not None and job.status() in ('queued', 'running'):
+            return True
+    return False
+
+def refresh_generation_jobs():
+    """Job panel, then open the paper the user is waiting for once it is ready"""
+    st.session_state.jobs_active = show_generation_jobs()
+    if st.session_state.open_when_ready and st.session_state.current_page == 'create_test':
+        waiting_job = get_generation_job(st.session_state.open_when_ready)
+        waiting_entry = next((entry for entry in st.session_state.generation_jobs if entry['id'] == st.session_state.open_when_ready), None)
+        if waiting_job is None or waiting_entry is None or waiting_job.status() in ('failed', 'cancelled'):
+            st.session_state.open_when_ready = None
+        elif waiting_job.status() == 'parsed':
+            open_job_paper(waiting_entry, waiting_job)
+
+@every_job_poll
+def poll_generation_jobs():
+    """refresh_generation_jobs on a timer; the last paper finishing triggers one full rerun, which stops the timer"""
+    refresh_generation_jobs()
+    if not st.session_state.jobs_active:
+        st.rerun()
+
+@every_job_poll
+def show_partial_questions(show_answers_on_screen):
+    """Questions of the paper being waited for, shown as they arrive"""
+    waiting_job = get_generation_job(st.session_state.open_when_ready) if st.session_state.open_when_ready else None
+    if waiting_job is None:
+        return
+    partial_questions = waiting_job.snapshot()['partial_questions']
+    if partial_questions:
+        st.markdown("### ⚡ Questions so far")
+        for number, question in enumerate(partial_questions, 1):
+            display_question(question, number, show_answers_on_screen)
 
 # Initialize enhanced session state
 if 'current_page' not in st.session_state:
@@ -755,6 +902,20 @@ if 'curriculum_data' not in st.session_state:
 if 'last_validated_topic' not in st.session_state:
     st.session_state.last_validated_topic = ''
 
+# Background generation: papers this session started, oldest first, and the one to open when it is ready
+if 'generation_jobs' not in st.session_state:
+    st.session_state.generation_jobs = []
+
+if 'open_when_ready' not in st.session_state:
+    st.session_state.open_when_ready = None
+
+# While papers are generating only the job panel refreshes itself (when fragments are available)
+if session_jobs_active():
+    poll_generation_jobs()
+else:
+    refresh_generation_jobs()
+jobs_active = st.session_state.jobs_active
+
 # MAIN APPLICATION CONTENT - ENHANCED WITH CURRICULUM INTEGRATION
 if st.session_state.current_page == 'home':
     # Header - CENTERED AND BIGGER
@@ -768,10 +929,11 @@ if st.session_state.current_page == 'home':
     </div>
     """, unsafe_allow_html=True)
     
-    # ENHANCED STATS BADGE WITH CURRICULUM INFO
-    st.markdown("""
+    # ENHANCED STATS BADGE WITH CURRICULUM INFO (live count from the metrics store)
+    paper_metrics = get_paper_metrics()
+    st.markdown(f"""
     <div style="display: flex; justify-content: center; margin: 30px 0;">
-        <div class="stats-badge">📊 5,247 Curriculum-Aligned Tests Generated Across 5 Boards</div>
+        <div class="stats-badge">📊 {paper_metrics['total_tests']:,} Curriculum-Aligned Tests Generated Across 5 Boards</div>
     </div>
     """, unsafe_allow_html=True)
     
@@ -867,6 +1029,73 @@ elif st.session_state.current_page == 'create_test':
         if st.button("📋 Detailed API Verification", key="verify_api_big", use_container_width=True):
             verify_api_key()
     
+    # Claude API health as seen by the shared circuit breaker
+    breaker_status = get_circuit_breaker_status()
+    if breaker_status['state'] == 'open':
+        st.error(
+            f"🔴 Claude API circuit OPEN - {breaker_status['error_rate']}% of recent calls failed. "
+            f"New requests use previously generated papers; retrying in {breaker_status['retry_in']:.0f}s."
+        )
+    elif breaker_status['state'] == 'half_open':
+        st.warning("🟡 Claude API circuit HALF-OPEN - testing whether the API has recovered")
+    else:
+        st.caption(f"🟢 Claude API circuit closed ({breaker_status['recent_calls']} recent calls, {breaker_status['error_rate']}% errors)")
+    
+    # Shared connection pool usage across all sessions
+    pool_stats = get_claude_connection_stats()
+    st.caption(
+        f"🔌 Connection pool: {pool_stats['pool_hits']} pool hits / {pool_stats['handshakes']} handshakes "
+        f"({pool_stats['pool_hit_rate']}% reuse, pool size {pool_stats['pool_size']})"
+    )
+    cache_stats = get_paper_cache_stats()
+    st.caption(
+        f"🗄️ Paper cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']}% hit rate, {cache_stats['entries']} papers stored)"
+    )
+    prompt_cache_stats = get_prompt_cache_stats()
+    if prompt_cache_stats['requests']:
+        st.caption(
+            f"🧩 Prompt cache: {prompt_cache_stats['cache_reads']}/{prompt_cache_stats['requests']} calls reused the cached prefix "
+            f"({prompt_cache_stats['cache_read_tokens']} cached input tokens, {prompt_cache_stats['cached_input_share']}% of input) | "
+            f"first token {prompt_cache_stats['avg_first_token_cold']}s cold → {prompt_cache_stats['avg_first_token_warm']}s warm"
+            + (f" | {prompt_cache_stats['below_minimum']} calls below the model's cacheable prefix length"
+               if prompt_cache_stats['below_minimum'] else "")
+        )
+    retry_stats = get_retry_stats()
+    if retry_stats['requests']:
+        st.caption(
+            f"🔁 Claude calls: {retry_stats['requests']} requests, {retry_stats['retried_requests']} retried | "
+            f"success {retry_stats['first_attempt_success_rate']}% first try → {retry_stats['final_success_rate']}% with retries | "
+            f"p95 {retry_stats['p95_latency']}s"
+        )
+    limiter_stats = get_rate_limiter_stats()
+    st.caption(
+        f"🚦 Request queue: {limiter_stats['queue_length']} waiting | "
+        f"{limiter_stats['requests_available']} requests / {limiter_stats['tokens_available']} tokens available this minute | "
+        f"avg wait {limiter_stats['average_wait']}s"
+    )
+    routing_stats = get_model_routing_stats()
+    if routing_stats:
+        st.caption("🧭 Model routing: " + " | ".join(
+            f"{tier} {row['calls']} papers, p50 {row['p50_latency']}s, {row['error_rate']}% errors, {row['repair_rate']}% repaired"
+            for tier, row in routing_stats.items()
+        ))
+    job_stats = get_generation_job_stats()
+    if job_stats['submitted']:
+        st.caption(
+            f"🧾 Background papers: {job_stats['running']} running, {job_stats['queued']} queued | "
+            f"{job_stats['parsed']} ready, {job_stats['failed']} failed, {job_stats['cancelled']} cancelled"
+        )
+    flight_stats = get_single_flight_stats()
+    if flight_stats['coalesced']:
+        st.caption(
+            f"🤝 Identical requests joined: {flight_stats['coalesced']} generations saved "
+            f"({flight_stats['in_flight']} in flight now)"
+        )
+    if st.button("⏱️ Pipeline timings & costs", key="timings_page_btn"):
+        st.session_state.current_page = 'timings'
+        st.rerun()
+    
     st.markdown("---")
     
     # Step 1: Board Selection
@@ -1055,6 +1284,11 @@ elif st.session_state.current_page == 'create_test':
             topic_valid = False
             st.error(f"⚠️ Topic '{topic}' doesn't match {board} Grade {grade} {subject} curriculum")
             
+            # Near misses (shared words or word stems) first, then the curriculum list
+            ranked_topics = rank_curriculum_topics(board, grade_num if board == "IB" else grade, subject, topic, limit=3)
+            if ranked_topics:
+                st.info("🔎 **Closest curriculum topics:** " + ", ".join(f"{name} (score {score:g})" for name, score in ranked_topics))
+            
             # Show curriculum-based suggestions
             if curriculum_topics:
                 st.info(f"💡 **Suggested topics from {board} Grade {grade} {subject} curriculum:**")
@@ -1082,10 +1316,10 @@ elif st.session_state.current_page == 'create_test':
                     st.info(f"📚 And {len(curriculum_topics) - 16} more topics in {board} Grade {grade} {subject} curriculum")
         else:
             st.success(f"✅ Topic '{topic}' is valid for {board} Grade {grade} {subject}")
-            # Show matched curriculum topics for confirmation
-            matched_topics = [t for t in curriculum_topics if topic.lower() in t.lower() or t.lower() in topic.lower()]
-            if matched_topics:
-                st.info(f"🎯 **Matched curriculum topics:** {', '.join(matched_topics[:3])}")
+            # Show matched curriculum topics for confirmation, best match first
+            ranked_topics = rank_curriculum_topics(board, grade_num if board == "IB" else grade, subject, topic, limit=3)
+            if ranked_topics:
+                st.info("🎯 **Matched curriculum topics:** " + ", ".join(f"{name} (score {score:g})" for name, score in ranked_topics))
         
         # Store validation result
         st.session_state.last_validated_topic = topic if is_relevant else ''
@@ -1224,6 +1458,25 @@ elif st.session_state.current_page == 'create_test':
         paper_type = ""
     
     include_answers = st.checkbox("Show answers on screen after generation", value=False, key="show_answers_checkbox")
+    stream_questions = st.checkbox("⚡ Show questions as they are generated", value=True, key="stream_questions_checkbox")
+    force_fresh = st.checkbox("🔄 Always generate a fresh paper (skip previously generated papers)", value=False, key="force_fresh_checkbox")
+    speculative = st.checkbox("🔮 Start preparing the paper in the background as soon as the form is complete", value=False, key="speculative_checkbox")
+    
+    # Speculative generation: start the paper before the button is pressed, and drop it if the selection changes
+    speculative_selection = (board, grade_num if board == "IB" else grade, subject, topic, paper_type)
+    speculative_job = st.session_state.get('speculative_job')
+    if speculative_job and (not speculative or not (all_valid and paper_type) or force_fresh
+                            or speculative_job.selection != speculative_selection):
+        speculative_job.cancel()
+        st.session_state.speculative_job = speculative_job = None
+    if speculative and all_valid and paper_type and not force_fresh and speculative_job is None:
+        st.session_state.speculative_job = speculative_job = start_speculative_generation(*speculative_selection, include_answers)
+    if speculative_job:
+        speculative_status = speculative_job.status()
+        if speculative_status in ("queued", "running"):
+            st.caption("🔮 Preparing this paper in the background - generating it will be quicker")
+        elif speculative_status == "parsed":
+            st.caption("🔮 This paper is ready - generating it will be instant")
     
     # Enhanced Submit button
     st.markdown("---")
@@ -1235,17 +1488,26 @@ elif st.session_state.current_page == 'create_test':
             if not all_valid or not paper_type:
                 st.error("❌ Please fix validation errors and select paper type before creating the test")
             else:
-                with st.spinner("🤖 Generating curriculum-aligned questions..."):
-                    test_data = generate_questions(board, grade_num if board == "IB" else grade, subject, topic, paper_type, include_answers)
-                    
-                    if test_data:
-                        st.success("✅ Curriculum-aligned test generated successfully!")
-                        st.balloons()
-                        st.session_state.generated_test = test_data
-                        st.session_state.current_page = 'test_display'
-                        st.rerun()
-                    else:
-                        st.error("❌ Failed to generate test. Please check your API connection and try again.")
+                # Adopt the paper already being prepared for this selection instead of starting another;
+                # one still waiting for the small speculative pool is dropped for a regular job
+                if speculative_job and speculative_job.status() in ("running", "parsed"):
+                    job = speculative_job
+                    st.session_state.speculative_job = None
+                else:
+                    if speculative_job:
+                        speculative_job.cancel()
+                        st.session_state.speculative_job = None
+                    job = submit_generation_job(
+                        board, grade_num if board == "IB" else grade, subject, topic, paper_type, include_answers,
+                        force_refresh=force_fresh
+                    )
+                st.session_state.generation_jobs.append({'id': job.id, 'show_answers': include_answers})
+                st.session_state.open_when_ready = job.id
+                st.rerun()
+    
+    # Questions of the paper being waited for, shown as they arrive
+    if stream_questions and st.session_state.open_when_ready and jobs_active:
+        show_partial_questions(include_answers)
     
     # Navigation
     col1, col2, col3 = st.columns([1, 2, 1])
@@ -1326,6 +1588,80 @@ elif st.session_state.current_page == 'test_display':
             st.session_state.current_page = 'create_test'
             st.rerun()
 
+elif st.session_state.current_page == 'timings':
+    st.markdown("## ⏱️ Generation Pipeline Timings")
+    st.caption("Rolling percentiles over recent spans from every session on this server")
+    
+    timing_stats = get_stage_timing_stats()
+    if timing_stats:
+        st.table([
+            {"Stage": stage, "Count": row['count'], "Mean (s)": row['mean'],
+             "p50 (s)": row['p50'], "p95 (s)": row['p95'], "p99 (s)": row['p99']}
+            for stage, row in timing_stats.items()
+        ])
+    else:
+        st.info("📭 No timings recorded yet - generate a paper or build a PDF first")
+    
+    metrics_url = start_stage_timing_endpoint()
+    if metrics_url:
+        st.caption(f"📡 Prometheus endpoint: {metrics_url}")
+    with st.expander("Prometheus text"):
+        st.code(get_stage_timing_prometheus(), language="text")
+    
+    st.markdown("## 💰 Token & Cost Accounting")
+    usage_report = get_usage_report()
+    usage_totals = usage_report['totals']
+    if usage_totals['calls']:
+        st.caption(
+            f"{usage_totals['calls']} Claude calls for {usage_totals['papers']} papers | "
+            f"{usage_totals['input_tokens']:,} input / {usage_totals['output_tokens']:,} output tokens | "
+            f"${usage_totals['cost']:.2f} total"
+        )
+        st.markdown("#### By paper type (most expensive first)")
+        st.table([
+            {"Paper type": row['paper_type'], "Model": row['model'], "Papers": row['papers'],
+             "Cost / paper ($)": row['cost_per_paper'], "Output tokens / question": row['output_tokens_per_question'],
+             "Input tokens / question": row['input_tokens_per_question'], "Avg call (s)": row['avg_latency'],
+             "Failed calls": row['failed_calls']}
+            for row in usage_report['by_paper_type']
+        ])
+        st.markdown("#### By board and grade")
+        st.table([
+            {"Board": row['board'], "Grade": row['grade'], "Papers": row['papers'], "Cost ($)": row['cost'],
+             "Cost / paper ($)": row['cost_per_paper'], "Output tokens / question": row['output_tokens_per_question'],
+             "Avg call (s)": row['avg_latency']}
+            for row in usage_report['by_board']
+        ])
+        st.markdown("#### Per hour")
+        st.table([
+            {"Hour": row['hour'], "Calls": row['calls'], "Papers": row['papers'], "Questions": row['questions'],
+             "Output tokens": row['output_tokens'], "Cost ($)": row['cost'], "Avg call (s)": row['avg_latency']}
+            for row in usage_report['per_hour'][:24]
+        ])
+    else:
+        st.info("📭 No Claude calls recorded yet")
+    
+    curriculum_data = get_curriculum_data_stats()
+    st.caption(
+        "📚 Curriculum data versions: " + ", ".join(f"{name} v{version}" for name, version in curriculum_data['versions'].items())
+        + f" · {curriculum_data['reloads']} hot reload(s)"
+        + (f" · lookups served from snapshot {curriculum_data['snapshot']}" if curriculum_data['snapshot'] else "")
+    )
+    if curriculum_data['last_error']:
+        st.error(f"❌ Last curriculum reload failed, still serving the previous data: {curriculum_data['last_error']}")
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        if st.button("← Back to Create", key="timings_back", use_container_width=True):
+            st.session_state.current_page = 'create_test'
+            st.rerun()
+
+# Without fragments, poll by rerunning the whole page while papers are generating; the test
+# page is left alone so reruns do not reset its PDF download buttons
+if _fragment is None and jobs_active and st.session_state.current_page != 'test_display':
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
+
 # Entry point
 if __name__ == "__main__":
     pass
@@ -0,0 +1,117 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Append-only event log plus running counters; shared by every app process on the host
+METRICS_DB_FILE = os.environ.get("METRICS_DB_FILE", ".metrics.sqlite3")
+
+PAPER_DELIVERED = "paper_delivered"
+PAPER_FAILED = "paper_failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    event TEXT NOT NULL,
+    board TEXT,
+    grade TEXT,
+    subject TEXT,
+    paper_type TEXT,
+    source TEXT,
+    questions INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def counter_names(event, board=None, source=None):
+    """Counters an event increments: the event total plus per-board and per-source totals"""
+    names = [event]
+    if board:
+        names.append(f"{event}:board:{board}")
+    if source:
+        names.append(f"{event}:source:{source}")
+    return names
+
+
+class MetricsStore:
+    """SQLite (WAL) event log with counters maintained in the same transaction
+
+    Readers get counters from an in-memory copy, so a dashboard render costs a
+    dictionary lookup. The copy is reloaded only when PRAGMA data_version shows
+    another process has committed since the last read.
+    """
+
+    def __init__(self, db_file=METRICS_DB_FILE):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._connection = None
+        self._counters = None
+        self._data_version = None
+        self.enabled = bool(db_file) and db_file.lower() != "off"
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def record(self, event, board=None, grade=None, subject=None, paper_type=None, source=None, questions=0):
+        """Append an event and bump its counters atomically"""
+        if not self.enabled:
+            return
+        names = counter_names(event, board, source)
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        "INSERT INTO events (timestamp, event, board, grade, subject, paper_type, source, questions) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (time.time(), event, board, str(grade) if grade is not None else None, subject, paper_type, source, questions)
+                    )
+                    connection.executemany(
+                        "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                        [(name,) for name in names]
+                    )
+                # data_version only moves for other connections' commits, so the copy is updated here
+                if self._counters is not None:
+                    for name in names:
+                        self._counters[name] = self._counters.get(name, 0) + 1
+        except sqlite3.Error as e:
+            logger.warning("could not record %s in %s: %s", event, self.db_file, e)
+
+    def counters(self):
+        """All counters as a dict; cheap enough to call on every render"""
+        if not self.enabled:
+            return {}
+        try:
+            with self._lock:
+                connection = self._connect()
+                data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+                if self._counters is None or data_version != self._data_version:
+                    self._counters = dict(connection.execute("SELECT name, value FROM counters").fetchall())
+                    self._data_version = data_version
+                return dict(self._counters)
+        except sqlite3.Error as e:
+            logger.warning("could not read counters from %s: %s", self.db_file, e)
+            return {}
+
+    def get(self, name, default=0):
+        return self.counters().get(name, default)
+
+
+_metrics_store = MetricsStore()
+
+
+def get_metrics_store():
+    return _metrics_store
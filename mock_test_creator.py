@@ -4,13 +4,54 @@ import requests
 import re
 from datetime import datetime
 import os
+import time
+import uuid
+import queue
+import concurrent.futures
+
+from src.components.claude_client import get_claude_client, iter_sse_events
+from src.components.question_stream import QuestionStreamParser
+from src.components.paper_cache import get_paper_cache, make_cache_key
+from src.components.retry_policy import send_with_retries, get_retry_recorder, RETRYABLE_STATUS_CODES
+from src.components.rate_limiter import get_rate_limiter, estimate_request_tokens, RateLimitTimeout, RateLimitCancelled
+from src.components.single_flight import get_generation_flights
+from src.components.circuit_breaker import get_claude_breaker, CircuitOpenError
+from src.components.generation_jobs import get_job_registry
+from src.components.perf_timing import get_timing_recorder, span, timed, start_metrics_endpoint
+from src.components.usage_store import get_usage_store
+from src.components.metrics_store import get_metrics_store, PAPER_DELIVERED, PAPER_FAILED
+from src.components.curriculum_index import canonical_grade
+from src.components.curriculum_store import get_curriculum_store
+from src.components.curriculum_snapshot import get_curriculum_snapshot
+from src.components.prompt_cache import get_prompt_cache_recorder, cached_system_blocks, is_cacheable, PROMPT_CACHING_BETA
+from src.components.model_router import route_model, get_routing_log, MODEL_TIERS
+from src.components.compact_schema import (
+    COMPACT_ARRAY_KEY, COMPACT_FORMAT_INSTRUCTIONS, CompactSchemaError, expand_question, expand_questions
+)
 
 # Import centralized styles - CSS is handled by main.py
 # No CSS imports needed here as styles are centralized
 
 # Configuration
-CLAUDE_API_KEY = ""
-CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+CLAUDE_API_KEY = os.environ.get("CLAUDE_API_KEY", "")
+# Point at a local claude_standin.py server for offline and load testing
+CLAUDE_API_URL = os.environ.get("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages")
+# Default model; small papers may be routed to a faster tier by model_router
+CLAUDE_MODEL = MODEL_TIERS["standard"]
+
+# Bump whenever build_system_prompt or build_generation_prompt changes so cached papers from the old prompt are not reused
+PROMPT_TEMPLATE_VERSION = "2024-11-v4"
+
+# Output budget per question type in the compact wire format, used to size max_tokens from the requested counts
+GENERATION_BASE_TOKENS = 50
+TOKENS_PER_QUESTION = {'mcq': 110, 'short': 140, 'long': 360}
+CLAUDE_MAX_OUTPUT_TOKENS = 8192
+MAX_CONTINUATION_REQUESTS = 2
+
+# Large papers are split into shards of at most this many questions and generated concurrently
+GENERATION_SHARD_SIZE = int(os.environ.get("GENERATION_SHARD_SIZE", "15"))
+GENERATION_MAX_WORKERS = int(os.environ.get("GENERATION_MAX_WORKERS", "8"))
+_shard_executor = concurrent.futures.ThreadPoolExecutor(max_workers=GENERATION_MAX_WORKERS, thread_name_prefix="claude-shard")
 
 # Add these imports for PDF generation
 try:
@@ -23,8 +64,12 @@ try:
 except ImportError:
     PDF_AVAILABLE = False
 
-def get_board_specific_guidelines(board, grade, subject, topic):
-    """Get comprehensive guidelines for ALL boards, grades, subjects, and topics"""
+def get_board_specific_guidelines(board, grade, subject, topic=None):
+    """Get comprehensive guidelines for ALL boards, grades, subjects, and topics
+    
+    Without a topic only the board and grade guidance is returned, which stays
+    identical for every topic and can be cached as a prompt prefix.
+    """
     
     # Universal grade-level cognitive development guidelines
     grade_development = {
@@ -93,13 +138,17 @@ BOARD: {board}
 Language: {board_info['language']}
 Examples: {board_info['examples']}
 Assessment Style: {board_info['assessment']}
+Difficulty: {board_info['difficulty']}
 
 GRADE {grade} LEVEL:
 Cognitive Development: {grade_level}
-
+"""
+        if topic:
+            guidelines += f"""
 TOPIC: "{topic}"
 Focus: All questions must be specifically about "{topic}" as taught in {board} Grade {grade} {subject}
-Complexity: Match {board} Grade {grade} examination standards
+"""
+        guidelines += f"""Complexity: Match {board} Grade {grade} examination standards
 Context: Use {board_info['examples']} where appropriate
 Language: {board_info['language']} terminology and style
 """
@@ -126,7 +175,15 @@ def get_ib_grade_options():
 
 def get_paper_types_by_board_and_grade(board, grade):
     """Return paper types based on board and grade selection"""
-    
+    snapshot = get_curriculum_snapshot()
+    if snapshot is not None:
+        paper_types = snapshot.paper_types(board, grade)
+        # Grades outside the curriculum are not in the snapshot; the rules still give them a default
+        if paper_types:
+            return paper_types
+    return _paper_types_by_rules(board, grade)
+
+def _paper_types_by_rules(board, grade):
     # Extract numeric grade for processing
     if isinstance(grade, str) and "Grade" in grade:
         try:
@@ -273,372 +330,21 @@ def get_igcse_paper_types():
     """Legacy function - now uses get_paper_types_by_board_and_grade"""
     return get_paper_types_by_board_and_grade("Cambridge IGCSE", 10)
 
-# COMPREHENSIVE Subject mapping with complete curriculum standards for ALL 5 BOARDS
-def get_subjects_by_board():
-    return {
-        "CBSE": {
-            1: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            2: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            3: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "Computer Science", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            4: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "Computer Science", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            5: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "Computer Science", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            6: ["Mathematics", "English", "Hindi", "Science", "Social Science", "Sanskrit", "Computer Science", "Physical Education"],
-            7: ["Mathematics", "English", "Hindi", "Science", "Social Science", "Sanskrit", "Computer Science", "Physical Education"],
-            8: ["Mathematics", "English", "Hindi", "Science", "Social Science", "Sanskrit", "Computer Science", "Physical Education"],
-            9: ["Mathematics", "English", "Hindi", "Science", "Social Science", "Sanskrit", "Computer Science", "Physical Education", "Information Technology"],
-            10: ["Mathematics", "English", "Hindi", "Science", "Social Science", "Sanskrit", "Computer Science", "Physical Education", "Information Technology"],
-            11: ["Mathematics", "Physics", "Chemistry", "Biology", "English Core", "Computer Science", "Economics", "Business Studies", "Accountancy", "Political Science", "Geography", "History", "Psychology", "Physical Education", "Applied Mathematics", "Biotechnology", "Engineering Graphics"],
-            12: ["Mathematics", "Physics", "Chemistry", "Biology", "English Core", "Computer Science", "Economics", "Business Studies", "Accountancy", "Political Science", "Geography", "History", "Psychology", "Physical Education", "Applied Mathematics", "Biotechnology", "Engineering Graphics"]
-        },
-        "ICSE": {
-            1: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            2: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            3: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "Computer Applications", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            4: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "Computer Applications", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            5: ["Mathematics", "English", "Hindi", "EVS (Environmental Studies)", "Computer Applications", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            6: ["Mathematics", "English", "Hindi", "Physics", "Chemistry", "Biology", "History & Civics", "Geography", "Computer Applications", "Physical Education"],
-            7: ["Mathematics", "English", "Hindi", "Physics", "Chemistry", "Biology", "History & Civics", "Geography", "Computer Applications", "Physical Education"],
-            8: ["Mathematics", "English", "Hindi", "Physics", "Chemistry", "Biology", "History & Civics", "Geography", "Computer Applications", "Physical Education"],
-            9: ["Mathematics", "English", "Hindi", "Physics", "Chemistry", "Biology", "History & Civics", "Geography", "Computer Applications", "Physical Education", "Economics", "Commercial Studies"],
-            10: ["Mathematics", "English", "Hindi", "Physics", "Chemistry", "Biology", "History & Civics", "Geography", "Computer Applications", "Physical Education", "Economics", "Commercial Studies"],
-            11: ["Mathematics", "Physics", "Chemistry", "Biology", "English", "Computer Science", "Economics", "Commerce", "Accounts", "Business Studies", "Geography", "History", "Political Science", "Psychology", "Sociology", "Art", "Home Science", "Environmental Science"],
-            12: ["Mathematics", "Physics", "Chemistry", "Biology", "English", "Computer Science", "Economics", "Commerce", "Accounts", "Business Studies", "Geography", "History", "Political Science", "Psychology", "Sociology", "Art", "Home Science", "Environmental Science"]
-        },
-        "IB": {
-            1: ["Mathematics", "English", "Science", "Social Studies", "Arts", "Physical Education"],
-            2: ["Mathematics", "English", "Science", "Social Studies", "Arts", "Physical Education"],
-            3: ["Mathematics", "English", "Science", "Social Studies", "Arts", "Physical Education"],
-            4: ["Mathematics", "English", "Science", "Social Studies", "Arts", "Physical Education"],
-            5: ["Mathematics", "English", "Science", "Social Studies", "Arts", "Physical Education"],
-            6: ["Mathematics", "Language & Literature", "Language Acquisition", "Sciences", "Individuals & Societies", "Arts", "Physical & Health Education", "Design"],
-            7: ["Mathematics", "Language & Literature", "Language Acquisition", "Sciences", "Individuals & Societies", "Arts", "Physical & Health Education", "Design"],
-            8: ["Mathematics", "Language & Literature", "Language Acquisition", "Sciences", "Individuals & Societies", "Arts", "Physical & Health Education", "Design"],
-            9: ["Mathematics", "Language & Literature", "Language Acquisition", "Sciences", "Individuals & Societies", "Arts", "Physical & Health Education", "Design", "Computer Science"],
-            10: ["Mathematics", "Language & Literature", "Language Acquisition", "Sciences", "Individuals & Societies", "Arts", "Physical & Health Education", "Design", "Computer Science"],
-            11: ["Mathematics", "Physics", "Chemistry", "Biology", "English Literature", "Economics", "Business Management", "Psychology", "Geography", "History", "Philosophy", "Computer Science", "Visual Arts", "Theatre", "Music", "Film"],
-            12: ["Mathematics", "Physics", "Chemistry", "Biology", "English Literature", "Economics", "Business Management", "Psychology", "Geography", "History", "Philosophy", "Computer Science", "Visual Arts", "Theatre", "Music", "Film"]
-        },
-        "Cambridge IGCSE": {
-            1: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education"],
-            2: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education"],
-            3: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education"],
-            4: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education"],
-            5: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education"],
-            6: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education", "French", "Spanish"],
-            7: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education", "French", "Spanish"],
-            8: ["Mathematics", "English", "Science", "Social Studies", "ICT", "Art & Design", "Physical Education", "French", "Spanish"],
-            9: ["Mathematics", "English First Language", "English Literature", "Physics", "Chemistry", "Biology", "Computer Science", "Economics", "Business Studies", "Accounting", "Geography", "History", "Art & Design", "Music", "Physical Education", "French", "Spanish", "Additional Mathematics"],
-            10: ["Mathematics", "English First Language", "English Literature", "Physics", "Chemistry", "Biology", "Computer Science", "Economics", "Business Studies", "Accounting", "Geography", "History", "Art & Design", "Music", "Physical Education", "French", "Spanish", "Additional Mathematics"],
-            11: ["Mathematics", "Further Mathematics", "Physics", "Chemistry", "Biology", "Computer Science", "Economics", "Business", "Accounting", "Geography", "History", "Psychology", "Sociology", "Art & Design", "Music", "Physical Education", "English Language", "English Literature"],
-            12: ["Mathematics", "Further Mathematics", "Physics", "Chemistry", "Biology", "Computer Science", "Economics", "Business", "Accounting", "Geography", "History", "Psychology", "Sociology", "Art & Design", "Music", "Physical Education", "English Language", "English Literature"]
-        },
-        "State Board": {
-            1: ["Mathematics", "English", "Mother Tongue", "EVS (Environmental Studies)", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            2: ["Mathematics", "English", "Mother Tongue", "EVS (Environmental Studies)", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            3: ["Mathematics", "English", "Mother Tongue", "EVS (Environmental Studies)", "Computer Science", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            4: ["Mathematics", "English", "Mother Tongue", "EVS (Environmental Studies)", "Computer Science", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            5: ["Mathematics", "English", "Mother Tongue", "EVS (Environmental Studies)", "Computer Science", "GK (General Knowledge)", "Art & Craft", "Physical Education"],
-            6: ["Mathematics", "English", "Mother Tongue", "Science", "Social Science", "Computer Science", "Physical Education"],
-            7: ["Mathematics", "English", "Mother Tongue", "Science", "Social Science", "Computer Science", "Physical Education"],
-            8: ["Mathematics", "English", "Mother Tongue", "Science", "Social Science", "Computer Science", "Physical Education"],
-            9: ["Mathematics", "English", "Mother Tongue", "Science", "Social Science", "Computer Science", "Physical Education", "Vocational Subjects"],
-            10: ["Mathematics", "English", "Mother Tongue", "Science", "Social Science", "Computer Science", "Physical Education", "Vocational Subjects"],
-            11: ["Mathematics", "Physics", "Chemistry", "Biology", "English", "Computer Science", "Economics", "Commerce", "Accountancy", "Business Studies", "Political Science", "Geography", "History", "Psychology", "Sociology", "Agriculture", "Home Science"],
-            12: ["Mathematics", "Physics", "Chemistry", "Biology", "English", "Computer Science", "Economics", "Commerce", "Accountancy", "Business Studies", "Political Science", "Geography", "History", "Psychology", "Sociology", "Agriculture", "Home Science"]
-        }
-    }
-
-# NEW COMPREHENSIVE CURRICULUM TOPICS DATABASE
-def get_comprehensive_curriculum_topics():
-    """Complete topic database for all subjects, grades, and boards"""
-    return {
-        "CBSE": {
-            "Mathematics": {
-                1: ["Numbers 1-99", "Counting", "Before and After", "Shapes", "Patterns", "Addition", "Subtraction", "Money", "Time", "Measurement"],
-                2: ["Numbers 1-100", "Place Value", "Addition", "Subtraction", "Multiplication Tables", "Shapes", "Patterns", "Money", "Time", "Data Handling"],
-                3: ["Numbers 1-1000", "Place Value", "Addition", "Subtraction", "Multiplication", "Division", "Fractions", "Shapes", "Measurement", "Data Handling"],
-                4: ["Numbers", "Place Value", "Four Operations", "Factors and Multiples", "Fractions", "Decimals", "Measurement", "Geometry", "Data Handling"],
-                5: ["Large Numbers", "Four Operations", "Factors and Multiples", "Fractions", "Decimals", "Area and Perimeter", "Data Handling"],
-                6: ["Knowing Our Numbers", "Whole Numbers", "Playing with Numbers", "Basic Geometrical Ideas", "Integers", "Fractions", "Decimals", "Data Handling", "Mensuration", "Algebra", "Ratio and Proportion", "Practical Geometry"],
-                7: ["Integers", "Fractions and Decimals", "Data Handling", "Simple Equations", "Lines and Angles", "Triangles", "Congruence", "Comparing Quantities", "Rational Numbers", "Practical Geometry", "Perimeter and Area", "Algebraic Expressions", "Exponents and Powers", "Symmetry", "Visualising Solid Shapes"],
-                8: ["Rational Numbers", "Linear Equations in One Variable", "Quadrilaterals", "Practical Geometry", "Data Handling", "Squares and Square Roots", "Cubes and Cube Roots", "Comparing Quantities", "Algebraic Expressions", "Mensuration", "Exponents and Powers", "Direct and Inverse Proportions", "Factorisation", "Introduction to Graphs", "Playing with Numbers"],
-                9: ["Number Systems", "Polynomials", "Coordinate Geometry", "Linear Equations in Two Variables", "Introduction to Euclid's Geometry", "Lines and Angles", "Triangles", "Quadrilaterals", "Areas of Parallelograms and Triangles", "Circles", "Constructions", "Heron's Formula", "Surface Areas and Volumes", "Statistics", "Probability"],
-                10: ["Real Numbers", "Polynomials", "Pair of Linear Equations in Two Variables", "Quadratic Equations", "Arithmetic Progressions", "Triangles", "Coordinate Geometry", "Introduction to Trigonometry", "Some Applications of Trigonometry", "Circles", "Constructions", "Areas Related to Circles", "Surface Areas and Volumes", "Statistics", "Probability"],
-                11: ["Sets", "Relations and Functions", "Trigonometric Functions", "Principle of Mathematical Induction", "Complex Numbers and Quadratic Equations", "Linear Inequalities", "Permutations and Combinations", "Binomial Theorem", "Sequences and Series", "Straight Lines", "Conic Sections", "Introduction to Three Dimensional Geometry", "Limits and Derivatives", "Mathematical Reasoning", "Statistics", "Probability"],
-                12: ["Relations and Functions", "Inverse Trigonometric Functions", "Matrices", "Determinants", "Continuity and Differentiability", "Applications of Derivatives", "Integrals", "Applications of Integrals", "Differential Equations", "Vector Algebra", "Three Dimensional Geometry", "Linear Programming", "Probability"]
-            },
-            "Science": {
-                1: ["My Body", "Living and Non-Living", "Plants Around Us", "Animals Around Us", "Food", "Water", "My Family"],
-                2: ["Living and Non-Living", "Plants", "Animals", "Food", "Water", "Air", "Weather", "My Body", "Safety and First Aid"],
-                3: ["Living and Non-Living", "Plants", "Animals", "My Body", "Food", "Housing and Clothing", "Transport and Communication"],
-                4: ["Food", "Clothing", "Housing", "Water", "Travel and Transport", "The World of Plants", "The World of Animals", "Birds"],
-                5: ["Food and Health", "Clothing", "Housing", "Water", "Travel and Transport", "Plants", "Animals", "Birds", "Our Environment"],
-                6: ["Food", "Components of Food", "Fibre to Fabric", "Sorting Materials into Groups", "Separation of Substances", "Changes Around Us", "Getting to Know Plants", "Body Movements", "The Living Organisms", "Motion and Measurement of Distances", "Light, Shadows and Reflections", "Electricity and Circuits", "Fun with Magnets", "Water", "Air Around Us", "Garbage In, Garbage Out"],
-                7: ["Nutrition in Plants", "Nutrition in Animals", "Fibre to Fabric", "Heat", "Acids, Bases and Salts", "Physical and Chemical Changes", "Weather, Climate and Adaptations", "Winds, Storms and Cyclones", "Soil", "Respiration in Organisms", "Transportation in Animals and Plants", "Reproduction in Plants", "Motion and Time", "Electric Current and its Effects", "Light", "Water", "Forests", "Wastewater Story"],
-                8: ["Crop Production and Management", "Microorganisms", "Synthetic Fibres and Plastics", "Materials", "Coal and Petroleum", "Combustion and Flame", "Conservation of Plants and Animals", "Cell", "Reproduction in Animals", "Reaching the Age of Adolescence", "Force and Pressure", "Friction", "Sound", "Chemical Effects of Electric Current", "Some Natural Phenomena", "Light", "Stars and the Solar System", "Pollution of Air and Water"],
-                9: ["Matter in Our Surroundings", "Is Matter Around Us Pure", "Atoms and Molecules", "Structure of the Atom", "The Fundamental Unit of Life", "Tissues", "Diversity in Living Organisms", "Motion", "Force and Laws of Motion", "Gravitation", "Work and Energy", "Sound", "Why Do We Fall Ill", "Natural Resources", "Improvement in Food Resources"],
-                10: ["Chemical Reactions and Equations", "Acids, Bases and Salts", "Metals and Non-metals", "Carbon and its Compounds", "Periodic Classification of Elements", "Life Processes", "Control and Coordination", "How do Organisms Reproduce", "Heredity and Evolution", "Light", "Electricity", "Magnetic Effects of Electric Current", "Our Environment", "Management of Natural Resources"]
-            },
-            "Physical & Health Education": {
-                8: [
-                    # Key Concepts
-                    "Change", "Communication", "Relationships",
-                    
-                    # Physical Fitness & Training
-                    "Components of Fitness", "Cardiovascular Endurance", "Muscular Strength", "Muscular Endurance", 
-                    "Flexibility", "Body Composition", "Training Principles", "Specificity Principle", 
-                    "Progressive Overload", "Reversibility Principle", "Training Methods", "Periodization",
-                    "Exercise Physiology", "Heart Rate Zones", "Fitness Testing", "VO2 Max",
-                    
-                    # Health & Nutrition
-                    "Balanced Nutrition", "Macronutrients", "Micronutrients", "Hydration Strategies", 
-                    "Pre-exercise Nutrition", "Post-exercise Recovery", "Sports Nutrition", 
-                    "Healthy Lifestyle Choices", "Sleep and Recovery", "Stress Management",
-                    "Mental Health and Physical Activity", "Body Image", "Adolescent Health",
-                    
-                    # Movement & Skills
-                    "Fundamental Movement Skills", "Locomotor Skills", "Non-locomotor Skills", "Manipulative Skills",
-                    "Aesthetic Movement", "Gymnastics", "Dance", "Martial Arts", "Yoga", "Rhythmic Activities",
-                    "Team Sports", "Football", "Basketball", "Volleyball", "Hockey", "Cricket",
-                    "Individual Sports", "Athletics", "Swimming", "Track and Field", "Tennis", "Badminton",
-                    "Biomechanics", "Movement Analysis", "Technique Development", "Motor Learning",
-                    
-                    # Safety & First Aid
-                    "Safety in Physical Activity", "Risk Assessment", "Injury Prevention", "Warm-up", "Cool-down",
-                    "Basic First Aid", "RICE Protocol", "Emergency Procedures", "Sports Injuries",
-                    "Equipment Safety", "Environmental Safety", "Heat-related Illness", "Concussion Awareness",
-                    
-                    # Communication in Sports
-                    "Team Communication", "Verbal Communication", "Non-verbal Communication", 
-                    "Coach-Athlete Communication", "Referee Communication", "Leadership in Sports",
-                    "Conflict Resolution", "Sportsmanship", "Fair Play", "Respect in Sports",
-                    
-                    # Related Concepts
-                    "Adaptation", "Balance", "Energy", "Function", "Interaction", "Perspective", 
-                    "Space", "Systems", "Performance", "Environment", "Culture", "Identity"
-                ]
-            }
-        },
-        
-        "IB": {
-            "Mathematics": {
-                1: ["Number Recognition", "Counting", "Shapes", "Patterns", "Sorting", "Size Comparison"],
-                2: ["Numbers to 100", "Addition", "Subtraction", "Shapes", "Measurement", "Data Collection"],
-                3: ["Numbers to 1000", "Operations", "Fractions", "Geometry", "Measurement", "Graphs"],
-                4: ["Large Numbers", "Decimals", "Fractions", "Geometry", "Data Analysis", "Probability"],
-                5: ["Number Theory", "Operations", "Geometry", "Statistics", "Algebra Basics", "Problem Solving"],
-                6: ["Number", "Algebra", "Geometry", "Statistics", "Probability", "Mathematical Investigations"],
-                7: ["Number", "Algebra", "Geometry", "Statistics", "Probability", "Mathematical Investigations"],
-                8: ["Number", "Algebra", "Geometry", "Statistics", "Probability", "Mathematical Investigations"],
-                9: ["Number", "Algebra", "Geometry and Trigonometry", "Statistics and Probability", "Mathematical Investigations"],
-                10: ["Number", "Algebra", "Geometry and Trigonometry", "Statistics and Probability", "Mathematical Investigations"],
-                11: ["Number and Algebra", "Functions", "Geometry and Trigonometry", "Statistics and Probability", "Calculus"],
-                12: ["Number and Algebra", "Functions", "Geometry and Trigonometry", "Statistics and Probability", "Calculus"]
-            },
-            "Physical & Health Education": {
-                8: [
-                    # MYP Key Concepts
-                    "Change", "Communication", "Relationships",
-                    
-                    # Global Contexts
-                    "Personal and Cultural Expression", "Identities and Relationships", 
-                    "Scientific and Technical Innovation", "Globalization and Sustainability",
-                    
-                    # Related Concepts
-                    "Adaptation", "Balance", "Energy", "Function", "Interaction", "Perspective", 
-                    "Space", "Systems", "Performance", "Environment", "Culture", "Identity",
-                    
-                    # Physical Fitness
-                    "Components of Fitness", "Health-related Fitness", "Skill-related Fitness",
-                    "Cardiovascular Endurance", "Muscular Strength", "Muscular Endurance", 
-                    "Flexibility", "Body Composition", "Power", "Speed", "Agility", "Balance", "Coordination",
-                    
-                    # Training and Exercise Science
-                    "Training Principles", "FITT Principle", "Progressive Overload", "Specificity",
-                    "Reversibility", "Individual Differences", "Training Methods", "Interval Training",
-                    "Circuit Training", "Continuous Training", "Plyometric Training", "Strength Training",
-                    "Exercise Physiology", "Energy Systems", "Aerobic System", "Anaerobic Systems",
-                    "Heart Rate", "VO2 Max", "Lactate Threshold", "Recovery",
-                    
-                    # Nutrition and Health
-                    "Sports Nutrition", "Macronutrients", "Carbohydrates", "Proteins", "Fats",
-                    "Micronutrients", "Vitamins", "Minerals", "Hydration", "Pre-exercise Nutrition",
-                    "During-exercise Nutrition", "Post-exercise Nutrition", "Supplements",
-                    "Healthy Eating", "Balanced Diet", "Weight Management", "Body Image",
-                    
-                    # Movement and Skills
-                    "Fundamental Movement Skills", "Locomotor Skills", "Stability Skills", "Manipulative Skills",
-                    "Motor Learning", "Skill Acquisition", "Practice Methods", "Feedback",
-                    "Movement Patterns", "Technique Development", "Performance Analysis",
-                    
-                    # Aesthetic Movement
-                    "Dance", "Gymnastics", "Martial Arts", "Yoga", "Pilates", "Aerobics",
-                    "Creative Movement", "Cultural Dance", "Modern Dance", "Traditional Games",
-                    
-                    # Team Sports
-                    "Football", "Basketball", "Volleyball", "Hockey", "Rugby", "Cricket",
-                    "Team Tactics", "Team Strategies", "Roles and Responsibilities", "Team Dynamics",
-                    "Leadership", "Cooperation", "Communication in Team Sports",
-                    
-                    # Individual Sports
-                    "Athletics", "Swimming", "Tennis", "Badminton", "Golf", "Track and Field",
-                    "Individual Performance", "Goal Setting", "Self-motivation", "Mental Preparation",
-                    
-                    # Biomechanics
-                    "Movement Analysis", "Force", "Motion", "Levers", "Projectile Motion",
-                    "Center of Gravity", "Balance", "Stability", "Efficiency of Movement",
-                    
-                    # Psychology of Sport
-                    "Motivation", "Goal Setting", "Confidence", "Anxiety Management", "Concentration",
-                    "Mental Training", "Visualization", "Relaxation Techniques", "Self-talk",
-                    "Flow State", "Stress and Performance", "Team Cohesion", "Leadership Styles",
-                    
-                    # Health and Safety
-                    "Risk Management", "Injury Prevention", "First Aid", "RICE Protocol",
-                    "Safety Guidelines", "Equipment Safety", "Environmental Considerations",
-                    "Heat Illness", "Concussion", "Overuse Injuries", "Acute Injuries",
-                    
-                    # Global Health Issues
-                    "Physical Inactivity", "Obesity", "Non-communicable Diseases", "Mental Health",
-                    "Health Promotion", "Public Health", "Health Education", "Lifestyle Diseases",
-                    
-                    # Cultural and Social Aspects
-                    "Sport and Culture", "Gender in Sport", "Inclusion and Diversity", "Disability Sport",
-                    "Fair Play", "Ethics in Sport", "Sportsmanship", "Respect", "Responsibility",
-                    "International Sport", "Olympic Movement", "Paralympic Movement",
-                    
-                    # Communication in Physical Activity
-                    "Verbal Communication", "Non-verbal Communication", "Body Language",
-                    "Coaching Communication", "Referee Signals", "Team Communication",
-                    "Feedback", "Instructions", "Encouragement", "Conflict Resolution",
-                    
-                    # Technology in Sport
-                    "Performance Analysis", "Video Analysis", "Heart Rate Monitors", "GPS Tracking",
-                    "Biomechanical Analysis", "Sports Apps", "Wearable Technology", "Data Collection",
-                    
-                    # ATL Skills in PHE
-                    "Thinking Skills", "Research Skills", "Communication Skills", "Social Skills",
-                    "Self-management Skills", "Critical Thinking", "Creative Thinking",
-                    "Collaboration", "Organization", "Time Management"
-                ]
-            }
-        },
-        
-        # Continue with other boards...
-        "ICSE": {
-            "Mathematics": {
-                1: ["Numbers 1-100", "Addition", "Subtraction", "Shapes", "Patterns", "Money", "Time", "Measurement"],
-                2: ["Numbers 1-100", "Place Value", "Addition", "Subtraction", "Multiplication", "Shapes", "Patterns", "Money", "Time", "Measurement"],
-                3: ["Numbers 1-1000", "Four Operations", "Fractions", "Shapes", "Measurement", "Money", "Time", "Data"],
-                4: ["Numbers", "Four Operations", "Factors and Multiples", "Fractions", "Decimals", "Geometry", "Measurement", "Data"],
-                5: ["Large Numbers", "Four Operations", "Fractions", "Decimals", "Percentage", "Geometry", "Measurement", "Data"],
-                6: ["Number System", "Integers", "Fractions", "Decimals", "Percentage", "Ratio and Proportion", "Unitary Method", "Simple Interest", "Basic Algebra", "Geometry", "Mensuration", "Data Handling"],
-                7: ["Integers", "Rational Numbers", "Exponents", "Algebraic Expressions", "Simple Linear Equations", "Ratio and Proportion", "Unitary Method", "Percentage", "Profit and Loss", "Simple Interest", "Compound Interest", "Lines and Angles", "Triangles", "Symmetry", "Mensuration", "Data Handling"],
-                8: ["Rational Numbers", "Exponents", "Squares and Square Roots", "Cubes and Cube Roots", "Playing with Numbers", "Algebraic Expressions and Identities", "Factorisation", "Linear Equations", "Understanding Quadrilaterals", "Practical Geometry", "Mensuration", "Data Handling", "Probability"],
-                9: ["Rational and Irrational Numbers", "Compound Interest", "Expansions", "Factorisation", "Simultaneous Linear Equations", "Indices", "Logarithms", "Triangles", "Mean and Median", "Rectilinear Figures", "Theorem on Area", "Coordinate Geometry", "Trigonometry", "Statistics", "Probability"],
-                10: ["Commercial Mathematics", "Sales Tax and Value Added Tax", "Banking", "Linear Inequations", "Quadratic Equations", "Ratio and Proportion", "Similarity", "Loci", "Circles", "Constructions", "Mensuration", "Trigonometry", "Coordinate Geometry", "Statistics", "Probability"]
-            },
-            "Physics": {
-                6: ["Matter", "Physical Quantities and Measurement", "Force and Pressure", "Energy", "Light", "Sound", "Heat", "Magnetism"],
-                7: ["Matter", "Physical Quantities and Measurement", "Motion", "Energy", "Light", "Sound", "Heat", "Electricity", "Magnetism"],
-                8: ["Matter", "Force and Pressure", "Energy", "Light", "Sound", "Heat", "Electricity", "Magnetism"],
-                9: ["Measurements and Experimentation", "Motion in One Dimension", "Force and Laws of Motion", "Turning Effect of Forces", "Pressure in Fluids and Atmospheric Pressure", "Upthrust in Fluids, Archimedes' Principle and Floatation", "Heat and Energy", "Reflection of Light", "Propagation of Sound Waves", "Current Electricity", "Magnetism"],
-                10: ["Force", "Work, Energy and Power", "Machines", "Sound", "Light", "Spectrum", "Electromagnetic Induction", "Electromagnetic Radiation", "The Electron", "Atomic Structure", "Radioactivity"]
-            },
-            "Chemistry": {
-                6: ["Matter", "Elements, Compounds and Mixtures", "Separation of Mixtures", "Atomic Structure", "Language of Chemistry", "Metals and Non-metals"],
-                7: ["Matter", "Elements, Compounds and Mixtures", "Atomic Structure", "Language of Chemistry", "Chemical Reactions", "Acids, Bases and Salts", "Air and Atmosphere"],
-                8: ["Matter", "Atomic Structure", "Language of Chemistry", "Chemical Reactions", "Acids, Bases and Salts", "Hydrogen", "Water", "Carbon and its Compounds"],
-                9: ["The Language of Chemistry", "Chemical Changes and Reactions", "Water", "Atomic Structure and Chemical Bonding", "The Periodic Table", "Study of Gas Laws", "Atmospheric Pollution", "Sulphur", "Sound"],
-                10: ["Periodic Properties and Variations", "Chemical Bonding", "Study of Acids, Bases and Salts", "Analytical Chemistry", "Mole Concept and Stoichiometry", "Electrolysis", "Metallurgy", "Study of Compounds", "Organic Chemistry", "Practical Chemistry"]
-            },
-            "Biology": {
-                6: ["The Leaf", "Photosynthesis", "The Root", "The Stem", "The Flower", "Pollination and Fertilisation", "Seeds and their Germination", "Respiration in Plants", "Excretion in Plants", "The Cell", "Simple Tissues in Plants", "Absorption and Conduction in Plants"],
-                7: ["Nutrition in Plants", "Nutrition in Animals", "Transportation in Living Organisms", "Respiration", "Excretion", "Nervous System", "Reproductive System", "Health and Hygiene", "Classification"],
-                8: ["Transportation in Plants", "Transportation in Animals", "Excretion", "Reproduction", "Ecosystem", "Pollution"],
-                9: ["Plant and Animal Tissues", "The Flower", "Pollination and Fertilisation", "Seeds", "Respiration in Plants", "Transpiration", "Excretion in Plants and Animals", "Circulation", "The Nervous System and Sense Organs", "The Respiratory System", "The Excretory System", "Reproduction in Plants", "Reproduction in Animals"],
-                10: ["Photosynthesis", "Respiration", "Circulatory System", "Excretory System", "Nervous System", "Sense Organs", "Reproductive System", "Genetics", "Pollution", "Population"]
-            }
-        },
-        
-        "Cambridge IGCSE": {
-            "Mathematics": {
-                9: ["Number", "Algebra", "Geometry", "Mensuration", "Coordinate Geometry", "Trigonometry", "Matrices and Transformations", "Probability", "Statistics"],
-                10: ["Number", "Algebra", "Geometry", "Mensuration", "Coordinate Geometry", "Trigonometry", "Matrices and Transformations", "Probability", "Statistics"],
-                11: ["Pure Mathematics", "Mechanics", "Probability and Statistics"],
-                12: ["Pure Mathematics", "Mechanics", "Probability and Statistics"]
-            },
-            "Physics": {
-                9: ["General Physics", "Thermal Physics", "Properties of Waves", "Electricity and Magnetism", "Atomic Physics"],
-                10: ["General Physics", "Thermal Physics", "Properties of Waves", "Electricity and Magnetism", "Atomic Physics"],
-                11: ["Mechanics", "Gravitational Fields", "Deformation of Solids", "Waves", "Electricity", "Electromagnetic Fields", "Atomic and Nuclear Physics"],
-                12: ["Mechanics", "Gravitational Fields", "Deformation of Solids", "Waves", "Electricity", "Electromagnetic Fields", "Atomic and Nuclear Physics"]
-            },
-            "Chemistry": {
-                9: ["The Particulate Nature of Matter", "Experimental Techniques", "Atoms, Elements and Compounds", "Stoichiometry", "Electricity and Chemistry", "Chemical Energetics", "Chemical Reactions", "Acids, Bases and Salts", "The Periodic Table", "Metals", "Air and Water", "Sulfur", "Carbonates"],
-                10: ["The Particulate Nature of Matter", "Experimental Techniques", "Atoms, Elements and Compounds", "Stoichiometry", "Electricity and Chemistry", "Chemical Energetics", "Chemical Reactions", "Acids, Bases and Salts", "The Periodic Table", "Metals", "Air and Water", "Sulfur", "Carbonates"],
-                11: ["Atomic Structure", "Atoms, Molecules and Stoichiometry", "Chemical Bonding", "States of Matter", "Chemical Energetics", "Electrochemistry", "Equilibria", "Reaction Kinetics", "The Periodic Table", "Group Chemistry", "Introduction to Organic Chemistry", "Polymerisation"],
-                12: ["Atomic Structure", "Atoms, Molecules and Stoichiometry", "Chemical Bonding", "States of Matter", "Chemical Energetics", "Electrochemistry", "Equilibria", "Reaction Kinetics", "The Periodic Table", "Group Chemistry", "Introduction to Organic Chemistry", "Polymerisation"]
-            },
-            "Biology": {
-                9: ["Characteristics and Classification of Living Organisms", "Organisation and Maintenance of the Organism", "Movement into and out of Cells", "Biological Molecules", "Enzymes", "Plant Nutrition", "Human Nutrition", "Transport in Plants", "Transport in Animals", "Diseases and Immunity", "Gas Exchange", "Respiration", "Excretion", "Coordination and Response", "Drugs", "Reproduction", "Inheritance", "Variation and Selection", "Organisms and their Environment", "Biotechnology and Genetic Engineering", "Human Influences on Ecosystems"],
-                10: ["Characteristics and Classification of Living Organisms", "Organisation and Maintenance of the Organism", "Movement into and out of Cells", "Biological Molecules", "Enzymes", "Plant Nutrition", "Human Nutrition", "Transport in Plants", "Transport in Animals", "Diseases and Immunity", "Gas Exchange", "Respiration", "Excretion", "Coordination and Response", "Drugs", "Reproduction", "Inheritance", "Variation and Selection", "Organisms and their Environment", "Biotechnology and Genetic Engineering", "Human Influences on Ecosystems"],
-                11: ["Cell Structure", "Biological Molecules", "Enzymes", "Cell Membranes and Transport", "The Mitotic Cell Cycle", "Nucleic Acids and Protein Synthesis", "Transport in Plants", "Transport in Mammals", "Gas Exchange", "Infectious Diseases", "Immunity"],
-                12: ["Cell Structure", "Biological Molecules", "Enzymes", "Cell Membranes and Transport", "The Mitotic Cell Cycle", "Nucleic Acids and Protein Synthesis", "Transport in Plants", "Transport in Mammals", "Gas Exchange", "Infectious Diseases", "Immunity"]
-            }
-        },
-        
-        "State Board": {
-            "Mathematics": {
-                1: ["Numbers 1-99", "Counting", "Shapes", "Patterns", "Addition", "Subtraction"],
-                2: ["Numbers 1-100", "Addition", "Subtraction", "Multiplication", "Shapes", "Measurement"],
-                3: ["Numbers 1-1000", "Four Operations", "Fractions", "Shapes", "Money", "Time"],
-                4: ["Large Numbers", "Operations", "Fractions", "Decimals", "Geometry", "Measurement"],
-                5: ["Numbers", "Operations", "Fractions", "Decimals", "Geometry", "Data"],
-                6: ["Integers", "Fractions", "Decimals", "Basic Algebra", "Geometry", "Mensuration"],
-                7: ["Integers", "Rational Numbers", "Algebra", "Geometry", "Mensuration", "Data"],
-                8: ["Numbers", "Algebra", "Geometry", "Mensuration", "Statistics", "Graphs"],
-                9: ["Real Numbers", "Polynomials", "Linear Equations", "Geometry", "Trigonometry", "Statistics"],
-                10: ["Real Numbers", "Polynomials", "Quadratic Equations", "Geometry", "Trigonometry", "Statistics"],
-                11: ["Sets and Functions", "Trigonometry", "Algebra", "Coordinate Geometry", "Calculus", "Statistics"],
-                12: ["Relations and Functions", "Algebra", "Calculus", "Vectors", "Probability", "Linear Programming"]
-            },
-            "Science": {
-                6: ["Food and its Components", "Separation of Substances", "Plants", "Animals", "Light", "Electricity", "Magnetism"],
-                7: ["Nutrition", "Respiration", "Transportation", "Reproduction", "Motion", "Heat", "Sound"],
-                8: ["Crop Production", "Microorganisms", "Force and Pressure", "Friction", "Sound", "Chemical Effects"],
-                9: ["Matter", "Atoms and Molecules", "Tissues", "Motion", "Force", "Gravitation", "Work and Energy"],
-                10: ["Chemical Reactions", "Acids and Bases", "Metals", "Life Processes", "Reproduction", "Heredity", "Light", "Electricity"]
-            },
-            "Social Science": {
-                6: ["History of India", "Geography of India", "Civics", "Economics"],
-                7: ["Medieval History", "Geography", "Civics", "Economics"],
-                8: ["Modern History", "Geography", "Civics", "Economics"],
-                9: ["World History", "Contemporary India", "Democratic Politics", "Economics"],
-                10: ["History", "Geography", "Political Science", "Economics"]
-            }
-        }
-    }
-
 def test_claude_api():
     """Test Claude API connection with better error handling"""
     try:
         if not CLAUDE_API_KEY or CLAUDE_API_KEY == "REPLACE_WITH_YOUR_API_KEY":
             return False, "API key not configured"
         
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": CLAUDE_API_KEY,
-            "anthropic-version": "2023-06-01"
-        }
+        headers = get_api_headers()
         
         data = {
-            "model": "claude-3-5-sonnet-20241022",
+            "model": CLAUDE_MODEL,
             "max_tokens": 10,
             "messages": [{"role": "user", "content": "Test"}]
         }
         
-        response = requests.post(CLAUDE_API_URL, headers=headers, json=data, timeout=10)
+        response = get_claude_client().post(CLAUDE_API_URL, headers=headers, json=data, timeout=10)
         
         if response.status_code == 200:
             return True, "API connection successful"
@@ -656,6 +362,14 @@ def test_claude_api():
     except Exception as e:
         return False, f"Connection Error: {str(e)}"
 
+def warm_up_claude_connection():
+    """Pre-open pooled connections to the Claude API host (runs once per server process)"""
+    return get_claude_client().warm_up_in_background(CLAUDE_API_URL)
+
+def get_claude_connection_stats():
+    """Get pool-hit and handshake counts for the shared Claude client"""
+    return get_claude_client().get_stats()
+
 def verify_api_key():
     """Verify API key with details"""
     st.write("🔍 **API Key Verification:**")
@@ -679,51 +393,83 @@ def verify_api_key():
     
     return working
 
+def get_curriculum_index():
+    """Current curriculum index, loaded from curriculum_data/ on first use and hot-reloaded on edits"""
+    return get_curriculum_store().index()
+
+def get_curriculum_data_stats():
+    # Loading (or re-checking) first so the versions shown are the ones being served
+    get_curriculum_index()
+    stats = get_curriculum_store().stats()
+    snapshot = get_curriculum_snapshot()
+    stats["snapshot"] = snapshot.path if snapshot is not None else None
+    return stats
+
+def get_subjects_by_board():
+    """Board -> grade -> subjects (read-only, shared by every session)"""
+    return get_curriculum_index().subjects_by_board
+
+def get_comprehensive_curriculum_topics():
+    """Complete topic database for all subjects, grades, and boards (read-only, shared by every session)"""
+    return get_curriculum_index().curriculum_topics
+
+def get_comprehensive_subject_keywords():
+    """Subject -> relevance keywords (read-only, shared by every session)"""
+    return get_curriculum_index().subject_keywords
+
+def get_curriculum_source():
+    """What per-selection lookups read: the mapped snapshot when CURRICULUM_SNAPSHOT_FILE is set, else the JSON index
+    
+    Both answer topics, subjects, keywords, topic_index, keyword_matcher, totals and data_version the same way.
+    """
+    snapshot = get_curriculum_snapshot()
+    return snapshot if snapshot is not None else get_curriculum_index()
+
 def get_topics_by_board_grade_subject(board, grade, subject):
     """NEW FUNCTION: Get specific topics for board, grade, and subject"""
-    curriculum_topics = get_comprehensive_curriculum_topics()
-    
-    # Handle IB grade format
-    if board == "IB" and isinstance(grade, str) and "Grade" in grade:
-        try:
-            grade_num = int(grade.split()[1])
-        except (IndexError, ValueError):
-            return []
-    else:
-        grade_num = grade if isinstance(grade, int) else grade
-    
-    # Get topics from curriculum database
-    board_data = curriculum_topics.get(board, {})
-    subject_data = board_data.get(subject, {})
-    topics = subject_data.get(grade_num, [])
-    
-    return topics
+    # The grade may be 7, "7" or IB's "Grade 7 (MYP)"; callers get their own list
+    return list(get_curriculum_source().topics(board, grade, subject))
 
 def validate_topic_against_curriculum(board, grade, subject, topic):
     """ENHANCED FUNCTION: Validate topic against specific curriculum"""
     if not topic:
         return False, []
     
-    # Get curriculum topics for this specific combination
-    curriculum_topics = get_topics_by_board_grade_subject(board, grade, subject)
+    # Cached per board until that board's curriculum file (or the keywords file) changes. The key
+    # names the data the result is computed from, so a reload racing this call, or a rebuilt
+    # snapshot, can never leave an answer from the old data under the new data's key
+    source = get_curriculum_source()
+    key = (canonical_grade(grade), subject, str(topic).lower().strip(), source.data_version(board))
+    is_valid, curriculum_topics = get_curriculum_store().cached_validation(
+        board, key, lambda: _validate_topic_uncached(source, board, grade, subject, topic)
+    )
+    return is_valid, list(curriculum_topics)
+
+def _validate_topic_uncached(source, board, grade, subject, topic):
+    # Topics, their index and the keyword fallback all come from the same source
+    curriculum_topics = source.topics(board, grade, subject)
     
     if not curriculum_topics:
         # Fallback to keyword matching if no specific curriculum found
-        return check_topic_relevance(topic, subject)
+        is_valid, subject_keywords = check_topic_relevance(topic, subject, source)
+        return is_valid, tuple(subject_keywords)
     
-    topic_clean = str(topic).lower().strip()
-    
-    # Check for exact or partial matches in curriculum topics
-    matched_topics = []
-    for curriculum_topic in curriculum_topics:
-        curriculum_topic_clean = str(curriculum_topic).lower()
-        if (curriculum_topic_clean in topic_clean or 
-            topic_clean in curriculum_topic_clean or
-            any(word in curriculum_topic_clean for word in topic_clean.split() if len(word) > 2)):
-            matched_topics.append(curriculum_topic)
+    # Any curriculum topic inside the topic, containing it, or containing one of its words (3+ letters)
+    is_valid = source.topic_index(board, grade, subject).any_match(topic)
+    return is_valid, tuple(curriculum_topics)
+
+def rank_curriculum_topics(board, grade, subject, topic, limit=5):
+    """Best matching curriculum topics as [(topic, score), ...], highest score first"""
+    if not topic:
+        return []
+    return get_curriculum_source().topic_index(board, grade, subject).rank(topic, limit)
+
+class GenerationCancelled(BaseException):
+    """Raised inside a generation whose result is no longer wanted
     
-    is_valid = len(matched_topics) > 0
-    return is_valid, curriculum_topics
+    Like Streamlit's own script-stop exceptions it derives from BaseException, so
+    single-flight treats it as a cancelled leader and a waiting follower takes over.
+    """
 
 def clean_json_response(response_text):
     """Enhanced JSON cleaning function to handle Claude's response format"""
@@ -760,9 +506,59 @@ def clean_json_response(response_text):
     except Exception as e:
         return None, f"Error cleaning JSON: {str(e)}"
 
-def generate_questions(board, grade, subject, topic, paper_type, include_answers_on_screen):
-    """FIXED: Generate board-specific, grade-specific questions using Claude AI with enhanced error handling"""
+def read_streamed_response(response, on_question=None, cancel_event=None):
+    """Consume a streamed Messages response, pushing each question to on_question as soon as it closes
     
+    Returns (content, meta, error) where meta carries the stop_reason, token usage
+    and the monotonic time the first text arrived.
+    """
+    parser = QuestionStreamParser(array_key=COMPACT_ARRAY_KEY)
+    text_parts = []
+    meta = {'stop_reason': None, 'usage': {}, 'first_token_at': None}
+    question_number = 0
+    
+    for event, payload in iter_sse_events(response):
+        if cancel_event is not None and cancel_event.is_set():
+            # Dropping the connection stops the rest of the paper being generated
+            response.close()
+            raise GenerationCancelled()
+        if not isinstance(payload, dict):
+            continue
+        if event == "message_start":
+            meta['usage'].update(payload.get('message', {}).get('usage', {}))
+        elif event == "content_block_delta":
+            delta = payload.get('delta', {})
+            if delta.get('type') == 'text_delta':
+                text = delta.get('text', '')
+                if meta['first_token_at'] is None:
+                    meta['first_token_at'] = time.monotonic()
+                text_parts.append(text)
+                for row in parser.feed(text):
+                    try:
+                        question = expand_question(row, question_number + 1)
+                    except CompactSchemaError:
+                        # Dropped here as well as in the full parse, so numbering stays consistent
+                        continue
+                    question_number += 1
+                    if on_question:
+                        on_question(question, question_number)
+        elif event == "message_delta":
+            meta['stop_reason'] = payload.get('delta', {}).get('stop_reason', meta['stop_reason'])
+            meta['usage'].update(payload.get('usage', {}))
+        elif event == "error":
+            message = payload.get('error', {}).get('message', 'Unknown error')
+            return None, meta, f"Streaming error: {message}"
+    
+    return "".join(text_parts), meta, None
+
+def _usage_total_tokens(usage):
+    """Total billed tokens in a usage block, or None if the API did not report usage"""
+    if not usage:
+        return None
+    return sum(value for key, value in usage.items() if key.endswith('_tokens') and isinstance(value, int))
+
+def get_question_counts(paper_type):
+    """Get the (mcq, short, long) question counts for a paper type"""
     # Enhanced question count logic based on all board paper types
     mcq_count = 0
     short_count = 0
@@ -881,494 +677,838 @@ def generate_questions(board, grade, subject, topic, paper_type, include_answers
         mcq_count = 20
         short_count = 10
     
-    total_questions = mcq_count + short_count + long_count
+    return mcq_count, short_count, long_count
+
+# Fixed question-writing rules shared by every paper. Besides steering quality they keep the
+# system prefix above the 1,024-token minimum Sonnet needs before it will cache a prompt
+# (see prompt_cache.PROMPT_CACHE_MIN_TOKENS). Haiku's 2,048-token minimum is not reached, so
+# papers routed to the fast tier are sent without a cache breakpoint.
+QUESTION_WRITING_STANDARDS = """QUESTION WRITING STANDARDS
+
+Accuracy
+- Every fact, formula, date, definition and worked value must be correct for the stated curriculum. If a value depends on a convention (units, significant figures, g = 9.8 or 10 m/s^2), state the convention in the question.
+- Numerical questions must have one unambiguous answer. Work the answer out fully before writing the options or the sample answer and make sure the numbers divide cleanly at this grade level.
+- Do not invent quotations, statistics, historical events, people or place names. Use well-known, verifiable examples or clearly hypothetical ones ("a shopkeeper", "a town").
+
+Multiple choice
+- The stem must be answerable without looking at the options and must ask exactly one thing.
+- Exactly one option is correct. The other three are plausible distractors built from the mistakes students at this level actually make (sign errors, unit slips, confusing related terms, partial reasoning), never joke answers.
+- Keep options parallel in grammar and similar in length; do not let the longest or most detailed option always be the correct one.
+- Avoid "all of the above", "none of the above" and double negatives. Avoid "always" and "never" unless they are the point being tested.
+- Spread the correct letter across A, B, C and D over the paper instead of favouring one position.
+- The explanation says why the correct option is right and, in one short clause, why the most tempting distractor is wrong.
+
+Short answer
+- Ask for one idea, definition, calculation or reason that a student can answer in two to five sentences or a few lines of working.
+- Use a command word that matches the expected answer: state, define, name, give, calculate, explain briefly.
+- The sample answer contains every point a marker would credit, one point per mark, in the words a good student at this grade would use.
+
+Long answer
+- Ask for extended reasoning: explain, compare, analyse, evaluate, derive, discuss, or solve a multi-step problem.
+- Break complex tasks into labelled parts (a), (b), (c) inside the question text when that mirrors the board's style, with the demand rising from part to part.
+- The sample answer is a model answer a marker could mark against: it covers each part in order, shows working for calculations and ends with a clear conclusion or final value.
+- Marks reflect the number of credit-worthy points in the sample answer.
+
+Coverage and difficulty
+- Cover different sub-ideas of the topic rather than asking the same fact in different words; no two questions may share an answer.
+- Mix recall, understanding and application in roughly the proportions the board uses at this grade, with a few questions that stretch the strongest students.
+- Use names, currencies, units and settings that fit the board's context and the students' everyday experience.
+
+Language and presentation
+- Write clear, grammatical sentences at the reading level of the grade; define any term that is not part of the grade's curriculum.
+- Write mathematical expressions in plain text (x^2, sqrt(2), 3/4, <=) so they survive JSON and PDF rendering.
+- Never refer to diagrams, images, tables or attachments that are not included in the question text itself.
+- Do not number the questions yourself and do not add headings, marks totals or instructions to candidates; the paper layout is added afterwards."""
+
+def build_system_prompt(board, grade, subject):
+    """Build the stable part of the generation prompt for one board, grade and subject
     
+    Nothing in here depends on the topic, paper type or question counts, so the
+    text is byte-identical across requests for the same combination and the API
+    can serve it from its prompt cache.
+    """
     # Get curriculum topics for enhanced context
     curriculum_topics = get_topics_by_board_grade_subject(board, grade, subject)
     curriculum_context = ""
     if curriculum_topics:
-        curriculum_context = f"\nCURRICULUM TOPICS for {board} Grade {grade} {subject}: {', '.join(curriculum_topics[:10])}"
+        curriculum_context = f"\nCURRICULUM TOPICS for {board} Grade {grade} {subject}: {', '.join(curriculum_topics)}"
     
     # Enhanced prompt with board and grade specific context
-    board_context = get_board_specific_guidelines(board, grade, subject, topic)
+    board_context = get_board_specific_guidelines(board, grade, subject)
     
-    prompt = f"""Create a {board} Grade {grade} {subject} test on "{topic}" using {paper_type} format.
+    # The board's paper formats at this grade, so the requested paper type is read in context
+    paper_formats = "\n".join(
+        f"- {paper_type}: {mcq_count} MCQ, {short_count} short answer, {long_count} long answer"
+        for paper_type in get_paper_types_by_board_and_grade(board, grade)
+        for mcq_count, short_count, long_count in [get_question_counts(paper_type)]
+    )
+    
+    return f"""You write {board} Grade {grade} {subject} test papers.
 
 {board_context}
 {curriculum_context}
 
-Generate exactly:
-- {mcq_count} multiple choice questions (if any)
-- {short_count} short answer questions (if any)
-- {long_count} long answer questions (if any)
+Every question MUST be specifically about the requested topic as taught in {board} Grade {grade} {subject} curriculum. Use examples, terminology, and difficulty level appropriate for {board} Grade {grade} students.
 
-IMPORTANT: All questions MUST be specifically about "{topic}" as taught in {board} Grade {grade} {subject} curriculum. Use examples, terminology, and difficulty level appropriate for {board} Grade {grade} students.
+{board} GRADE {grade} PAPER FORMATS (the request names one of these and gives the exact counts):
+{paper_formats}
 
 Question Types:
 - MCQ: 4 options (A, B, C, D) with one correct answer
 - Short Answer: 2-5 sentence responses
 - Long Answer: Detailed explanations or essay-type responses
 
-CRITICAL: Respond with ONLY valid JSON. No markdown, no extra text, no explanations - just pure JSON.
-
-{{
-    "test_info": {{
-        "board": "{board}",
-        "grade": "{grade}",
-        "subject": "{subject}",
-        "topic": "{topic}",
-        "paper_type": "{paper_type}",
-        "total_questions": {total_questions},
-        "mcq_count": {mcq_count},
-        "short_count": {short_count},
-        "long_count": {long_count},
-        "show_answers_on_screen": {str(include_answers_on_screen).lower()}
-    }},
-    "questions": [
-        {{
-            "question_number": 1,
-            "type": "mcq",
-            "question": "Sample MCQ question about {topic}?",
-            "options": {{
-                "A": "Option A",
-                "B": "Option B", 
-                "C": "Option C",
-                "D": "Option D"
-            }},
-            "correct_answer": "A",
-            "explanation": "Brief explanation"
-        }},
-        {{
-            "question_number": 2,
-            "type": "short",
-            "question": "Sample short answer question about {topic}?",
-            "sample_answer": "Expected short answer",
-            "marks": 3
-        }},
-        {{
-            "question_number": 3,
-            "type": "long",
-            "question": "Sample long answer question about {topic}?",
-            "sample_answer": "Expected detailed answer",
-            "marks": 6
-        }}
-    ]
-}}"""
+{QUESTION_WRITING_STANDARDS}
+
+{COMPACT_FORMAT_INSTRUCTIONS}"""
+
+def build_generation_prompt(board, grade, subject, topic, paper_type, mcq_count, short_count, long_count, exclude_questions=None):
+    """Build the per-request part of the prompt for one paper (or one shard of a paper)
+    
+    It is sent after the cached build_system_prompt() prefix and only carries what
+    varies per request. exclude_questions lists questions the paper already has,
+    so a follow-up request for the remaining questions does not repeat them.
+    """
+    exclusion_context = ""
+    if exclude_questions:
+        already_asked = "\n".join(f"- {question}" for question in exclude_questions)
+        exclusion_context = f"\nThe paper already contains these questions. Do NOT repeat or paraphrase them:\n{already_asked}\n"
+    
+    return f"""Create a {board} Grade {grade} {subject} test on "{topic}" using {paper_type} format.
+
+TOPIC: "{topic}"
+Focus: All questions must be specifically about "{topic}" as taught in {board} Grade {grade} {subject}
+
+Generate exactly:
+- {mcq_count} multiple choice questions (if any)
+- {short_count} short answer questions (if any)
+- {long_count} long answer questions (if any)
+{exclusion_context}"""
+
+def get_api_headers():
+    """Request headers for the Claude Messages API"""
+    return {
+        "Content-Type": "application/json",
+        "x-api-key": CLAUDE_API_KEY,
+        "anthropic-version": "2023-06-01",
+        "anthropic-beta": PROMPT_CACHING_BETA
+    }
 
+def _api_error_message(response):
+    """Turn a non-200 Claude API response into a user-facing error message"""
+    if response.status_code == 401:
+        return "API Authentication failed. Please check your API key."
+    if response.status_code == 429:
+        return "API rate limit exceeded. Please try again later."
     try:
-        # Enhanced error handling and API validation
-        if not CLAUDE_API_KEY or CLAUDE_API_KEY == "REPLACE_WITH_YOUR_API_KEY":
-            st.error("❌ API key not configured. Please check your API configuration.")
-            return None
-        
-        st.info("🔍 Connecting to Claude AI...")
-        
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": CLAUDE_API_KEY,
-            "anthropic-version": "2023-06-01"
-        }
-        
-        data = {
-            "model": "claude-3-5-sonnet-20241022",
-            "max_tokens": 4000,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        
-        st.info("📡 Sending request to Claude AI...")
-        
+        error_detail = response.json()
+        error_msg = error_detail.get('error', {}).get('message', 'Unknown error')
+        if response.status_code == 400:
+            return f"API Request Error: {error_msg}"
+        return f"API Error {response.status_code}: {error_msg}"
+    except Exception:
+        if response.status_code == 400:
+            return "Bad request to API"
+        return f"API Error: {response.status_code} - {response.text[:200]}"
+
+def request_questions(prompt, max_tokens=4000, stream=False, on_question=None, on_queue_wait=None, system_prompt=None, model=None, cancel_event=None, labels=None, kind="generation"):
+    """Send one generation request and parse the paper JSON
+    
+    Safe to call from worker threads: it never touches Streamlit and reports
+    problems through the returned (parsed_json, error, raw_content) tuple.
+    Every attempt first waits its turn in the shared rate limiter queue;
+    on_queue_wait(position, expected_wait) is called while it waits.
+    system_prompt is sent as a cacheable prefix ahead of the prompt. Setting
+    cancel_event abandons the request before its next attempt or mid-stream.
+    The call's usage, latency and outcome go to the usage store, tagged with
+    labels (paper_id, board, grade, subject, paper_type) and kind.
+    """
+    call = {'status': None, 'usage': None, 'outcome': None}
+    model = model or CLAUDE_MODEL
+    started = time.monotonic()
+    try:
+        parsed, error, content = _send_generation_request(prompt, max_tokens, stream, on_question, on_queue_wait,
+                                                          system_prompt, model, cancel_event, call)
+    except GenerationCancelled:
+        get_usage_store().record(model, call['usage'], time.monotonic() - started, "cancelled", labels=labels, kind=kind)
+        raise
+    get_usage_store().record(model, call['usage'], time.monotonic() - started, _call_outcome(parsed, call),
+                             questions=len(parsed['questions']) if parsed else 0, labels=labels, kind=kind)
+    return parsed, error, content
+
+def _call_outcome(parsed, call):
+    """Outcome label for the usage store"""
+    if call['outcome']:
+        return call['outcome']
+    status_code = call['status']
+    if parsed is None:
+        if status_code is None:
+            return "request_error"
+        return "parse_error" if status_code == 200 else f"http_{status_code}"
+    if parsed.get('truncated'):
+        return "truncated"
+    if parsed.get('rejected'):
+        return "rejected"
+    return "ok"
+
+def _send_generation_request(prompt, max_tokens, stream, on_question, on_queue_wait, system_prompt, model, cancel_event, call):
+    """request_questions without the usage accounting; fills call with the HTTP status, usage block and terminal outcome"""
+    data = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    if system_prompt:
+        data["system"] = cached_system_blocks(system_prompt, model)
+    if stream:
+        data["stream"] = True
+    
+    rate_limiter = get_rate_limiter()
+    breaker = get_claude_breaker()
+    reservations = []
+    sent_at = []
+    estimated_tokens = estimate_request_tokens((system_prompt or "") + prompt, max_tokens)
+    
+    def send(timeout):
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+        # An open circuit fails in milliseconds instead of queueing for budget and waiting out a timeout
+        breaker.before_call()
         try:
-            response = requests.post(CLAUDE_API_URL, headers=headers, json=data, timeout=60)
-        except requests.exceptions.Timeout:
-            st.error("❌ Request timeout. Please try again.")
-            return None
-        except requests.exceptions.ConnectionError:
-            st.error("❌ Connection error. Please check your internet connection.")
-            return None
-        
-        st.info(f"📥 Received response with status: {response.status_code}")
-        
-        if response.status_code == 200:
-            try:
-                result = response.json()
-                if 'content' not in result or not result['content']:
-                    st.error("❌ Invalid response format from Claude API")
-                    return None
-                
-                content = result['content'][0]['text']
-                st.info("🔧 Processing Claude's response...")
-                
-                # Enhanced JSON cleaning and parsing
-                cleaned_json, error = clean_json_response(content)
-                
-                if cleaned_json is None:
-                    st.error(f"❌ {error}")
-                    st.error("📝 Raw response for debugging:")
-                    st.code(content[:500] + "..." if len(content) > 500 else content)
-                    return None
-                
-                # Validate the JSON structure
-                if 'test_info' not in cleaned_json or 'questions' not in cleaned_json:
-                    st.error("❌ Invalid test data structure")
-                    return None
-                
-                # Ensure test_info has required fields
-                if 'test_info' in cleaned_json:
-                    cleaned_json['test_info']['show_answers_on_screen'] = include_answers_on_screen
-                    cleaned_json['test_info']['curriculum_standard'] = f"{board} Grade {grade} {subject}"
-                
-                st.success("✅ Test generated successfully!")
-                return cleaned_json
-                
-            except json.JSONDecodeError as e:
-                st.error(f"❌ JSON Parse Error: {str(e)}")
-                st.error("📝 Raw response for debugging:")
-                result = response.json()
-                content = result['content'][0]['text'] if 'content' in result else str(result)
-                st.code(content[:500] + "..." if len(content) > 500 else content)
-                return None
-            except Exception as e:
-                st.error(f"❌ Error processing response: {str(e)}")
-                return None
-            
-        elif response.status_code == 401:
-            st.error("❌ API Authentication failed. Please check your API key.")
-            return None
-        elif response.status_code == 429:
-            st.error("❌ API rate limit exceeded. Please try again later.")
-            return None
-        elif response.status_code == 400:
-            try:
-                error_detail = response.json()
-                st.error(f"❌ API Request Error: {error_detail.get('error', {}).get('message', 'Bad request')}")
-            except:
-                st.error("❌ Bad request to API")
-            return None
+            with span("queue_wait", model=data["model"]):
+                reservation = rate_limiter.acquire(estimated_tokens, on_wait=on_queue_wait, cancel_event=cancel_event)
+            if cancel_event is not None and cancel_event.is_set():
+                # Cancelled just as its turn came: hand the budget back rather than pay for an unwanted request
+                reservation.reconcile(0)
+                raise GenerationCancelled()
+        except RateLimitCancelled:
+            breaker.release()
+            raise GenerationCancelled() from None
+        except BaseException:
+            # Giving up in the queue says nothing about the API; free a half-open probe slot for the next caller
+            breaker.release()
+            raise
+        reservations.append(reservation)
+        sent_at.append(time.monotonic())
+        try:
+            response = get_claude_client().post(CLAUDE_API_URL, headers=get_api_headers(), json=data, timeout=timeout, stream=stream)
+        except requests.exceptions.RequestException:
+            breaker.record_failure()
+            # No response means nothing to bill; hand the estimate back to the queue
+            reservation.reconcile(0)
+            raise
+        except BaseException:
+            breaker.release()
+            reservation.reconcile(0)
+            raise
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            breaker.record_failure()
         else:
-            try:
-                error_detail = response.json()
-                error_msg = error_detail.get('error', {}).get('message', 'Unknown error')
-                st.error(f"❌ API Error {response.status_code}: {error_msg}")
-            except:
-                st.error(f"❌ API Error: {response.status_code} - {response.text[:200]}")
-            return None
-            
+            breaker.record_success()
+        return response
+    
+    try:
+        # 429, 5xx, timeouts and connection errors are retried with backoff before we give up
+        response = send_with_retries(send, timeout=60, cancel_event=cancel_event)
+    except RateLimitTimeout as e:
+        call['outcome'] = "rate_limited"
+        return None, str(e), None
+    except CircuitOpenError as e:
+        call['outcome'] = "circuit_open"
+        return None, str(e), None
+    except requests.exceptions.Timeout:
+        return None, "Request timeout. Please try again.", None
+    except requests.exceptions.ConnectionError:
+        return None, "Connection error. Please check your internet connection.", None
+    except requests.exceptions.RequestException as e:
+        # Not retried (InvalidURL, TooManyRedirects, ...) but still reported through the tuple
+        return None, f"Request failed: {e}", None
+    
+    finally:
+        # Failed attempts used no tokens; hand their budget back to the queue
+        for reservation in reservations[:-1]:
+            reservation.reconcile(0)
+    
+    call['status'] = response.status_code
+    if response.status_code != 200:
+        reservations[-1].reconcile(0)
+        return None, _api_error_message(response), None
+    
+    try:
+        cacheable = bool(system_prompt) and is_cacheable(system_prompt, model)
+        return _read_generation_response(response, stream, on_question, cancel_event, model, sent_at[-1], cacheable, call)
+    finally:
+        # A response cut short (cancelled, unreadable) settles at its reported usage, else at the prompt estimate
+        reservations[-1].reconcile(_usage_total_tokens(call['usage']) or estimate_request_tokens((system_prompt or "") + prompt, 0))
+
+def _read_generation_response(response, stream, on_question, cancel_event, model, sent_at, cacheable, call):
+    """Read and parse a 200 response into (parsed, error, content), filling call['usage']"""
+    try:
+        if stream:
+            content, meta, stream_error = read_streamed_response(response, on_question, cancel_event)
+            call['usage'] = meta['usage']
+            first_token_latency = meta['first_token_at'] - sent_at if meta['first_token_at'] else None
+            get_prompt_cache_recorder().record(meta['usage'], first_token_latency, cacheable)
+            if stream_error:
+                return None, stream_error, None
+        else:
+            result = response.json()
+            call['usage'] = result.get('usage')
+            # Without streaming the closest thing to time-to-first-token is time to response headers
+            get_prompt_cache_recorder().record(result.get('usage'), response.elapsed.total_seconds(), cacheable)
+            if 'content' not in result or not result['content']:
+                return None, "Invalid response format from Claude API", None
+            content = result['content'][0]['text']
+    except json.JSONDecodeError as e:
+        return None, f"JSON Parse Error: {str(e)}", response.text
+    except requests.exceptions.RequestException as e:
+        # The connection failed while reading the body (e.g. ChunkedEncodingError mid-stream)
+        call['outcome'] = "request_error"
+        return None, f"Request failed: {e}", None
     except Exception as e:
-        st.error(f"❌ Unexpected error: {str(e)}")
-        return None
+        return None, f"Error processing response: {str(e)}", None
+    # Streams count from the first text delta; otherwise from the response headers, after which requests reads the body
+    first_byte_seconds = meta['first_token_at'] - sent_at if stream and meta['first_token_at'] else response.elapsed.total_seconds()
+    timing = get_timing_recorder()
+    timing.record("ttfb", first_byte_seconds, model=model, stream=stream)
+    timing.record("download", time.monotonic() - sent_at - first_byte_seconds, model=model, stream=stream,
+                  characters=len(content))
+    
+    stop_reason = meta['stop_reason'] if stream else result.get('stop_reason')
+    parsed, error = parse_generation_content(content, stop_reason)
+    return parsed, error, content
 
-def get_comprehensive_subject_keywords():
-    """MASSIVE enhanced keywords database for all subjects across all boards with thousands of topics"""
+def parse_generation_content(content, stop_reason=None):
+    """Parse and expand the model's text for one request into (parsed, error)
+    
+    parsed is {"test_info": {}, "questions": [...]} with "truncated" set when the
+    response hit max_tokens and "rejected" counting malformed rows that were dropped.
+    """
+    # Enhanced JSON cleaning and parsing
+    with span("clean_json_response", characters=len(content)):
+        cleaned_json, error = clean_json_response(content)
+    if cleaned_json is None:
+        if stop_reason == "max_tokens":
+            # Cut off mid-paper: keep every question whose JSON object is complete
+            with span("validation", salvage=True):
+                salvaged = salvage_truncated_questions(content)
+            if salvaged:
+                return {"test_info": {}, "questions": salvaged, "truncated": True}, None
+        return None, error
+    
+    # Validate the compact structure and expand it into the question dicts the display and PDF code use
+    rows = cleaned_json.get(COMPACT_ARRAY_KEY) if isinstance(cleaned_json, dict) else None
+    if not isinstance(rows, list):
+        return None, "Invalid test data structure"
+    with span("validation", rows=len(rows)):
+        questions, rejected = expand_questions(rows)
+    if not questions:
+        return None, "Invalid test data structure: no usable questions in the response"
+    
+    parsed = {"test_info": {}, "questions": questions}
+    if stop_reason == "max_tokens":
+        parsed['truncated'] = True
+    if rejected:
+        # Malformed rows are dropped and re-requested like the tail of a truncated response
+        parsed['rejected'] = rejected
+    return parsed, None
+
+def estimate_max_tokens(mcq_count, short_count, long_count):
+    """Size max_tokens from the requested counts instead of a fixed ceiling"""
+    budget = (GENERATION_BASE_TOKENS
+              + mcq_count * TOKENS_PER_QUESTION['mcq']
+              + short_count * TOKENS_PER_QUESTION['short']
+              + long_count * TOKENS_PER_QUESTION['long'])
+    return max(1024, min(int(budget * 1.2), CLAUDE_MAX_OUTPUT_TOKENS))
+
+def salvage_truncated_questions(content):
+    """Return the complete, valid questions from a response cut off at max_tokens"""
+    parser = QuestionStreamParser(array_key=COMPACT_ARRAY_KEY)
+    parser.feed(content)
+    questions, _ = expand_questions(parser.questions)
+    return questions
+
+def remaining_question_counts(requested_counts, questions):
+    """(mcq, short, long) still missing after the given questions"""
+    have = {'mcq': 0, 'short': 0, 'long': 0}
+    for question in questions:
+        question_type = str(question.get('type', '')).replace('_answer', '')
+        if question_type in have:
+            have[question_type] += 1
+    mcq_count, short_count, long_count = requested_counts
+    return (max(mcq_count - have['mcq'], 0),
+            max(short_count - have['short'], 0),
+            max(long_count - have['long'], 0))
+
+def complete_truncated_shard(board, grade, subject, topic, paper_type, requested_counts, questions, on_queue_wait=None, model=None, cancel_event=None, labels=None):
+    """Request only the questions a truncated or partly malformed response did not deliver and append them"""
+    system_prompt = build_system_prompt(board, grade, subject)
+    questions = list(questions)
+    for _ in range(MAX_CONTINUATION_REQUESTS):
+        remaining = remaining_question_counts(requested_counts, questions)
+        if not any(remaining):
+            break
+        prompt = build_generation_prompt(
+            board, grade, subject, topic, paper_type, *remaining,
+            exclude_questions=[question.get('question', '') for question in questions]
+        )
+        parsed, error, content = request_questions(prompt, max_tokens=estimate_max_tokens(*remaining),
+                                                   on_queue_wait=on_queue_wait, system_prompt=system_prompt, model=model,
+                                                   cancel_event=cancel_event, labels=labels, kind="continuation")
+        if parsed is None:
+            # Keep what we already paid for rather than failing the whole paper
+            break
+        questions.extend(parsed['questions'])
+        if not parsed.get('truncated') and not parsed.get('rejected'):
+            break
+    return questions
+
+def plan_generation_shards(mcq_count, short_count, long_count, shard_size=GENERATION_SHARD_SIZE):
+    """Split question counts into independent (mcq, short, long) shards of at most shard_size questions"""
+    total = mcq_count + short_count + long_count
+    if total <= shard_size:
+        return [(mcq_count, short_count, long_count)]
+    
+    shards = []
+    for position, count in enumerate((mcq_count, short_count, long_count)):
+        if count <= 0:
+            continue
+        # Balanced chunks: 40 MCQs with a shard size of 15 become 14+13+13, not 15+15+10
+        chunks = -(-count // shard_size)
+        base, extra = divmod(count, chunks)
+        for chunk in range(chunks):
+            shard = [0, 0, 0]
+            shard[position] = base + (1 if chunk < extra else 0)
+            shards.append(tuple(shard))
+    return shards
+
+def _question_fingerprint(question):
+    """Normalized question text used to spot duplicates across shards"""
+    text = str(question.get('question', '')).lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+def merge_question_shards(shard_questions):
+    """Merge shard question lists in order, dropping duplicates and renumbering from 1"""
+    merged = []
+    seen = set()
+    for questions in shard_questions:
+        for question in questions:
+            if not isinstance(question, dict):
+                continue
+            fingerprint = _question_fingerprint(question)
+            if fingerprint and fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            question = dict(question)
+            question['question_number'] = len(merged) + 1
+            merged.append(question)
+    return merged
+
+def build_test_info(board, grade, subject, topic, paper_type, questions, include_answers_on_screen):
+    """Build test_info locally from the merged questions"""
+    type_counts = {'mcq': 0, 'short': 0, 'long': 0}
+    for question in questions:
+        question_type = str(question.get('type', '')).replace('_answer', '')
+        if question_type in type_counts:
+            type_counts[question_type] += 1
+    
     return {
-        "Mathematics": [
-            # Basic Mathematics (Grades 1-5)
-            "number", "numbers", "counting", "addition", "subtraction", "multiplication", "division", 
-            "place value", "tens", "hundreds", "thousands", "digit", "digits", "even", "odd",
-            "pattern", "patterns", "shapes", "triangle", "square", "rectangle", "circle",
-            "measurement", "length", "weight", "time", "money", "coins", "notes",
-            
-            # Intermediate Mathematics (Grades 6-8)  
-            "fraction", "fractions", "decimal", "decimals", "percentage", "percentages", 
-            "ratio", "ratios", "proportion", "proportions", "algebra", "equation", "equations",
-            "variable", "variables", "expression", "expressions", "coefficient", "coefficients",
-            "geometry", "angle", "angles", "parallel", "perpendicular", "area", "perimeter",
-            "volume", "surface area", "coordinate", "coordinates", "graph", "graphs",
-            "integer", "integers", "positive", "negative", "absolute value",
-            
-            # Advanced Mathematics (Grades 9-12)
-            "quadratic", "polynomial", "polynomials", "function", "functions", "domain", "range",
-            "linear", "slope", "intercept", "simultaneous", "inequality", "inequalities",
-            "trigonometry", "sine", "cosine", "tangent", "theorem", "theorems", "proof", "proofs",
-            "calculus", "derivative", "derivatives", "integral", "integrals", "limit", "limits",
-            "statistics", "probability", "mean", "median", "mode", "standard deviation",
-            "matrix", "matrices", "determinant", "determinants", "vector", "vectors",
-            "logarithm", "logarithms", "exponential", "complex numbers", "binomial"
-        ],
+        "board": board,
+        "grade": str(grade),
+        "subject": subject,
+        "topic": topic,
+        "paper_type": paper_type,
+        "total_questions": len(questions),
+        "mcq_count": type_counts['mcq'],
+        "short_count": type_counts['short'],
+        "long_count": type_counts['long'],
+        "show_answers_on_screen": include_answers_on_screen,
+        "curriculum_standard": f"{board} Grade {grade} {subject}"
+    }
+
+def _run_shards_in_parallel(prompts, max_tokens, stream=False, on_question=None, on_queue_wait=None, system_prompt=None, model=None, cancel_event=None, labels=None):
+    """Run shard prompts on the shared worker pool
+    
+    Streamed questions and queue notices are relayed through a queue so the
+    callbacks always run on the calling (Streamlit script) thread.
+    """
+    relayed = queue.Queue()
+    
+    def run_shard(prompt, shard_max_tokens):
+        question_relay = (lambda question, number: relayed.put(("question", question))) if stream else None
+        queue_relay = lambda position, expected_wait: relayed.put(("queue", (position, expected_wait)))
+        return request_questions(prompt, max_tokens=shard_max_tokens, stream=stream, on_question=question_relay,
+                                 on_queue_wait=queue_relay, system_prompt=system_prompt, model=model, cancel_event=cancel_event,
+                                 labels=labels)
+    
+    futures = [_shard_executor.submit(run_shard, prompt, shard_max_tokens) for prompt, shard_max_tokens in zip(prompts, max_tokens)]
+    
+    question_number = 0
+    pending = set(futures)
+    while pending:
+        done, pending = concurrent.futures.wait(pending, timeout=0.1)
+        while True:
+            try:
+                kind, payload = relayed.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "question":
+                question_number += 1
+                if on_question:
+                    on_question(payload, question_number)
+            elif on_queue_wait:
+                on_queue_wait(*payload)
+    
+    return [future.result() for future in futures]
+
+def get_retry_stats():
+    """Get success rate and latency figures for Claude calls with retries"""
+    return get_retry_recorder().summary()
+
+def get_rate_limiter_stats():
+    """Get queue length and wait statistics for the shared Claude rate limiter"""
+    return get_rate_limiter().get_stats()
+
+def get_paper_cache_stats():
+    """Get hit/miss statistics for the generated paper cache"""
+    return get_paper_cache().get_stats()
+
+def get_prompt_cache_stats():
+    """Get cached-token counts and cold vs warm prefix figures for Claude calls"""
+    return get_prompt_cache_recorder().summary()
+
+def get_stage_timing_stats():
+    """Get rolling p50/p95/p99 per generation and PDF stage"""
+    return get_timing_recorder().summary()
+
+def get_stage_timing_prometheus():
+    """Get the stage histograms in Prometheus text format"""
+    return get_timing_recorder().prometheus_text()
+
+def start_stage_timing_endpoint():
+    """Serve the stage histograms on the local /metrics endpoint (once per server process)"""
+    return start_metrics_endpoint()
+
+def record_paper_metric(board, grade, subject, paper_type, source, test_data):
+    """Count a paper handed to a user (source: generated, joined, cache or degraded) or a failed one"""
+    if test_data:
+        get_metrics_store().record(PAPER_DELIVERED, board=board, grade=grade, subject=subject, paper_type=paper_type,
+                                   source=source, questions=len(test_data.get('questions', [])))
+    else:
+        get_metrics_store().record(PAPER_FAILED, board=board, grade=grade, subject=subject, paper_type=paper_type)
+
+def get_paper_metrics():
+    """Live paper counts for the dashboard: delivered, failed, success rate and per-board totals"""
+    counters = get_metrics_store().counters()
+    delivered = counters.get(PAPER_DELIVERED, 0)
+    failed = counters.get(PAPER_FAILED, 0)
+    board_prefix = f"{PAPER_DELIVERED}:board:"
+    source_prefix = f"{PAPER_DELIVERED}:source:"
+    return {
+        "total_tests": delivered,
+        "failed_tests": failed,
+        "success_rate": round(delivered / (delivered + failed) * 100, 1) if delivered + failed else None,
+        "board_specific_tests": {name[len(board_prefix):]: value for name, value in counters.items() if name.startswith(board_prefix)},
+        "sources": {name[len(source_prefix):]: value for name, value in counters.items() if name.startswith(source_prefix)}
+    }
+
+def get_usage_report():
+    """Get token, cost and latency breakdowns per paper type, board/grade and hour from the usage store"""
+    usage_store = get_usage_store()
+    return {
+        "totals": usage_store.totals(),
+        "by_paper_type": usage_store.by_paper_type(),
+        "by_board": usage_store.by_board(),
+        "per_hour": usage_store.per_hour()
+    }
+
+def select_model(grade, paper_type):
+    """Routing decision (tier, model and reason) for a paper"""
+    return route_model(grade, *get_question_counts(paper_type))
+
+def get_model_routing_stats():
+    """Get latency and failure figures per routed model tier"""
+    return get_routing_log().summary()
+
+def generate_paper(board, grade, subject, topic, paper_type, include_answers_on_screen, stream=False, on_question=None, on_queue_wait=None, decision=None, cancel_event=None):
+    """Generate a complete paper without touching Streamlit
+    
+    Returns (test_data, error, raw_content); safe to run in background threads.
+    The model comes from the routing decision, which is logged with the latency.
+    """
+    decision = decision or select_model(grade, paper_type)
+    started = time.monotonic()
+    test_data, error, content, repaired = _generate_paper_with_model(
+        board, grade, subject, topic, paper_type, include_answers_on_screen, decision["model"],
+        stream=stream, on_question=on_question, on_queue_wait=on_queue_wait, cancel_event=cancel_event
+    )
+    latency = time.monotonic() - started
+    outcome = "error" if test_data is None else ("repaired" if repaired else "ok")
+    selection = {"board": board, "grade": grade, "subject": subject, "topic": topic, "paper_type": paper_type}
+    get_routing_log().record(decision, selection, latency, outcome)
+    get_timing_recorder().record("generate_paper", latency, tier=decision["tier"], paper_type=paper_type, stream=stream, outcome=outcome)
+    return test_data, error, content
+
+def _generate_paper_with_model(board, grade, subject, topic, paper_type, include_answers_on_screen, model, stream=False, on_question=None, on_queue_wait=None, cancel_event=None):
+    """generate_paper for a fixed model; returns (test_data, error, raw_content, repaired)"""
+    mcq_count, short_count, long_count = get_question_counts(paper_type)
+    shards = plan_generation_shards(mcq_count, short_count, long_count)
+    # Every shard, continuation and later paper for this board, grade and subject shares one cached prefix
+    with span("prompt_build", shards=len(shards)):
+        system_prompt = build_system_prompt(board, grade, subject)
+        prompts = [
+            build_generation_prompt(board, grade, subject, topic, paper_type, shard_mcq, shard_short, shard_long)
+            for shard_mcq, shard_short, shard_long in shards
+        ]
+    
+    max_tokens = [estimate_max_tokens(*shard) for shard in shards]
+    # Every call for this paper is tagged with the same id so usage can be summed per paper
+    labels = {"paper_id": uuid.uuid4().hex, "board": board, "grade": grade, "subject": subject, "paper_type": paper_type}
+    
+    if len(prompts) == 1:
+        results = [request_questions(prompts[0], max_tokens=max_tokens[0], stream=stream, on_question=on_question,
+                                     on_queue_wait=on_queue_wait, system_prompt=system_prompt, model=model,
+                                     cancel_event=cancel_event, labels=labels)]
+    else:
+        results = _run_shards_in_parallel(prompts, max_tokens, stream=stream, on_question=on_question,
+                                          on_queue_wait=on_queue_wait, system_prompt=system_prompt, model=model,
+                                          cancel_event=cancel_event, labels=labels)
+    
+    shard_questions = []
+    repaired = False
+    for shard_number, (parsed, error, content) in enumerate(results, 1):
+        if parsed is None:
+            prefix = f"Part {shard_number} of {len(results)}: " if len(results) > 1 else ""
+            return None, f"{prefix}{error}", content, repaired
+        questions = parsed['questions']
+        if parsed.get('truncated') or parsed.get('rejected'):
+            repaired = True
+            questions = complete_truncated_shard(board, grade, subject, topic, paper_type, shards[shard_number - 1],
+                                                 questions, on_queue_wait=on_queue_wait, model=model, cancel_event=cancel_event,
+                                                 labels=labels)
+        shard_questions.append(questions)
+    
+    questions = merge_question_shards(shard_questions)
+    test_data = {
+        "test_info": build_test_info(board, grade, subject, topic, paper_type, questions, include_answers_on_screen),
+        "questions": questions
+    }
+    return test_data, None, None, repaired
+
+def get_circuit_breaker_status():
+    """Get the state and recent error rate of the Claude API circuit breaker"""
+    return get_claude_breaker().get_status()
+
+def serve_degraded_paper(cache_key, include_answers_on_screen):
+    """While the Claude API is unavailable, fall back to any stored paper for the same selection"""
+    fallback_test = get_paper_cache().get(cache_key, allow_expired=True)
+    if fallback_test:
+        fallback_test['test_info']['show_answers_on_screen'] = include_answers_on_screen
+        st.warning("⚠️ Claude AI is temporarily unavailable - showing a previously generated paper for this selection")
+        return fallback_test
+    
+    status = get_claude_breaker().get_status()
+    st.error(f"❌ Claude AI is temporarily unavailable and no earlier paper exists for this selection. Please try again in {status['retry_in']:.0f}s.")
+    return None
+
+def get_single_flight_stats():
+    """Get counters for generations saved by coalescing identical in-flight requests"""
+    return get_generation_flights().get_stats()
+
+def submit_generation_job(board, grade, subject, topic, paper_type, include_answers_on_screen, force_refresh=False, speculative=False):
+    """Queue a paper as a background job and return the GenerationJob straight away
+    
+    The job follows the same path as generate_questions (cache, degraded mode,
+    single-flight, paper cache store) without touching Streamlit. It streams
+    the response so job.snapshot() can report N of M questions while it runs.
+    """
+    decision = select_model(grade, paper_type)
+    cache_key = make_cache_key(board, grade, subject, topic, paper_type, decision['model'], PROMPT_TEMPLATE_VERSION, CLAUDE_API_URL)
+    total_questions = sum(get_question_counts(paper_type))
+    
+    def work(job):
+        test_data, error, content = produce(job)
+        record_paper_metric(board, grade, subject, paper_type, job.snapshot()['source'] if test_data else None, test_data)
+        return test_data, error, content
+    
+    def produce(job):
+        paper_cache = get_paper_cache()
+        if not force_refresh:
+            cached_test = paper_cache.get(cache_key)
+            if cached_test:
+                job.set_source("cache")
+                cached_test['test_info']['show_answers_on_screen'] = include_answers_on_screen
+                return cached_test, None, None
         
-        "Science": [
-            # General Science Topics
-            "matter", "states of matter", "solid", "liquid", "gas", "plasma", "energy", "kinetic", "potential",
-            "force", "forces", "motion", "speed", "velocity", "acceleration", "gravity", "friction",
-            "pressure", "temperature", "heat", "light", "sound", "electricity", "magnetism",
-            "wave", "waves", "frequency", "amplitude", "wavelength", "radiation",
-            
-            # Physics Topics
-            "mechanics", "dynamics", "kinematics", "momentum", "work", "power", "machine", "machines",
-            "lever", "pulley", "inclined plane", "simple machine", "compound machine",
-            "thermodynamics", "optics", "reflection", "refraction", "lens", "mirror",
-            "current", "voltage", "resistance", "circuit", "ohm's law", "electromagnetic",
-            "atomic", "nuclear", "radioactivity", "quantum", "relativity",
-            
-            # Chemistry Topics  
-            "atom", "atoms", "molecule", "molecules", "element", "elements", "compound", "compounds",
-            "mixture", "mixtures", "solution", "solutions", "acid", "acids", "base", "bases",
-            "salt", "salts", "pH", "indicator", "indicators", "reaction", "reactions",
-            "chemical", "physical", "change", "changes", "catalyst", "catalysts",
-            "periodic table", "metals", "non-metals", "metalloids", "ion", "ions",
-            "bond", "bonds", "ionic", "covalent", "molecular", "crystalline",
-            "oxidation", "reduction", "combustion", "corrosion", "electrolysis",
-            
-            # Biology Topics
-            "cell", "cells", "tissue", "tissues", "organ", "organs", "system", "systems",
-            "organism", "organisms", "life", "living", "non-living", "characteristics",
-            "nutrition", "respiration", "excretion", "growth", "reproduction", "movement",
-            "photosynthesis", "chlorophyll", "stomata", "transpiration", "digestion",
-            "circulation", "blood", "heart", "lungs", "kidney", "brain", "nervous",
-            "skeleton", "muscle", "muscles", "bone", "bones", "joint", "joints",
-            "genetics", "heredity", "DNA", "RNA", "chromosome", "gene", "genes",
-            "evolution", "adaptation", "natural selection", "species", "classification",
-            "bacteria", "virus", "viruses", "fungi", "algae", "protozoa",
-            "ecosystem", "environment", "food chain", "food web", "habitat", "biodiversity"
-        ],
+        if get_claude_breaker().is_open():
+            fallback_test = paper_cache.get(cache_key, allow_expired=True)
+            if fallback_test:
+                job.set_source("degraded")
+                fallback_test['test_info']['show_answers_on_screen'] = include_answers_on_screen
+                return fallback_test, None, None
+            retry_in = get_claude_breaker().get_status()['retry_in']
+            return None, f"Claude AI is temporarily unavailable and no earlier paper exists for this selection. Please try again in {retry_in:.0f}s.", None
         
-        "Physical & Health Education": [
-            # Physical Fitness
-            "fitness", "physical fitness", "exercise", "workout", "training", "conditioning",
-            "cardiovascular", "endurance", "strength", "muscular strength", "flexibility", "agility",
-            "balance", "coordination", "speed", "power", "body composition", "aerobic", "anaerobic",
-            
-            # Health and Nutrition
-            "health", "nutrition", "diet", "balanced diet", "nutrients", "vitamins", "minerals",
-            "proteins", "carbohydrates", "fats", "calories", "hydration", "water intake",
-            "healthy lifestyle", "wellness", "mental health", "stress management",
-            
-            # Sports and Games
-            "sports", "games", "team sports", "individual sports", "athletics", "track and field",
-            "swimming", "gymnastics", "basketball", "football", "volleyball", "cricket", "tennis",
-            "badminton", "table tennis", "hockey", "soccer", "running", "jumping", "throwing",
-            
-            # Movement and Skills
-            "movement", "motor skills", "locomotor", "non-locomotor", "manipulative skills",
-            "fundamental movement", "gross motor", "fine motor", "coordination", "rhythm",
-            "dance", "martial arts", "yoga", "stretching", "warm-up", "cool-down",
-            
-            # Safety and Rules
-            "safety", "first aid", "injury prevention", "rules", "regulations", "fair play",
-            "sportsmanship", "teamwork", "leadership", "communication", "cooperation"
-        ],
+        if not CLAUDE_API_KEY or CLAUDE_API_KEY == "REPLACE_WITH_YOUR_API_KEY":
+            return None, "API key not configured. Please check your API configuration.", None
+        
+        job.set_source("generated")
         
-        "Physics": [
-            "mechanics", "motion", "kinematics", "dynamics", "force", "forces", "newton's laws",
-            "momentum", "energy", "work", "power", "simple harmonic motion", "waves",
-            "sound", "light", "optics", "reflection", "refraction", "interference", "diffraction",
-            "electricity", "current", "voltage", "resistance", "capacitance", "inductance",
-            "magnetism", "electromagnetic", "induction", "transformer", "motor", "generator",
-            "thermodynamics", "heat", "temperature", "entropy", "gas laws", "kinetic theory",
-            "atomic physics", "nuclear physics", "radioactivity", "quantum", "relativity",
-            "semiconductor", "diode", "transistor", "amplifier", "oscillator", "digital"
-        ],
+        def check_cancelled():
+            # A follower waiting on someone else's generation stops as soon as its job is cancelled
+            if job.cancel_event.is_set():
+                raise GenerationCancelled()
+        
+        (test_data, error, content), shared = get_generation_flights().do(
+            cache_key,
+            lambda: generate_paper(board, grade, subject, topic, paper_type, include_answers_on_screen,
+                                   stream=True, on_question=lambda question, number: job.record_question(question),
+                                   on_queue_wait=job.record_queue_position, decision=decision,
+                                   cancel_event=job.cancel_event),
+            on_wait=check_cancelled
+        )
+        if shared:
+            # The leader may have finished between the cancel and the follower's next check
+            check_cancelled()
+        if test_data is None:
+            return None, error, content
+        if shared:
+            job.set_source("joined")
+            test_data['test_info']['show_answers_on_screen'] = include_answers_on_screen
+        else:
+            paper_cache.put(cache_key, test_data)
+        return test_data, None, None
+    
+    selection = (board, grade, subject, topic, paper_type)
+    return get_job_registry().submit(selection, total_questions, work, speculative=speculative)
+
+def start_speculative_generation(board, grade, subject, topic, paper_type, include_answers_on_screen):
+    """Start a paper before the user asks for it; returns the job, or None if it cannot run now
+    
+    Pressing the generate button adopts the job instead of starting another one;
+    cancelling it (job.cancel()) abandons the work before its next request or mid-stream.
+    """
+    if not CLAUDE_API_KEY or CLAUDE_API_KEY == "REPLACE_WITH_YOUR_API_KEY" or get_claude_breaker().is_open():
+        return None
+    return submit_generation_job(board, grade, subject, topic, paper_type, include_answers_on_screen, speculative=True)
+
+def get_generation_job(job_id):
+    """Look up a job submitted from any session; None once it has expired"""
+    return get_job_registry().get(job_id)
+
+def get_generation_job_stats():
+    """Get queued/running counts and outcomes for background generation jobs"""
+    return get_job_registry().get_stats()
+
+def generate_questions(board, grade, subject, topic, paper_type, include_answers_on_screen, stream=False, on_question=None, use_cache=True, force_refresh=False):
+    """FIXED: Generate board-specific, grade-specific questions using Claude AI with enhanced error handling
+    
+    With stream=True the response is read as an SSE stream and every question is
+    passed to on_question(question, number) as soon as its JSON object is complete.
+    Large papers are split into shards that are generated concurrently and merged.
+    Identical selections are served from the paper cache unless force_refresh is set,
+    and identical requests already in flight in another session are joined rather
+    than generated twice. Small papers may be routed to a faster model tier.
+    """
+    paper_cache = get_paper_cache()
+    decision = select_model(grade, paper_type)
+    cache_key = make_cache_key(board, grade, subject, topic, paper_type, decision['model'], PROMPT_TEMPLATE_VERSION, CLAUDE_API_URL)
+    if use_cache and not force_refresh:
+        cached_test = paper_cache.get(cache_key)
+        if cached_test:
+            cached_test['test_info']['show_answers_on_screen'] = include_answers_on_screen
+            st.success("⚡ Served a previously generated paper for this selection from cache")
+            record_paper_metric(board, grade, subject, paper_type, "cache", cached_test)
+            return cached_test
+    
+    # Degraded mode: skip the API entirely while the circuit is open
+    if get_claude_breaker().is_open():
+        fallback_test = serve_degraded_paper(cache_key, include_answers_on_screen)
+        record_paper_metric(board, grade, subject, paper_type, "degraded", fallback_test)
+        return fallback_test
+    
+    try:
+        # Enhanced error handling and API validation
+        if not CLAUDE_API_KEY or CLAUDE_API_KEY == "REPLACE_WITH_YOUR_API_KEY":
+            st.error("❌ API key not configured. Please check your API configuration.")
+            return None
         
-        "Chemistry": [
-            "atomic structure", "periodic table", "chemical bonding", "ionic", "covalent", "metallic",
-            "molecular", "crystal", "lattice", "solutions", "acids", "bases", "salts", "pH",
-            "redox", "oxidation", "reduction", "electrochemistry", "thermochemistry",
-            "chemical kinetics", "equilibrium", "organic chemistry", "hydrocarbons", "alcohols",
-            "aldehydes", "ketones", "carboxylic acids", "esters", "amines", "polymers",
-            "inorganic chemistry", "coordination compounds", "metallurgy", "qualitative analysis",
-            "quantitative analysis", "spectroscopy", "chromatography", "environmental chemistry"
-        ],
+        st.info(f"🔍 Connecting to Claude AI ({decision['tier']} tier)...")
         
-        "Biology": [
-            "cell biology", "cell division", "mitosis", "meiosis", "genetics", "mendel's laws",
-            "inheritance", "DNA replication", "transcription", "translation", "mutation",
-            "biotechnology", "genetic engineering", "cloning", "plant physiology", "photosynthesis",
-            "respiration", "transpiration", "human physiology", "digestive system", "respiratory system",
-            "circulatory system", "excretory system", "nervous system", "endocrine system",
-            "reproductive system", "ecology", "ecosystem", "food chains", "biogeochemical cycles",
-            "evolution", "natural selection", "speciation", "biodiversity", "conservation",
-            "microbiology", "bacteria", "viruses", "fungi", "immunity", "diseases"
-        ],
+        shard_count = len(plan_generation_shards(*get_question_counts(paper_type)))
+        if shard_count == 1:
+            st.info("📡 Sending request to Claude AI...")
+        else:
+            st.info(f"📡 Sending {shard_count} parallel requests to Claude AI...")
         
-        "English": [
-            # Grammar and Language
-            "grammar", "noun", "pronoun", "verb", "adjective", "adverb", "preposition", "conjunction",
-            "article", "tense", "past", "present", "future", "active", "passive", "voice",
-            "sentence", "clause", "phrase", "subject", "predicate", "object", "complement",
-            "direct", "indirect", "speech", "punctuation", "capitalization", "spelling",
-            
-            # Literature
-            "literature", "poem", "poetry", "prose", "novel", "story", "short story", "drama",
-            "play", "act", "scene", "character", "protagonist", "antagonist", "theme", "plot",
-            "setting", "conflict", "climax", "resolution", "metaphor", "simile", "alliteration",
-            "personification", "irony", "symbolism", "imagery", "rhyme", "rhythm", "meter",
-            
-            # Writing and Comprehension
-            "essay", "paragraph", "introduction", "conclusion", "thesis", "argument", "persuasive",
-            "narrative", "descriptive", "expository", "creative writing", "composition",
-            "comprehension", "reading", "vocabulary", "synonyms", "antonyms", "homonyms",
-            "prefix", "suffix", "root word", "context", "inference", "summary", "main idea"
-        ],
+        # Busy periods show the user's place in the shared request queue instead of failing
+        queue_notice = st.empty()
         
-        "Hindi": [
-            # व्याकरण (Grammar)
-            "व्याकरण", "संज्ञा", "सर्वनाम", "विशेषण", "क्रिया", "क्रिया विशेषण", "संबंधबोधक",
-            "समुच्चयबोधक", "विस्मयादिबोधक", "वाक्य", "उद्देश्य", "विधेय", "कर्ता", "कर्म", "करण",
-            "काल", "वर्तमान", "भूत", "भविष्य", "वचन", "एकवचन", "बहुवचन", "लिंग", "पुल्लिंग", "स्त्रीलिंग",
-            "कारक", "संधि", "उपसर्ग", "प्रत्यय", "समास", "तत्पुरुष", "द्वंद", "बहुव्रीहि",
-            
-            # साहित्य (Literature)  
-            "साहित्य", "कविता", "कहानी", "उपन्यास", "नाटक", "निबंध", "गद्य", "पद्य",
-            "छंद", "अलंकार", "रस", "शृंगार", "वीर", "करुण", "हास्य", "रौद्र", "भयानक",
-            "वीभत्स", "अद्भुत", "शांत", "वात्सल्य", "भक्ति", "यमक", "अनुप्रास", "उपमा", "रूपक",
-            
-            # लेखन (Writing)
-            "लेखन", "अनुच्छेद", "निबंध", "पत्र", "औपचारिक", "अनौपचारिक", "आवेदन", "शिकायत",
-            "सूचना", "विज्ञापन", "संवाद", "एकालाप", "वर्णन", "चित्र", "घटना", "यात्रा"
-        ],
+        def show_queue_position(position, expected_wait):
+            queue_notice.info(f"⏳ High demand right now - you are #{position} in the queue (expected wait ~{expected_wait:.0f}s)")
         
-        "Social Science": [
-            # History
-            "history", "ancient", "medieval", "modern", "contemporary", "civilization", "indus valley",
-            "harappan", "vedic", "mauryan", "gupta", "delhi sultanate", "mughal", "british",
-            "independence", "freedom struggle", "mahatma gandhi", "nehru", "nationalism",
-            "world war", "cold war", "renaissance", "industrial revolution", "french revolution",
-            
-            # Geography  
-            "geography", "physical", "human", "economic", "political", "map", "globe", "latitude",
-            "longitude", "equator", "prime meridian", "climate", "weather", "monsoon", "seasons",
-            "continents", "oceans", "mountains", "rivers", "plateaus", "plains", "deserts",
-            "forests", "agriculture", "irrigation", "crops", "industries", "transportation",
-            "population", "migration", "urbanization", "resources", "mineral", "energy",
-            
-            # Civics/Political Science
-            "civics", "government", "democracy", "constitution", "fundamental rights", "duties",
-            "parliament", "lok sabha", "rajya sabha", "prime minister", "president", "judiciary",
-            "supreme court", "high court", "federalism", "state", "union", "panchayati raj",
-            "elections", "voting", "political parties", "local government", "administration",
-            
-            # Economics
-            "economics", "demand", "supply", "market", "price", "money", "banking", "credit",
-            "agriculture", "industry", "service sector", "employment", "unemployment", "poverty",
-            "development", "human development", "globalization", "liberalization", "privatization"
-        ],
+        def show_attached():
+            queue_notice.info("🤝 This paper is already being generated - waiting for it to finish")
         
-        "Computer Science": [
-            # Basic Computing
-            "computer", "hardware", "software", "input", "output", "processing", "storage",
-            "memory", "RAM", "ROM", "CPU", "ALU", "control unit", "motherboard", "keyboard",
-            "mouse", "monitor", "printer", "scanner", "operating system", "windows", "linux",
-            
-            # Programming
-            "programming", "algorithm", "flowchart", "pseudocode", "variable", "constant",
-            "data type", "integer", "float", "string", "boolean", "array", "loop", "condition",
-            "if", "else", "while", "for", "function", "procedure", "parameter", "return",
-            "python", "java", "c++", "javascript", "html", "css", "sql", "database",
-            
-            # Advanced Topics
-            "data structure", "stack", "queue", "linked list", "tree", "graph", "sorting",
-            "searching", "object oriented", "class", "object", "inheritance", "polymorphism",
-            "encapsulation", "network", "internet", "protocol", "tcp", "ip", "http", "ftp",
-            "cybersecurity", "encryption", "firewall", "virus", "malware", "artificial intelligence",
-            "machine learning", "cloud computing", "big data", "blockchain"
-        ],
+        (test_data, error, content), shared = get_generation_flights().do(
+            cache_key,
+            lambda: generate_paper(board, grade, subject, topic, paper_type, include_answers_on_screen,
+                                   stream=stream, on_question=on_question, on_queue_wait=show_queue_position,
+                                   decision=decision),
+            on_wait=show_attached
+        )
+        queue_notice.empty()
         
-        "Economics": [
-            "microeconomics", "macroeconomics", "demand", "supply", "elasticity", "utility",
-            "production", "cost", "revenue", "profit", "market", "competition", "monopoly",
-            "oligopoly", "consumer", "producer", "equilibrium", "price", "inflation", "deflation",
-            "GDP", "GNP", "national income", "fiscal policy", "monetary policy", "taxation",
-            "budget", "trade", "export", "import", "balance of payments", "exchange rate",
-            "development", "growth", "poverty", "inequality", "unemployment", "employment"
-        ],
+        st.info("🔧 Processing Claude's response...")
         
-        "EVS (Environmental Studies)": [
-            # Environmental Studies
-            "environment", "pollution", "air pollution", "water pollution", "noise pollution",
-            "soil pollution", "conservation", "natural resources", "renewable", "non-renewable",
-            "forest", "deforestation", "afforestation", "wildlife", "biodiversity", "extinction",
-            "ecosystem", "food chain", "food web", "habitat", "adaptation", "climate change",
-            "global warming", "greenhouse effect", "ozone layer", "acid rain", "waste management",
-            "recycling", "reduce", "reuse", "sustainable development", "energy conservation"
-        ],
+        if test_data is None:
+            if get_claude_breaker().is_open():
+                fallback_test = serve_degraded_paper(cache_key, include_answers_on_screen)
+                record_paper_metric(board, grade, subject, paper_type, "degraded", fallback_test)
+                return fallback_test
+            record_paper_metric(board, grade, subject, paper_type, None, None)
+            st.error(f"❌ {error}")
+            if content:
+                st.error("📝 Raw response for debugging:")
+                st.code(content[:500] + "..." if len(content) > 500 else content)
+            return None
         
-        # Additional subjects for specific boards
-        "Art & Craft": [
-            "drawing", "painting", "sketching", "coloring", "craft", "handicraft", "sculpture",
-            "pottery", "paper craft", "origami", "collage", "creative", "artistic", "design",
-            "pattern", "texture", "color", "shape", "form", "composition", "perspective"
-        ],
+        if shared:
+            test_data['test_info']['show_answers_on_screen'] = include_answers_on_screen
+        elif use_cache:
+            paper_cache.put(cache_key, test_data)
+        record_paper_metric(board, grade, subject, paper_type, "joined" if shared else "generated", test_data)
         
-        "Business Studies": [
-            "business", "enterprise", "entrepreneur", "management", "planning", "organizing",
-            "directing", "controlling", "marketing", "production", "finance", "human resources",
-            "accounting", "profit", "loss", "revenue", "capital", "partnership", "company",
-            "cooperative", "sole proprietorship", "stock exchange", "shares", "debentures"
-        ],
+        st.success("✅ Test generated successfully!")
+        return test_data
         
-        "Accountancy": [
-            "accounting", "bookkeeping", "journal", "ledger", "trial balance", "balance sheet",
-            "profit and loss", "cash book", "bank reconciliation", "depreciation", "bad debts",
-            "provisions", "reserves", "capital", "revenue", "assets", "liabilities", "equity",
-            "partnership", "admission", "retirement", "dissolution", "company accounts"
-        ]
-    }
+    except Exception as e:
+        st.error(f"❌ Unexpected error: {str(e)}")
+        return None
 
-def check_topic_relevance(topic, subject):
+def check_topic_relevance(topic, subject, source=None):
     """Enhanced topic relevance checking with comprehensive curriculum matching"""
     if not topic or not subject:
         return True, []
     
-    keywords_dict = get_comprehensive_subject_keywords()
-    
-    # Safe string operations
-    topic_clean = str(topic).lower().strip()
-    subject_keywords = keywords_dict.get(subject, [])
-    
-    # Check for direct matches or partial matches
-    matches = False
-    matched_keywords = []
-    
-    for keyword in subject_keywords:
-        keyword_clean = str(keyword).lower()
-        # Check if keyword is in topic or topic is in keyword (both ways)
-        if keyword_clean in topic_clean or topic_clean in keyword_clean:
-            matches = True
-            matched_keywords.append(keyword)
-    
-    # Additional check for Science subject (covers Physics, Chemistry, Biology)
-    if not matches and subject == "Science":
-        for science_subject in ["Physics", "Chemistry", "Biology"]:
-            if science_subject in keywords_dict:
-                for keyword in keywords_dict[science_subject]:
-                    keyword_clean = str(keyword).lower()
-                    if keyword_clean in topic_clean or topic_clean in keyword_clean:
-                        matches = True
-                        matched_keywords.append(keyword)
-                        break
-                if matches:
-                    break
-    
-    # Additional check for Social Science (covers History, Geography, Civics, Economics)
-    if not matches and "Social Science" in subject:
-        social_subjects = ["History", "Geography", "Civics", "Economics", "Political Science"]
-        for social_subject in social_subjects:
-            if social_subject in keywords_dict:
-                for keyword in keywords_dict[social_subject]:
-                    keyword_clean = str(keyword).lower()
-                    if keyword_clean in topic_clean or topic_clean in keyword_clean:
-                        matches = True
-                        matched_keywords.append(keyword)
-                        break
-                if matches:
-                    break
-    
+    source = source or get_curriculum_source()
+    subject_keywords = list(source.subject_keywords.get(subject, ()))
+    # Keywords in the topic or containing it; Science and Social Science fall back to their related subjects
+    matches, _ = source.keyword_matcher.relevance(topic, subject)
     return matches, subject_keywords
 
+def match_topic_keywords(topic, subject):
+    """(matches, [(keyword, start, end), ...]) with spans in the lowercased, stripped topic"""
+    if not topic or not subject:
+        return True, []
+    return get_curriculum_source().keyword_matcher.relevance(topic, subject)
+
 def get_available_subjects(board, grade):
     """Get available subjects for board and grade"""
-    subjects_data = get_subjects_by_board()
-    board_data = subjects_data.get(board, {})
-    
-    # For IB, extract numeric grade from string like "Grade 5 (PYP)"
-    if board == "IB" and isinstance(grade, str):
-        try:
-            grade_num = int(grade.split()[1])
-            return board_data.get(grade_num, [])
-        except (IndexError, ValueError):
-            return []
-    
-    return board_data.get(grade, [])
+    # IB grades arrive as strings like "Grade 5 (PYP)"; the index parses the number out
+    return list(get_curriculum_source().subjects(board, grade))
 
+@timed("pdf_questions")
 def create_questions_pdf(test_data, filename="questions.pdf"):
     """Create PDF with questions only"""
     if not PDF_AVAILABLE:
@@ -1425,6 +1565,7 @@ def create_questions_pdf(test_data, filename="questions.pdf"):
         st.error(f"Error creating PDF: {str(e)}")
         return None
 
+@timed("pdf_answers")
 def create_answers_pdf(test_data, filename="answers.pdf"):
     """Create PDF with answers only"""
     if not PDF_AVAILABLE:
@@ -1674,6 +1815,11 @@ def show_test_creator(navigate_to=None):
             topic_valid = False
             st.error(f"⚠️ Topic '{topic}' doesn't match {board} Grade {grade} {subject} curriculum")
             
+            # Near misses (shared words or word stems) first, then the curriculum list
+            ranked_topics = rank_curriculum_topics(board, grade, subject, topic, limit=3)
+            if ranked_topics:
+                st.info("🔎 **Closest curriculum topics:** " + ", ".join(f"{name} (score {score:g})" for name, score in ranked_topics))
+            
             # Show curriculum-based suggestions
             if curriculum_topics:
                 st.info(f"💡 **Suggested topics from {board} Grade {grade} {subject} curriculum:**")
@@ -1701,10 +1847,10 @@ def show_test_creator(navigate_to=None):
                     st.info(f"📚 And {len(curriculum_topics) - 16} more topics in {board} Grade {grade} {subject} curriculum")
         else:
             st.success(f"✅ Topic '{topic}' is valid for {board} Grade {grade} {subject}")
-            # Show matched curriculum topics for confirmation
-            matched_topics = [t for t in curriculum_topics if topic.lower() in t.lower() or t.lower() in topic.lower()]
-            if matched_topics:
-                st.info(f"🎯 **Matched curriculum topics:** {', '.join(matched_topics[:3])}")
+            # Show matched curriculum topics for confirmation, best match first
+            ranked_topics = rank_curriculum_topics(board, grade, subject, topic, limit=3)
+            if ranked_topics:
+                st.info("🎯 **Matched curriculum topics:** " + ", ".join(f"{name} (score {score:g})" for name, score in ranked_topics))
     elif topic and not (subject and board and grade):
         st.warning("⚠️ Please select board, grade, and subject first to validate your topic")
         topic_valid = False
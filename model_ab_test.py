@@ -0,0 +1,133 @@
+"""A/B harness: compare latency and parse failures per model tier on recorded prompts
+
+Usage:
+    ROUTING_LOG_FILE=routing.jsonl streamlit run main.py     # record selections while the app is used
+    python model_ab_test.py --log routing.jsonl --limit 20
+    python model_ab_test.py --tiers fast standard --repeat 3 --output ab_results.json
+
+Each recorded selection is rebuilt into exactly the prompts the app sends and
+every shard is sent once per tier, alternating which tier goes first so that
+load changes over the run affect both tiers alike. Without a log a few sample
+selections are used.
+"""
+import argparse
+import json
+import time
+
+from src.components.model_router import MODEL_TIERS, load_recorded_selections, route_model
+from src.components.retry_policy import percentile
+from src.components.mock_test_creator import (
+    get_question_counts,
+    plan_generation_shards,
+    build_system_prompt,
+    build_generation_prompt,
+    estimate_max_tokens,
+    request_questions
+)
+
+SAMPLE_SELECTIONS = [
+    {"board": "CBSE", "grade": 2, "subject": "Mathematics", "topic": "Addition", "paper_type": "Oral Assessment (10 Questions)"},
+    {"board": "CBSE", "grade": 4, "subject": "Mathematics", "topic": "Fractions", "paper_type": "Primary Assessment (20 Mixed Questions)"},
+    {"board": "CBSE", "grade": 7, "subject": "Science", "topic": "Nutrition in Plants", "paper_type": "Unit Test (30 Questions)"},
+    {"board": "CBSE", "grade": 10, "subject": "Mathematics", "topic": "Polynomials", "paper_type": "Board Pattern Paper 2 (Long Answer)"}
+]
+
+
+def selection_requests(selection):
+    """The (system_prompt, prompt, max_tokens, requested) tuples the app sends for a selection"""
+    board, grade, subject = selection["board"], selection["grade"], selection["subject"]
+    system_prompt = build_system_prompt(board, grade, subject)
+    shards = plan_generation_shards(*get_question_counts(selection["paper_type"]))
+    return [
+        (system_prompt,
+         build_generation_prompt(board, grade, subject, selection["topic"], selection["paper_type"], *shard),
+         estimate_max_tokens(*shard),
+         sum(shard))
+        for shard in shards
+    ]
+
+
+def run_request(tier, system_prompt, prompt, max_tokens, requested):
+    started = time.monotonic()
+    parsed, error, content = request_questions(prompt, max_tokens=max_tokens, system_prompt=system_prompt,
+                                               model=MODEL_TIERS[tier], kind="ab_test")
+    latency = time.monotonic() - started
+    if parsed is None:
+        # A response we could not parse counts against the model; anything else is a request failure
+        outcome = "parse_failure" if content is not None else "request_error"
+    elif parsed.get("truncated") or parsed.get("rejected"):
+        outcome = "partial"
+    else:
+        outcome = "ok"
+    return {
+        "tier": tier,
+        "latency": round(latency, 3),
+        "outcome": outcome,
+        "error": error,
+        "requested": requested,
+        "delivered": len(parsed["questions"]) if parsed else 0
+    }
+
+
+def summarize(results, tiers):
+    summary = {}
+    for tier in tiers:
+        tier_results = [result for result in results if result["tier"] == tier]
+        if not tier_results:
+            continue
+        answered = [result for result in tier_results if result["outcome"] != "request_error"]
+        latencies = [result["latency"] for result in answered]
+        summary[tier] = {
+            "model": MODEL_TIERS[tier],
+            "requests": len(tier_results),
+            "request_errors": len(tier_results) - len(answered),
+            "p50_latency": percentile(latencies, 50),
+            "p95_latency": percentile(latencies, 95),
+            "p99_latency": percentile(latencies, 99),
+            "parse_failure_rate": round(sum(1 for result in answered if result["outcome"] == "parse_failure") / len(answered) * 100, 1) if answered else 0.0,
+            "partial_rate": round(sum(1 for result in answered if result["outcome"] == "partial") / len(answered) * 100, 1) if answered else 0.0,
+            "delivery_rate": round(sum(result["delivered"] for result in answered) / max(sum(result["requested"] for result in answered), 1) * 100, 1)
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log", help="routing log (JSONL) whose selections are replayed")
+    parser.add_argument("--tiers", nargs="+", default=sorted(MODEL_TIERS), choices=sorted(MODEL_TIERS))
+    parser.add_argument("--limit", type=int, help="replay at most this many selections")
+    parser.add_argument("--repeat", type=int, default=1, help="send every prompt this many times per tier")
+    parser.add_argument("--output", help="write per-request results and the summary to this JSON file")
+    args = parser.parse_args()
+
+    selections = load_recorded_selections(args.log) if args.log else SAMPLE_SELECTIONS
+    selections = selections[:args.limit] if args.limit else selections
+
+    results = []
+    for round_number in range(args.repeat):
+        for index, selection in enumerate(selections):
+            decision = route_model(selection["grade"], *get_question_counts(selection["paper_type"]))
+            order = args.tiers if (index + round_number) % 2 == 0 else list(reversed(args.tiers))
+            for system_prompt, prompt, max_tokens, requested in selection_requests(selection):
+                for tier in order:
+                    result = run_request(tier, system_prompt, prompt, max_tokens, requested)
+                    result["routed_tier"] = decision["tier"]
+                    result["selection"] = selection
+                    results.append(result)
+                    print(f"{selection['board']} G{selection['grade']} {selection['paper_type'][:30]:<30} "
+                          f"{tier:<9}{result['latency']:>7.2f}s  {result['outcome']}")
+
+    summary = summarize(results, args.tiers)
+    print()
+    print(f"{'tier':<10}{'requests':>9}{'p50':>8}{'p95':>8}{'parse fail':>12}{'partial':>9}{'delivered':>11}")
+    for tier, row in summary.items():
+        print(f"{tier:<10}{row['requests']:>9}{row['p50_latency']:>7.2f}s{row['p95_latency']:>7.2f}s"
+              f"{row['parse_failure_rate']:>11.1f}%{row['partial_rate']:>8.1f}%{row['delivery_rate']:>10.1f}%")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({"summary": summary, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
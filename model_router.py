@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from src.components.retry_policy import percentile
+
+logger = logging.getLogger(__name__)
+
+# Model per tier; the standard tier is what every request used before routing existed
+MODEL_TIERS = {
+    "fast": os.environ.get("CLAUDE_FAST_MODEL", "claude-3-5-haiku-20241022"),
+    "standard": os.environ.get("CLAUDE_STANDARD_MODEL", "claude-3-5-sonnet-20241022")
+}
+CLAUDE_MODEL_ROUTING = os.environ.get("CLAUDE_MODEL_ROUTING", "on").lower() not in ("off", "0", "false")
+# Optional JSONL file of routing decisions; the A/B harness replays its selections as recorded prompts
+ROUTING_LOG_FILE = os.environ.get("ROUTING_LOG_FILE", "")
+
+# First matching rule wins: (highest grade, most questions, highest long-answer share, tier).
+# Anything that matches no rule goes to the standard tier.
+ROUTING_TABLE = [
+    (5, 20, 0.0, "fast"),    # primary papers without long answers, e.g. CBSE Grade 2 Oral Assessment
+    (8, 15, 0.0, "fast"),    # short middle-school quizzes
+]
+
+
+def _grade_number(grade):
+    """Numeric grade from 7, "7" or "Grade 7 (MYP)"; unknown grades route like the senior years"""
+    if isinstance(grade, int):
+        return grade
+    match = re.search(r"\d+", str(grade))
+    return int(match.group()) if match else 12
+
+
+def route_model(grade, mcq_count, short_count, long_count):
+    """Pick a model tier for a paper from its grade band, size and long-answer share"""
+    grade_number = _grade_number(grade)
+    total = mcq_count + short_count + long_count
+    long_share = long_count / total if total else 0.0
+    decision = {
+        "tier": "standard",
+        "model": MODEL_TIERS["standard"],
+        "reason": "default",
+        "grade": grade_number,
+        "questions": total,
+        "long_share": round(long_share, 2)
+    }
+    if not CLAUDE_MODEL_ROUTING:
+        decision["reason"] = "routing disabled"
+        return decision
+
+    for max_grade, max_questions, max_long_share, tier in ROUTING_TABLE:
+        if grade_number <= max_grade and total <= max_questions and long_share <= max_long_share:
+            decision.update({
+                "tier": tier,
+                "model": MODEL_TIERS[tier],
+                "reason": f"grade <= {max_grade}, <= {max_questions} questions, long share <= {max_long_share:.0%}"
+            })
+            break
+    return decision
+
+
+class RoutingLog:
+    """Recent routing decisions with the latency and outcome of the generation they routed"""
+
+    def __init__(self, history=1000, log_file=ROUTING_LOG_FILE):
+        self._lock = threading.Lock()
+        self.entries = deque(maxlen=history)
+        self.log_file = log_file
+
+    def record(self, decision, selection, latency, outcome):
+        entry = {
+            "timestamp": time.time(),
+            "tier": decision["tier"],
+            "model": decision["model"],
+            "reason": decision["reason"],
+            "latency": round(latency, 3),
+            "outcome": outcome,
+            "selection": selection
+        }
+        logger.info("routed %s grade %s (%s questions) to %s tier %s in %.2fs: %s",
+                    selection.get("paper_type"), decision["grade"], decision["questions"],
+                    decision["tier"], decision["model"], latency, outcome)
+        with self._lock:
+            self.entries.append(entry)
+            if self.log_file:
+                try:
+                    with open(self.log_file, "a", encoding="utf-8") as log:
+                        log.write(json.dumps(entry) + "\n")
+                except OSError:
+                    logger.warning("could not append to routing log %s", self.log_file)
+
+    def summary(self):
+        """Calls, latency percentiles, error and repair rates per tier"""
+        with self._lock:
+            entries = list(self.entries)
+        tiers = {}
+        for tier in sorted({entry["tier"] for entry in entries}):
+            tier_entries = [entry for entry in entries if entry["tier"] == tier]
+            latencies = [entry["latency"] for entry in tier_entries]
+            errors = sum(1 for entry in tier_entries if entry["outcome"] == "error")
+            repaired = sum(1 for entry in tier_entries if entry["outcome"] == "repaired")
+            tiers[tier] = {
+                "calls": len(tier_entries),
+                "p50_latency": percentile(latencies, 50),
+                "p95_latency": percentile(latencies, 95),
+                "error_rate": round(errors / len(tier_entries) * 100, 1),
+                # Papers that needed follow-up requests for truncated or malformed output
+                "repair_rate": round(repaired / len(tier_entries) * 100, 1)
+            }
+        return tiers
+
+
+_routing_log = RoutingLog()
+
+
+def get_routing_log():
+    return _routing_log
+
+
+def load_recorded_selections(path):
+    """Selections from a routing log file, oldest first and without duplicates"""
+    selections = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as log:
+        for line in log:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                selection = json.loads(line).get("selection")
+            except json.JSONDecodeError:
+                continue
+            if not selection:
+                continue
+            key = json.dumps(selection, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                selections.append(selection)
+    return selections
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Disk cache configuration
+PAPER_CACHE_DIR = os.environ.get("PAPER_CACHE_DIR", ".paper_cache")
+PAPER_CACHE_TTL_SECONDS = int(os.environ.get("PAPER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+PAPER_CACHE_MAX_ENTRIES = int(os.environ.get("PAPER_CACHE_MAX_ENTRIES", "500"))
+# Only papers from the real API go in PAPER_CACHE_DIR; a stand-in or stub endpoint gets a sibling directory
+PRODUCTION_API_URL = "https://api.anthropic.com/v1/messages"
+
+
+def _normalize(value):
+    """Lowercase and collapse whitespace so trivially different inputs share a key"""
+    return re.sub(r"\s+", " ", str(value)).strip().lower()
+
+
+def api_origin(api_url):
+    parts = urlsplit(str(api_url))
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def is_production_api(api_url):
+    return api_origin(api_url) == api_origin(PRODUCTION_API_URL)
+
+
+def cache_dir_for_api(api_url, cache_dir=PAPER_CACHE_DIR):
+    """Where papers generated by api_url are stored: cache_dir for the real API, cache_dir-<host-port> otherwise"""
+    if is_production_api(api_url):
+        return cache_dir
+    origin = re.sub(r"[^a-z0-9]+", "-", urlsplit(str(api_url)).netloc.lower()).strip("-") or "local"
+    return f"{cache_dir.rstrip(os.sep)}-{origin}"
+
+
+def make_cache_key(board, grade, subject, topic, paper_type, model, template_version, api_url=None):
+    """Content address for a paper: hash of the normalized inputs, model and prompt version
+
+    Papers from an endpoint other than the real API (a stand-in or stub) also hash
+    its origin, so they can never be served under a production key; keys for the
+    real API are unchanged.
+    """
+    fields = {
+        "board": _normalize(board),
+        "grade": _normalize(grade),
+        "subject": _normalize(subject),
+        "topic": _normalize(topic),
+        "paper_type": _normalize(paper_type),
+        "model": model,
+        "template_version": template_version
+    }
+    if api_url and not is_production_api(api_url):
+        fields["api"] = api_origin(api_url)
+    encoded = json.dumps(fields, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class PaperCache:
+    """Disk-backed paper cache with TTL expiry and size-bounded LRU eviction
+
+    Each entry is one JSON file named after its key. The file mtime is bumped on
+    every hit, so the least recently used entries are the oldest files.
+    """
+
+    def __init__(self, cache_dir=PAPER_CACHE_DIR, ttl_seconds=PAPER_CACHE_TTL_SECONDS, max_entries=PAPER_CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _record(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def get(self, key, allow_expired=False):
+        """Return the cached test data for key, or None on a miss"""
+        entry = self._read(key)
+        if entry is None:
+            self._record("misses")
+            return None
+
+        if not allow_expired and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            self._record("expired")
+            self._record("misses")
+            self._remove(key)
+            return None
+
+        try:
+            # Touch the file so LRU eviction sees this entry as recently used
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        self._record("hits")
+        return entry.get("test_data")
+
+    def contains(self, key):
+        """True if a fresh entry exists; unlike get() it leaves stats and LRU order alone"""
+        entry = self._read(key)
+        return entry is not None and time.time() - entry.get("created_at", 0) <= self.ttl_seconds
+
+    def put(self, key, test_data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {"created_at": time.time(), "test_data": test_data}
+
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as temp_file:
+                json.dump(entry, temp_file)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+        self._record("stores")
+        self._evict()
+        return True
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries"""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.is_file() and entry.name.endswith(".json")
+            ]
+        except OSError:
+            return
+
+        overflow = len(entries) - self.max_entries
+        if overflow <= 0:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:overflow]:
+            try:
+                os.remove(entry.path)
+                self._record("evictions")
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                self._remove(entry.name[:-5])
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups * 100, 1) if lookups else 0.0
+        try:
+            stats["entries"] = sum(1 for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json"))
+        except OSError:
+            stats["entries"] = 0
+        return stats
+
+
+_paper_cache = None
+_paper_cache_lock = threading.Lock()
+
+
+def get_paper_cache():
+    """Return the process-wide PaperCache for the configured CLAUDE_API_URL"""
+    global _paper_cache
+    if _paper_cache is None:
+        with _paper_cache_lock:
+            if _paper_cache is None:
+                _paper_cache = PaperCache(cache_dir_for_api(os.environ.get("CLAUDE_API_URL", PRODUCTION_API_URL)))
+    return _paper_cache
@@ -0,0 +1,193 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.components.retry_policy import percentile
+
+logger = logging.getLogger(__name__)
+
+# Local Prometheus endpoint (http://127.0.0.1:9464/metrics); "off" disables it
+PERF_METRICS_HOST = os.environ.get("PERF_METRICS_HOST", "127.0.0.1")
+PERF_METRICS_PORT = os.environ.get("PERF_METRICS_PORT", "9464")
+# Spans kept per stage for the rolling percentiles on the admin page
+PERF_WINDOW = int(os.environ.get("PERF_WINDOW", "1000"))
+PERF_LOG_SPANS = os.environ.get("PERF_LOG_SPANS", "on").lower() not in ("off", "0", "false")
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRIC_NAME = "mock_test_stage_seconds"
+
+# Pipeline stages in the order a paper goes through them
+STAGES = (
+    "prompt_build",         # system prefix and per-shard prompts
+    "queue_wait",           # waiting for the shared rate limiter
+    "ttfb",                 # request sent until response headers
+    "download",             # response headers until the whole body is read
+    "clean_json_response",  # extracting the JSON from the model's text
+    "validation",           # expanding and validating question rows
+    "generate_paper",       # the whole paper, shards and repairs included
+    "pdf_questions",
+    "pdf_answers"
+)
+
+
+class StageHistogram:
+    """Cumulative Prometheus buckets plus a rolling window of recent durations"""
+
+    def __init__(self, window=PERF_WINDOW):
+        self.bucket_counts = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(HISTOGRAM_BUCKETS, seconds)
+        if index < len(self.bucket_counts):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+
+class TimingRecorder:
+    """Per-stage spans from every session in this server process"""
+
+    def __init__(self, window=PERF_WINDOW, log_spans=PERF_LOG_SPANS):
+        self._lock = threading.Lock()
+        self.window = window
+        self.log_spans = log_spans
+        self.histograms = {}
+
+    def record(self, stage, seconds, **fields):
+        """Record one span; fields only go to the structured log line"""
+        seconds = max(seconds, 0.0)
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = StageHistogram(self.window)
+            histogram.observe(seconds)
+        if self.log_spans:
+            logger.info(json.dumps({"event": "stage_timing", "stage": stage, "seconds": round(seconds, 4), **fields}, default=str))
+
+    @contextmanager
+    def span(self, stage, **fields):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started, **fields)
+
+    def summary(self):
+        """Count, mean and rolling p50/p95/p99 per stage, pipeline stages first"""
+        with self._lock:
+            snapshot = {stage: (histogram.count, histogram.total, list(histogram.recent))
+                        for stage, histogram in self.histograms.items()}
+        ordered = [stage for stage in STAGES if stage in snapshot] + sorted(set(snapshot) - set(STAGES))
+        stages = {}
+        for stage in ordered:
+            count, total, recent = snapshot[stage]
+            stages[stage] = {
+                "count": count,
+                "mean": round(total / count, 4) if count else 0.0,
+                "p50": round(percentile(recent, 50), 4),
+                "p95": round(percentile(recent, 95), 4),
+                "p99": round(percentile(recent, 99), 4)
+            }
+        return stages
+
+    def prometheus_text(self):
+        """Histograms in the Prometheus text exposition format, plus the rolling quantiles as gauges"""
+        with self._lock:
+            snapshot = {stage: (list(histogram.bucket_counts), histogram.count, histogram.total)
+                        for stage, histogram in self.histograms.items()}
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each stage of paper generation and PDF building",
+            f"# TYPE {METRIC_NAME} histogram"
+        ]
+        for stage in sorted(snapshot):
+            bucket_counts, count, total = snapshot[stage]
+            cumulative = 0
+            for bound, bucket_count in zip(HISTOGRAM_BUCKETS, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {count}')
+        lines.append(f"# HELP {METRIC_NAME}_window Rolling quantiles over the last {self.window} spans per stage")
+        lines.append(f"# TYPE {METRIC_NAME}_window gauge")
+        for stage, row in self.summary().items():
+            for quantile in ("p50", "p95", "p99"):
+                lines.append(f'{METRIC_NAME}_window{{stage="{stage}",quantile="0.{quantile[1:]}"}} {row[quantile]}')
+        return "\n".join(lines) + "\n"
+
+
+_timing_recorder = TimingRecorder()
+
+
+def get_timing_recorder():
+    return _timing_recorder
+
+
+def span(stage, **fields):
+    """Time a block as one stage: with span("validation"): ..."""
+    return _timing_recorder.span(stage, **fields)
+
+
+def timed(stage):
+    """Decorator recording every call of a function as one stage"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _timing_recorder.span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = _timing_recorder.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+# Set when the bind failed, so later reruns do not retry it and log again
+_metrics_bind_failed = False
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_endpoint(host=PERF_METRICS_HOST, port=PERF_METRICS_PORT):
+    """Serve /metrics on a background thread, once per process; returns the URL or None"""
+    global _metrics_server, _metrics_bind_failed
+    if str(port).lower() in ("off", "false", ""):
+        return None
+    with _metrics_lock:
+        if _metrics_bind_failed:
+            return None
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                # Usually another app process already serves the port; tried once per process
+                _metrics_bind_failed = True
+                logger.warning("timing metrics endpoint not started on %s:%s: %s", host, port, e)
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="timing-metrics", daemon=True).start()
+        return f"http://{host}:{_metrics_server.server_address[1]}/metrics"
@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+
+# Header that enables cache_control blocks on the Messages API
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+
+# Shortest prefix the API will cache, by model family. cache_control on anything shorter is
+# silently ignored: the call is billed in full and reports no cache reads or writes.
+PROMPT_CACHE_MIN_TOKENS = {"haiku": 2048, "sonnet": 1024, "opus": 1024}
+DEFAULT_PROMPT_CACHE_MIN_TOKENS = 1024
+# Rough English-text ratio, the same one the rate limiter budgets with
+CHARS_PER_TOKEN = 4
+
+
+def prompt_cache_min_tokens(model):
+    model = str(model or "").lower()
+    for family, min_tokens in PROMPT_CACHE_MIN_TOKENS.items():
+        if family in model:
+            return min_tokens
+    return DEFAULT_PROMPT_CACHE_MIN_TOKENS
+
+
+def estimate_prompt_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def is_cacheable(system_prompt, model):
+    """True if the prefix is long enough for the model's prompt cache"""
+    return estimate_prompt_tokens(system_prompt) >= prompt_cache_min_tokens(model)
+
+
+def cached_system_blocks(system_prompt, model):
+    """System content, with a cache breakpoint after the prefix when the model can cache it"""
+    block = {"type": "text", "text": system_prompt}
+    if is_cacheable(system_prompt, model):
+        block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+
+class PromptCacheRecorder:
+    """Tracks prompt cache reads and writes reported in the API usage block
+
+    Each call is classified as a cache read (prefix served from cache), a cache
+    write (prefix stored for later calls) or uncached, so input tokens and time
+    to first token can be compared between cold and warm prefixes.
+    """
+
+    def __init__(self, history=1000):
+        self._lock = threading.Lock()
+        self.calls = deque(maxlen=history)
+
+    def record(self, usage, first_token_latency=None, cacheable=True):
+        """cacheable=False marks a prefix sent without cache_control because it is below the model's minimum"""
+        if not usage:
+            return
+        cache_read = usage.get("cache_read_input_tokens") or 0
+        cache_write = usage.get("cache_creation_input_tokens") or 0
+        if cache_read:
+            outcome = "read"
+        elif cache_write:
+            outcome = "write"
+        else:
+            outcome = "uncached" if cacheable else "below_minimum"
+        with self._lock:
+            self.calls.append({
+                "input_tokens": usage.get("input_tokens") or 0,
+                "cache_read_input_tokens": cache_read,
+                "cache_creation_input_tokens": cache_write,
+                "outcome": outcome,
+                "first_token_latency": round(first_token_latency, 3) if first_token_latency is not None else None
+            })
+
+    def summary(self):
+        with self._lock:
+            calls = list(self.calls)
+
+        def average(values):
+            values = [value for value in values if value is not None]
+            return round(sum(values) / len(values), 3) if values else 0.0
+
+        reads = [call for call in calls if call["outcome"] == "read"]
+        cold = [call for call in calls if call["outcome"] != "read"]
+        cached_tokens = sum(call["cache_read_input_tokens"] for call in calls)
+        total_input = sum(call["input_tokens"] + call["cache_read_input_tokens"] + call["cache_creation_input_tokens"] for call in calls)
+        return {
+            "requests": len(calls),
+            "cache_reads": len(reads),
+            "cache_writes": sum(1 for call in calls if call["outcome"] == "write"),
+            "below_minimum": sum(1 for call in calls if call["outcome"] == "below_minimum"),
+            "cache_read_tokens": cached_tokens,
+            "cache_write_tokens": sum(call["cache_creation_input_tokens"] for call in calls),
+            "cached_input_share": round(cached_tokens / total_input * 100, 1) if total_input else 0.0,
+            # Uncached input tokens billed at the full rate, and latency, with and without a warm prefix
+            "avg_input_tokens_warm": average(call["input_tokens"] for call in reads),
+            "avg_input_tokens_cold": average(call["input_tokens"] + call["cache_creation_input_tokens"] for call in cold),
+            "avg_first_token_warm": average(call["first_token_latency"] for call in reads),
+            "avg_first_token_cold": average(call["first_token_latency"] for call in cold)
+        }
+
+
+_prompt_cache_recorder = PromptCacheRecorder()
+
+
+def get_prompt_cache_recorder():
+    return _prompt_cache_recorder
@@ -0,0 +1,84 @@
+import json
+
+
+class QuestionStreamParser:
+    """Incrementally extract completed question objects from a partially received JSON paper
+
+    Text is fed in arbitrary chunks as it streams in. Every element of the
+    "questions" array is returned as soon as its closing brace arrives, so the
+    caller can render it without waiting for the rest of the paper.
+    """
+
+    def __init__(self, array_key="questions"):
+        self.array_key = array_key
+        self.buffer = ""
+        self.questions = []
+        self.finished = False
+        self._array_start = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._element_start = -1
+
+    def feed(self, text):
+        """Add streamed text and return the list of questions completed by it"""
+        if self.finished or not text:
+            return []
+        self.buffer += text
+
+        if self._array_start == -1 and not self._find_array_start():
+            return []
+
+        completed = []
+        buffer = self.buffer
+        pos = self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._element_start = pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the questions array itself
+                    self.finished = True
+                    pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._element_start != -1:
+                    element = self._parse_element(buffer[self._element_start:pos + 1])
+                    if element is not None:
+                        self.questions.append(element)
+                        completed.append(element)
+                    self._element_start = -1
+            pos += 1
+        self._pos = pos
+        return completed
+
+    def _find_array_start(self):
+        key_index = self.buffer.find(f'"{self.array_key}"')
+        if key_index == -1:
+            return False
+        bracket_index = self.buffer.find("[", key_index + len(self.array_key) + 2)
+        if bracket_index == -1:
+            return False
+        self._array_start = bracket_index
+        self._pos = bracket_index + 1
+        return True
+
+    def _parse_element(self, raw):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # A malformed element is skipped here; the full-paper parse reports the error
+            return None
@@ -0,0 +1,191 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+# Budgets shared by every session in this server process (match them to the API key's tier)
+CLAUDE_RATE_LIMIT_RPM = int(os.environ.get("CLAUDE_RATE_LIMIT_RPM", "50"))
+CLAUDE_RATE_LIMIT_TPM = int(os.environ.get("CLAUDE_RATE_LIMIT_TPM", "80000"))
+CLAUDE_RATE_LIMIT_MAX_WAIT = float(os.environ.get("CLAUDE_RATE_LIMIT_MAX_WAIT", "300"))
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a request would wait in the queue longer than allowed"""
+
+
+class RateLimitCancelled(Exception):
+    """Raised when the caller's cancel_event is set while it waits in the queue"""
+
+
+class TokenBucket:
+    """Classic token bucket; not thread-safe on its own, RateLimiter holds the lock"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        """Seconds until amount tokens are available (0 if they already are)"""
+        amount = min(amount, self.capacity)
+        missing = amount - self.tokens
+        return max(missing / self.rate, 0.0) if self.rate > 0 else float("inf")
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class Reservation:
+    """Budget granted to one request; reconcile() settles the token estimate against real usage"""
+
+    def __init__(self, limiter, estimated_tokens, waited):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.waited = waited
+        self._settled = False
+
+    def reconcile(self, actual_tokens):
+        if self._settled or actual_tokens is None:
+            return
+        self._settled = True
+        self.limiter._refund(self.estimated_tokens - actual_tokens)
+
+
+class _Ticket:
+    _ids = itertools.count(1)
+
+    def __init__(self, tokens):
+        self.id = next(self._ids)
+        self.tokens = tokens
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter with a fair FIFO queue
+
+    Only the ticket at the head of the queue may take budget, so a large request
+    is never starved by a stream of small ones and users are served in order.
+    """
+
+    def __init__(self, rpm=CLAUDE_RATE_LIMIT_RPM, tpm=CLAUDE_RATE_LIMIT_TPM):
+        self.requests_bucket = TokenBucket(rpm)
+        self.tokens_bucket = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._stats = {"granted": 0, "queued": 0, "timeouts": 0, "cancelled": 0, "total_wait": 0.0, "max_queue_length": 0}
+
+    def _head_wait(self, tokens):
+        return max(self.requests_bucket.time_until(1), self.tokens_bucket.time_until(tokens))
+
+    def _estimate_wait(self, ticket):
+        """Expected wait for ticket given everything queued ahead of it"""
+        requests_needed = 0
+        tokens_needed = 0
+        for queued in self._queue:
+            requests_needed += 1
+            tokens_needed += min(queued.tokens, self.tokens_bucket.capacity)
+            if queued is ticket:
+                break
+        request_wait = max(requests_needed - self.requests_bucket.tokens, 0) / self.requests_bucket.rate
+        token_wait = max(tokens_needed - self.tokens_bucket.tokens, 0) / self.tokens_bucket.rate
+        return max(request_wait, token_wait)
+
+    def acquire(self, estimated_tokens, on_wait=None, max_wait=CLAUDE_RATE_LIMIT_MAX_WAIT, cancel_event=None):
+        """Block until the request may be sent; on_wait(position, expected_wait) reports queue progress
+
+        Setting cancel_event takes the request out of the queue (within half a second)
+        and raises RateLimitCancelled without consuming any budget.
+        """
+        ticket = _Ticket(estimated_tokens)
+        started = time.monotonic()
+        last_notice = None
+
+        with self._cond:
+            self._queue.append(ticket)
+            self._stats["max_queue_length"] = max(self._stats["max_queue_length"], len(self._queue))
+
+        try:
+            while True:
+                with self._cond:
+                    if cancel_event is not None and cancel_event.is_set():
+                        self._stats["cancelled"] += 1
+                        raise RateLimitCancelled("Request cancelled while waiting in the queue")
+                    now = time.monotonic()
+                    self.requests_bucket.refill(now)
+                    self.tokens_bucket.refill(now)
+
+                    if self._queue[0] is ticket:
+                        head_wait = self._head_wait(ticket.tokens)
+                        if head_wait <= 0:
+                            self.requests_bucket.consume(1)
+                            self.tokens_bucket.consume(ticket.tokens)
+                            self._queue.popleft()
+                            waited = now - started
+                            self._stats["granted"] += 1
+                            self._stats["total_wait"] += waited
+                            if last_notice is not None:
+                                self._stats["queued"] += 1
+                            self._cond.notify_all()
+                            return Reservation(self, ticket.tokens, waited)
+
+                    position = self._queue.index(ticket) + 1
+                    expected_wait = self._estimate_wait(ticket)
+
+                    if now - started + expected_wait > max_wait:
+                        self._stats["timeouts"] += 1
+                        raise RateLimitTimeout(
+                            f"Server is busy: expected wait of {expected_wait:.0f}s exceeds the {max_wait:.0f}s limit"
+                        )
+
+                notice = (position, int(expected_wait))
+                if on_wait and notice != last_notice:
+                    # Called without the lock so a slow UI update never blocks other sessions
+                    on_wait(position, expected_wait)
+                last_notice = notice
+
+                with self._cond:
+                    self._cond.wait(timeout=min(max(expected_wait, 0.05), 0.5))
+        except BaseException:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                self._cond.notify_all()
+            raise
+
+    def _refund(self, tokens):
+        with self._cond:
+            self.tokens_bucket.tokens = min(self.tokens_bucket.capacity, self.tokens_bucket.tokens + tokens)
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_length"] = len(self._queue)
+            stats["requests_available"] = int(self.requests_bucket.tokens)
+            stats["tokens_available"] = int(self.tokens_bucket.tokens)
+        stats["average_wait"] = round(stats["total_wait"] / stats["granted"], 2) if stats["granted"] else 0.0
+        return stats
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the limiter shared by every Streamlit session in this process"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+def estimate_request_tokens(prompt, max_tokens):
+    """Rough token estimate for budgeting: ~4 characters per input token plus the output ceiling"""
+    return len(prompt) // 4 + max_tokens
@@ -0,0 +1,193 @@
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Only failures that are safe to repeat are retried: overload, rate limiting and transport errors.
+# 400/401/403/404/413 mean the request itself is wrong and would fail the same way again.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+RETRYABLE_EXCEPTIONS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+CLAUDE_RETRY_MAX_ATTEMPTS = int(os.environ.get("CLAUDE_RETRY_MAX_ATTEMPTS", "4"))
+CLAUDE_RETRY_BASE_DELAY = float(os.environ.get("CLAUDE_RETRY_BASE_DELAY", "1.0"))
+CLAUDE_RETRY_MAX_DELAY = float(os.environ.get("CLAUDE_RETRY_MAX_DELAY", "20.0"))
+CLAUDE_RETRY_TOTAL_BUDGET = float(os.environ.get("CLAUDE_RETRY_TOTAL_BUDGET", "120.0"))
+
+
+def parse_retry_after(response):
+    """Seconds to wait from a retry-after header (delta-seconds or HTTP-date), or None"""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter inside a total time budget"""
+
+    def __init__(self, max_attempts=CLAUDE_RETRY_MAX_ATTEMPTS, base_delay=CLAUDE_RETRY_BASE_DELAY,
+                 max_delay=CLAUDE_RETRY_MAX_DELAY, total_budget=CLAUDE_RETRY_TOTAL_BUDGET):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.total_budget = total_budget
+
+    def is_retryable(self, response=None, error=None):
+        if error is not None:
+            return isinstance(error, RETRYABLE_EXCEPTIONS)
+        if response.headers.get("x-should-retry", "").lower() == "false":
+            return False
+        if response.headers.get("x-should-retry", "").lower() == "true":
+            return True
+        return response.status_code in RETRYABLE_STATUS_CODES
+
+    def compute_delay(self, attempt, retry_after=None):
+        """Delay before the next attempt; the server's retry-after always wins over backoff"""
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class RetryRecorder:
+    """Keeps recent attempts and per-request outcomes to measure the effect of retries"""
+
+    def __init__(self, history=1000):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.attempts = deque(maxlen=history)
+        self.requests = deque(maxlen=history)
+
+    def next_request_id(self):
+        return next(self._ids)
+
+    def record_attempt(self, request_id, attempt, outcome, latency, delay):
+        with self._lock:
+            self.attempts.append({
+                "request_id": request_id,
+                "attempt": attempt,
+                "outcome": outcome,
+                "latency": round(latency, 3),
+                "retry_delay": round(delay, 3) if delay is not None else None,
+                "timestamp": time.time()
+            })
+
+    def record_request(self, request_id, attempts, succeeded, first_attempt_succeeded, elapsed):
+        with self._lock:
+            self.requests.append({
+                "request_id": request_id,
+                "attempts": attempts,
+                "succeeded": succeeded,
+                "first_attempt_succeeded": first_attempt_succeeded,
+                "elapsed": round(elapsed, 3)
+            })
+
+    def summary(self):
+        """Success rate with and without retries plus end-to-end latency percentiles"""
+        with self._lock:
+            requests_seen = list(self.requests)
+            total_attempts = len(self.attempts)
+        count = len(requests_seen)
+        if not count:
+            return {"requests": 0, "attempts": total_attempts, "retried_requests": 0,
+                    "first_attempt_success_rate": 0.0, "final_success_rate": 0.0,
+                    "p50_latency": 0.0, "p95_latency": 0.0, "p99_latency": 0.0}
+
+        latencies = [entry["elapsed"] for entry in requests_seen]
+        return {
+            "requests": count,
+            "attempts": total_attempts,
+            "retried_requests": sum(1 for entry in requests_seen if entry["attempts"] > 1),
+            "first_attempt_success_rate": round(sum(1 for entry in requests_seen if entry["first_attempt_succeeded"]) / count * 100, 1),
+            "final_success_rate": round(sum(1 for entry in requests_seen if entry["succeeded"]) / count * 100, 1),
+            "p50_latency": percentile(latencies, 50),
+            "p95_latency": percentile(latencies, 95),
+            "p99_latency": percentile(latencies, 99)
+        }
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+_retry_recorder = RetryRecorder()
+
+
+def get_retry_recorder():
+    return _retry_recorder
+
+
+def send_with_retries(send, timeout=60, policy=None, recorder=None, sleep=time.sleep, cancel_event=None):
+    """Call send(timeout) until it succeeds, fails permanently or the time budget runs out
+
+    Returns the last response, or re-raises the last error. Errors raised before a
+    response exists (transport errors, a queue timeout, an open circuit) are recorded
+    like any other attempt. Setting cancel_event cuts a backoff sleep short; the next
+    send() is then expected to notice the cancellation and raise.
+    """
+    policy = policy or DEFAULT_RETRY_POLICY
+    recorder = recorder or _retry_recorder
+    request_id = recorder.next_request_id()
+    started = time.monotonic()
+    first_attempt_succeeded = False
+    attempt = 0
+
+    while True:
+        attempt += 1
+        remaining = policy.total_budget - (time.monotonic() - started)
+        attempt_started = time.monotonic()
+        response = None
+        error = None
+        try:
+            response = send(max(1.0, min(timeout, remaining)))
+            outcome = response.status_code
+        except Exception as e:
+            # Only RETRYABLE_EXCEPTIONS are retried; anything else is recorded and re-raised below
+            error = e
+            outcome = type(e).__name__
+        latency = time.monotonic() - attempt_started
+
+        succeeded = error is None and response.status_code == 200
+        if attempt == 1:
+            first_attempt_succeeded = succeeded
+
+        delay = None
+        if not succeeded and attempt < policy.max_attempts and policy.is_retryable(response, error):
+            delay = policy.compute_delay(attempt, parse_retry_after(response))
+            # Give up rather than sleep past the budget (e.g. a retry-after longer than we can wait)
+            if time.monotonic() - started + delay >= policy.total_budget:
+                delay = None
+
+        recorder.record_attempt(request_id, attempt, outcome, latency, delay)
+
+        if delay is None:
+            recorder.record_request(request_id, attempt, succeeded, first_attempt_succeeded, time.monotonic() - started)
+            if error is not None:
+                raise error
+            return response
+
+        if response is not None:
+            response.close()
+        if cancel_event is None:
+            sleep(delay)
+        elif cancel_event.wait(delay):
+            recorder.record_request(request_id, attempt, False, first_attempt_succeeded, time.monotonic() - started)
@@ -0,0 +1,126 @@
+import copy
+import threading
+
+
+class SingleFlightTimeout(Exception):
+    """Raised when a follower gives up waiting for the in-flight call"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.followers = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running (followers) wait and receive a deep copy of the
+    same result, or the same exception. If the leader is cancelled (for example
+    the Streamlit script is stopped by a rerun) a waiting follower takes over
+    and runs the function itself, so one user's navigation never fails another
+    user's request. A follower that stops waiting does not affect the leader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {
+            "leaders": 0,
+            "coalesced": 0,
+            "errors_shared": 0,
+            "leader_cancellations": 0,
+            "follower_timeouts": 0
+        }
+
+    def do(self, key, fn, on_wait=None, timeout=None, poll_interval=0.25):
+        """Run fn() once per key; returns (result, shared) where shared is True for followers
+
+        on_wait() is called every poll_interval seconds while a follower waits, which
+        gives the caller a chance to abort (by raising) or to refresh its UI.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self._stats["leaders"] += 1
+                else:
+                    call.followers += 1
+
+            if leader:
+                return self._lead(key, call, fn), False
+
+            try:
+                self._follow(call, on_wait, timeout, poll_interval)
+            finally:
+                with self._lock:
+                    call.followers -= 1
+
+            if call.cancelled:
+                # The leader went away without a result; loop to become (or follow) a new leader
+                continue
+
+            with self._lock:
+                self._stats["coalesced"] += 1
+                if call.error is not None:
+                    self._stats["errors_shared"] += 1
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+    def _lead(self, key, call, fn):
+        try:
+            result = fn()
+            # Followers copy from a private snapshot so the leader may mutate its own result
+            call.result = copy.deepcopy(result)
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.cancelled = True
+            with self._lock:
+                self._stats["leader_cancellations"] += 1
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _follow(self, call, on_wait, timeout, poll_interval):
+        waited = 0.0
+        while not call.done.wait(poll_interval):
+            waited += poll_interval
+            if timeout is not None and waited >= timeout:
+                with self._lock:
+                    self._stats["follower_timeouts"] += 1
+                raise SingleFlightTimeout(f"Gave up after waiting {timeout:.0f}s for an identical in-flight request")
+            if on_wait:
+                on_wait()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+            stats["waiting_followers"] = sum(call.followers for call in self._calls.values())
+        return stats
+
+
+_generation_flights = SingleFlight()
+
+
+def get_generation_flights():
+    """Return the process-wide single-flight registry for paper generation"""
+    return _generation_flights
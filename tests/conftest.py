@@ -0,0 +1,20 @@
+import importlib.util
+import os
+import sys
+import types
+
+# The modules import each other as src.components.<module>. When this checkout is
+# not already installed at src/components, map that package onto it.
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("USAGE_DB_FILE", "off")
+os.environ.setdefault("METRICS_DB_FILE", "off")
+
+if importlib.util.find_spec("src") is None:
+    src = types.ModuleType("src")
+    src.__path__ = []
+    components = types.ModuleType("src.components")
+    components.__path__ = [PACKAGE_DIR]
+    src.components = components
+    sys.modules["src"] = src
+    sys.modules["src.components"] = components
@@ -0,0 +1,78 @@
+import pytest
+
+from src.components import mock_test_creator
+from src.components.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from src.components.rate_limiter import RateLimitTimeout
+
+
+def tripped_breaker(open_seconds=0.0):
+    breaker = CircuitBreaker(min_calls=1, failure_rate=0.5, open_seconds=open_seconds, half_open_calls=1)
+    breaker.record_failure()
+    return breaker
+
+
+def test_trips_open_and_rejects():
+    breaker = tripped_breaker(open_seconds=60)
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.get_status()["rejected"] == 1
+
+
+def test_half_open_allows_one_probe():
+    breaker = tripped_breaker()
+    assert breaker.get_status()["state"] == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.get_status()["state"] == CLOSED
+
+
+def test_failed_probe_reopens():
+    breaker = tripped_breaker()
+    breaker.before_call()
+    breaker.open_seconds = 60
+    breaker.record_failure()
+    assert breaker.get_status()["state"] == OPEN
+
+
+def test_release_frees_probe_slot():
+    breaker = tripped_breaker()
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+
+
+class TimingOutLimiter:
+    def acquire(self, estimated_tokens, on_wait=None, cancel_event=None):
+        raise RateLimitTimeout("Server is busy")
+
+
+def test_queue_timeout_during_half_open_probe_releases_slot(monkeypatch):
+    breaker = tripped_breaker()
+    monkeypatch.setattr(mock_test_creator, "get_claude_breaker", lambda: breaker)
+    monkeypatch.setattr(mock_test_creator, "get_rate_limiter", lambda: TimingOutLimiter())
+
+    parsed, error, _ = mock_test_creator.request_questions("prompt", max_tokens=100)
+    assert parsed is None
+    assert "busy" in error
+
+    # The probe slot is free again, so the next request is let through rather than rejected
+    breaker.before_call()
+    assert breaker.get_status()["state"] == HALF_OPEN
+
+
+def test_cancel_during_half_open_probe_releases_slot(monkeypatch):
+    breaker = tripped_breaker()
+
+    class StoppingLimiter:
+        def acquire(self, estimated_tokens, on_wait=None, cancel_event=None):
+            raise mock_test_creator.GenerationCancelled()
+
+    monkeypatch.setattr(mock_test_creator, "get_claude_breaker", lambda: breaker)
+    monkeypatch.setattr(mock_test_creator, "get_rate_limiter", lambda: StoppingLimiter())
+
+    with pytest.raises(mock_test_creator.GenerationCancelled):
+        mock_test_creator.request_questions("prompt", max_tokens=100)
+    breaker.before_call()
@@ -0,0 +1,39 @@
+from src.components.claude_standin import StandinConfig, StandinState
+
+SONNET = "claude-3-5-sonnet-20241022"
+HAIKU = "claude-3-5-haiku-20241022"
+
+
+def marked(text):
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def test_short_prefix_is_never_cached():
+    state = StandinState(StandinConfig(seed=1))
+    system = marked("x" * 2000)
+    for _ in range(2):
+        usage = state.prompt_cache_usage(system, 900, SONNET)
+        assert usage == {"input_tokens": 900}
+    assert state.stats["cache_below_minimum"] == 2
+
+
+def test_long_prefix_is_written_then_read():
+    state = StandinState(StandinConfig(seed=1))
+    system = marked("x" * 6000)
+    first = state.prompt_cache_usage(system, 1600, SONNET)
+    second = state.prompt_cache_usage(system, 1600, SONNET)
+    assert first["cache_creation_input_tokens"] == 1500
+    assert second["cache_read_input_tokens"] == 1500
+    assert second["input_tokens"] == 100
+
+
+def test_minimum_depends_on_the_model():
+    state = StandinState(StandinConfig(seed=1))
+    usage = state.prompt_cache_usage(marked("x" * 6000), 1600, HAIKU)
+    assert "cache_creation_input_tokens" not in usage
+
+
+def test_unmarked_system_is_not_cached():
+    state = StandinState(StandinConfig(seed=1))
+    usage = state.prompt_cache_usage([{"type": "text", "text": "x" * 9000}], 2300, SONNET)
+    assert usage == {"input_tokens": 2300}
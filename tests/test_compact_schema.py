@@ -0,0 +1,69 @@
+import pytest
+
+from src.components.compact_schema import (
+    CompactSchemaError, compact_question, dump_compact, expand_question, expand_questions
+)
+
+
+def test_expands_mcq_row():
+    question = expand_question(["m", "What is 2 + 2?", "3", "4", "5", "6", "b", "2 + 2 = 4"], 1)
+    assert question == {
+        "question_number": 1,
+        "type": "mcq",
+        "question": "What is 2 + 2?",
+        "options": {"A": "3", "B": "4", "C": "5", "D": "6"},
+        "correct_answer": "B",
+        "explanation": "2 + 2 = 4"
+    }
+
+
+def test_numeric_options_and_answers_are_text():
+    question = expand_question(["m", "Half of 1?", 0.5, 1, 2, 4, "A", None])
+    assert question["options"] == {"A": "0.5", "B": "1", "C": "2", "D": "4"}
+    assert question["explanation"] == ""
+    short = expand_question(["s", "What is 7 x 6?", 42, 2])
+    assert short["sample_answer"] == "42"
+
+
+def test_booleans_are_not_text():
+    with pytest.raises(CompactSchemaError):
+        expand_question(["s", "Is water wet?", True, 1])
+
+
+def test_short_and_long_marks_default():
+    assert expand_question(["s", "Define force.", "A push or pull", "x"])["marks"] == 3
+    assert expand_question(["l", "Explain friction.", "Friction is ...", 0])["marks"] == 6
+    assert expand_question(["l", "Explain friction.", "Friction is ...", "8"])["marks"] == 8
+
+
+@pytest.mark.parametrize("row", [
+    [],
+    ["x", "question", "answer"],
+    ["m", "question", "A", "B", "C", "D", "E"],
+    ["m", "question", "A", "B", "", "D", "A"],
+    ["m", "question", "A", "B", "C"],
+    ["s", "question"],
+    ["s", "  ", "answer"],
+    "not a row",
+])
+def test_rejects_malformed_rows(row):
+    with pytest.raises(CompactSchemaError):
+        expand_question(row)
+
+
+def test_expand_questions_drops_bad_rows_and_numbers_the_rest():
+    questions, rejected = expand_questions([
+        ["s", "First?", "one", 2],
+        ["m", "Broken?"],
+        ["l", "Second?", "two", 5],
+    ])
+    assert rejected == 1
+    assert [question["question_number"] for question in questions] == [1, 2]
+
+
+def test_compact_round_trip():
+    rows = [["m", "Q1?", "a", "b", "c", "d", "C", "because"], ["s", "Q2?", "ans", 3], ["l", "Q3?", "long ans", 6]]
+    questions, rejected = expand_questions(rows)
+    assert rejected == 0
+    assert [compact_question(question) for question in questions] == rows
+    assert dump_compact(questions).startswith('{"q":[["m","Q1?"')
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from src.components import mock_test_creator
+from src.components.curriculum_index import CurriculumIndex
+from src.components.curriculum_snapshot import (
+    CurriculumSnapshot, SnapshotLoader, build, get_curriculum_snapshot, snapshot_key, verify, write_snapshot
+)
+from src.components.curriculum_store import CURRICULUM_DATA_DIR, CurriculumStore
+
+TOPICS = [
+    ("CBSE", 10, "Mathematics", "Quadratic Equations"),
+    ("CBSE", 10, "Mathematics", "quadratic"),
+    ("CBSE", 7, "Science", "Photosynthesis"),
+    ("ICSE", 8, "Mathematics", "Cooking recipes"),
+    ("IB", "Grade 9 (MYP)", "Sciences", "Photosynthesis"),
+    ("IB", "Grade 9 (MYP)", "Sciences", "Poetry"),
+    ("Cambridge IGCSE", 10, "Physics", "Forces and motion"),
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return CurriculumStore(reload_seconds="off").index()
+
+
+@pytest.fixture(scope="module")
+def snapshot_path(tmp_path_factory):
+    return build(str(tmp_path_factory.mktemp("snapshot") / "curriculum.snapshot"))
+
+
+@pytest.fixture
+def snapshot(snapshot_path):
+    snapshot = CurriculumSnapshot(snapshot_path)
+    yield snapshot
+    snapshot.close()
+
+
+def use_source(monkeypatch, snapshot):
+    monkeypatch.setattr(mock_test_creator, "get_curriculum_snapshot", lambda: snapshot)
+
+
+def test_snapshot_matches_the_json_index(snapshot_path, index, snapshot):
+    assert verify(snapshot_path) == []
+    for board, grades in index.subjects_by_board.items():
+        for grade, subjects in grades.items():
+            assert snapshot.subjects(board, grade) == list(index.subjects(board, grade))
+            for subject in subjects:
+                assert snapshot.topics(board, grade, subject) == list(index.topics(board, grade, subject))
+    assert dict(snapshot.subject_keywords) == dict(index.subject_keywords)
+    assert dict(snapshot.totals) == dict(index.totals)
+
+
+def test_lookups_are_the_same_from_either_source(monkeypatch, snapshot):
+    results = []
+    for source in (None, snapshot):
+        use_source(monkeypatch, source)
+        results.append([
+            (
+                mock_test_creator.get_available_subjects(board, grade),
+                mock_test_creator.get_topics_by_board_grade_subject(board, grade, subject),
+                mock_test_creator.get_paper_types_by_board_and_grade(board, grade),
+                mock_test_creator.validate_topic_against_curriculum(board, grade, subject, topic),
+                mock_test_creator.rank_curriculum_topics(board, grade, subject, topic),
+                mock_test_creator.check_topic_relevance(topic, subject),
+            )
+            for board, grade, subject, topic in TOPICS
+        ])
+    assert results[0] == results[1]
+
+
+def test_unknown_keys_are_empty(snapshot):
+    assert snapshot.topics("CBSE", 99, "Mathematics") == []
+    assert snapshot.subjects("Nowhere", 7) == []
+    assert snapshot.keywords("Underwater Basket Weaving") == []
+
+
+def write_single_subject(path, topics):
+    index = CurriculumIndex({"CBSE": {7: ["Mathematics"]}}, {"CBSE": {"Mathematics": {7: topics}}}, {})
+    tables = {
+        "topics": {snapshot_key("cbse", 7, "mathematics"): topics},
+        "subjects": {snapshot_key("cbse", 7): ["Mathematics"]},
+        "keywords": {},
+        "paper_types": {snapshot_key("cbse", 7): []},
+        "meta": {b"keyword_subjects": [], b"totals": [str(index.totals[field]) for field in ("total_boards", "total_subjects", "total_topics")]},
+    }
+    return write_snapshot(tables, path)
+
+
+def test_rebuilt_snapshot_does_not_serve_cached_validations(monkeypatch, tmp_path):
+    path = str(tmp_path / "curriculum.snapshot")
+    use_source(monkeypatch, CurriculumSnapshot(write_single_subject(path, ["Fractions"])))
+    assert mock_test_creator.validate_topic_against_curriculum("CBSE", 7, "Mathematics", "Fractions") == (True, ["Fractions"])
+
+    use_source(monkeypatch, CurriculumSnapshot(write_single_subject(path, ["Decimals"])))
+    assert mock_test_creator.validate_topic_against_curriculum("CBSE", 7, "Mathematics", "Fractions") == (False, ["Decimals"])
+    # An entry with no strings reads back empty rather than as one empty string
+    assert CurriculumSnapshot(path).paper_types("CBSE", 7) == []
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not.snapshot"
+    path.write_bytes(b"{}")
+    with pytest.raises(ValueError):
+        CurriculumSnapshot(str(path))
+
+
+def test_each_path_gets_its_own_snapshot(tmp_path):
+    first = build(str(tmp_path / "first.snapshot"))
+    second = build(str(tmp_path / "second.snapshot"))
+    assert get_curriculum_snapshot(first).path == first
+    assert get_curriculum_snapshot(second).path == second
+    assert get_curriculum_snapshot(first).path == first
+
+
+def test_stale_snapshot_is_not_served(tmp_path):
+    data_dir = str(tmp_path / "curriculum_data")
+    shutil.copytree(CURRICULUM_DATA_DIR, data_dir, ignore=shutil.ignore_patterns("*.snapshot"))
+    path = build(str(tmp_path / "curriculum.snapshot"), data_dir)
+    loader = SnapshotLoader(path, data_dir, reload_seconds=0)
+    assert loader.get() is not None
+
+    board_file = os.path.join(data_dir, "boards", "cbse.json")
+    with open(board_file, encoding="utf-8") as data_file:
+        data = json.load(data_file)
+    data["topics"]["Mathematics"]["7"].append("Tessellations")
+    with open(board_file, "w", encoding="utf-8") as data_file:
+        json.dump(data, data_file)
+    assert loader.get() is None
+
+    build(path, data_dir)
+    assert loader.get().topics("CBSE", 7, "Mathematics")[-1] == "Tessellations"
+
+
+def single_subject_index(topics, digest):
+    return CurriculumIndex({"CBSE": {7: ["Mathematics"]}}, {"CBSE": {"Mathematics": {7: topics}}}, {},
+                           {"cbse": digest, "keywords": "k"})
+
+
+def test_validation_racing_a_reload_is_not_cached_under_the_new_data(monkeypatch):
+    # The old index is taken just before a reload bumps the board's epoch, so its answer is
+    # stored under the new epoch; the next call with the new index must not be served it
+    monkeypatch.setattr(mock_test_creator, "get_curriculum_source", lambda: single_subject_index(["Fractions"], "old"))
+    assert mock_test_creator.validate_topic_against_curriculum("CBSE", 7, "Mathematics", "Fractions")[0]
+
+    monkeypatch.setattr(mock_test_creator, "get_curriculum_source", lambda: single_subject_index(["Decimals"], "new"))
+    assert mock_test_creator.validate_topic_against_curriculum("CBSE", 7, "Mathematics", "Fractions") == (False, ["Decimals"])
@@ -0,0 +1,67 @@
+import threading
+
+from src.components.generation_jobs import JobRegistry, PARSED, CANCELLED
+
+
+def test_speculative_jobs_do_not_take_regular_workers():
+    registry = JobRegistry(max_workers=1, speculative_workers=1)
+    release = threading.Event()
+
+    def blocking(job):
+        release.wait(5)
+        return {"questions": []}, None, None
+
+    speculative = registry.submit(("sel",), 10, blocking, speculative=True)
+    regular = registry.submit(("sel",), 10, lambda job: ({"questions": [{}]}, None, None))
+    regular.future.result(timeout=2)
+    assert regular.status() == PARSED
+    assert not speculative.is_finished()
+    release.set()
+    speculative.future.result(timeout=2)
+
+
+def test_cancel_before_start():
+    registry = JobRegistry(max_workers=1, speculative_workers=1)
+    release = threading.Event()
+
+    def blocking(job):
+        release.wait(5)
+        return {"questions": []}, None, None
+
+    running = registry.submit(("sel",), 10, blocking, speculative=True)
+    queued = registry.submit(("sel",), 10, lambda job: ({"questions": []}, None, None), speculative=True)
+    queued.cancel()
+    release.set()
+    running.future.result(timeout=2)
+    assert running.status() == PARSED
+    assert queued.status() == CANCELLED
+
+
+def test_cancelled_single_flight_follower_is_cancelled(monkeypatch, tmp_path):
+    from src.components import mock_test_creator
+    from src.components.paper_cache import PaperCache
+
+    leader_started = threading.Event()
+    release_leader = threading.Event()
+
+    def slow_paper(*args, **kwargs):
+        leader_started.set()
+        release_leader.wait(5)
+        return {"test_info": {}, "questions": [{"question": "Q"}]}, None, None
+
+    monkeypatch.setattr(mock_test_creator, "CLAUDE_API_KEY", "sk-test")
+    monkeypatch.setattr(mock_test_creator, "generate_paper", slow_paper)
+    paper_cache = PaperCache(str(tmp_path))
+    monkeypatch.setattr(mock_test_creator, "get_paper_cache", lambda: paper_cache)
+
+    selection = ("CBSE", 7, "Mathematics", "Fractions", "Unit Test (30 Questions)", False)
+    leader = mock_test_creator.submit_generation_job(*selection, force_refresh=True)
+    assert leader_started.wait(2)
+    follower = mock_test_creator.submit_generation_job(*selection, force_refresh=True)
+    follower.cancel()
+    follower.future.result(timeout=2)
+    assert follower.status() == CANCELLED
+
+    release_leader.set()
+    leader.future.result(timeout=2)
+    assert leader.status() == PARSED
@@ -0,0 +1,53 @@
+import json
+import os
+import time
+
+from src.components.paper_cache import PRODUCTION_API_URL, PaperCache, cache_dir_for_api, make_cache_key
+
+PAPER = {"test_info": {"topic": "Fractions"}, "questions": [{"question": "What is 1/2 + 1/4?"}]}
+
+
+def test_only_the_real_api_uses_the_shared_directory():
+    assert cache_dir_for_api(PRODUCTION_API_URL, ".paper_cache") == ".paper_cache"
+    assert cache_dir_for_api("https://api.anthropic.com/v1/messages/batches", ".paper_cache") == ".paper_cache"
+    assert cache_dir_for_api("http://127.0.0.1:8765/v1/messages", ".paper_cache") == ".paper_cache-127-0-0-1-8765"
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = PaperCache(str(tmp_path))
+    key = make_cache_key("CBSE", 7, "Mathematics", "Fractions", "Unit Test", "model", "v1")
+    assert cache.get(key) is None
+    cache.put(key, PAPER)
+    assert cache.get(key) == PAPER
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_contains_has_no_side_effects(tmp_path):
+    cache = PaperCache(str(tmp_path), ttl_seconds=60)
+    cache.put("fresh", PAPER)
+    path = os.path.join(str(tmp_path), "stale.json")
+    with open(path, "w", encoding="utf-8") as cache_file:
+        json.dump({"created_at": time.time() - 3600, "test_data": PAPER}, cache_file)
+
+    assert cache.contains("fresh")
+    assert not cache.contains("stale")
+    assert not cache.contains("missing")
+    stats = cache.get_stats()
+    assert stats["hits"] == stats["misses"] == stats["expired"] == 0
+    assert os.path.exists(path)
+
+
+def test_cache_key_normalizes_inputs():
+    assert (make_cache_key("CBSE", 7, "Mathematics", "  Fractions ", "Unit Test", "model", "v1")
+            == make_cache_key("cbse", "7", "mathematics", "fractions", "unit  test", "model", "v1"))
+
+
+def test_cache_key_isolates_model_prompt_version_and_api():
+    base = ("CBSE", 7, "Mathematics", "Fractions", "Unit Test")
+    key = make_cache_key(*base, "model", "v1")
+    assert make_cache_key(*base, "model", "v1", PRODUCTION_API_URL) == key
+    assert make_cache_key(*base, "other-model", "v1") != key
+    assert make_cache_key(*base, "model", "v2") != key
+    standin = make_cache_key(*base, "model", "v1", "http://127.0.0.1:8765/v1/messages")
+    assert standin != key
+    assert make_cache_key(*base, "model", "v1", "http://127.0.0.1:9000/v1/messages") not in (key, standin)
@@ -0,0 +1,16 @@
+from src.components import perf_timing
+
+
+def test_failed_metrics_bind_is_tried_once(monkeypatch):
+    attempts = []
+
+    def port_taken(address, handler):
+        attempts.append(address)
+        raise OSError("Address already in use")
+
+    monkeypatch.setattr(perf_timing, "_metrics_server", None)
+    monkeypatch.setattr(perf_timing, "_metrics_bind_failed", False)
+    monkeypatch.setattr(perf_timing, "ThreadingHTTPServer", port_taken)
+    assert perf_timing.start_metrics_endpoint("127.0.0.1", 9464) is None
+    assert perf_timing.start_metrics_endpoint("127.0.0.1", 9464) is None
+    assert len(attempts) == 1
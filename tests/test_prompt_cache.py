@@ -0,0 +1,37 @@
+from src.components import mock_test_creator
+from src.components.model_router import MODEL_TIERS
+from src.components.prompt_cache import (
+    PromptCacheRecorder, cached_system_blocks, estimate_prompt_tokens, prompt_cache_min_tokens
+)
+
+
+def test_min_tokens_by_model_family():
+    assert prompt_cache_min_tokens("claude-3-5-sonnet-20241022") == 1024
+    assert prompt_cache_min_tokens("claude-3-5-haiku-20241022") == 2048
+    assert prompt_cache_min_tokens("some-future-model") == 1024
+
+
+def test_breakpoint_only_above_minimum():
+    short = cached_system_blocks("x" * 100, "claude-3-5-sonnet-20241022")
+    assert "cache_control" not in short[0]
+    long = cached_system_blocks("x" * 4096 * 2, "claude-3-5-haiku-20241022")
+    assert long[0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_every_standard_tier_prefix_is_cacheable():
+    index = mock_test_creator.get_curriculum_index()
+    min_tokens = prompt_cache_min_tokens(MODEL_TIERS["standard"])
+    for board, grades in index.subjects_by_board.items():
+        for grade, subjects in grades.items():
+            for subject in subjects:
+                system_prompt = mock_test_creator.build_system_prompt(board, grade, subject)
+                assert estimate_prompt_tokens(system_prompt) >= min_tokens, (board, grade, subject)
+
+
+def test_recorder_separates_prefixes_below_minimum():
+    recorder = PromptCacheRecorder()
+    recorder.record({"input_tokens": 900, "cache_read_input_tokens": 1200})
+    recorder.record({"input_tokens": 900}, cacheable=False)
+    summary = recorder.summary()
+    assert summary["cache_reads"] == 1
+    assert summary["below_minimum"] == 1
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from src.components import mock_test_creator
+from src.components.circuit_breaker import CircuitBreaker
+from src.components.rate_limiter import RateLimiter, RateLimitCancelled, RateLimitTimeout
+
+
+def test_grants_within_budget_and_refunds_unused_tokens():
+    limiter = RateLimiter(rpm=60, tpm=1000)
+    reservation = limiter.acquire(600)
+    assert limiter.get_stats()["tokens_available"] == 400
+    reservation.reconcile(100)
+    reservation.reconcile(0)
+    assert limiter.get_stats()["tokens_available"] == 900
+
+
+def test_times_out_when_the_wait_is_too_long():
+    limiter = RateLimiter(rpm=60, tpm=1000)
+    limiter.acquire(1000)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(1000, max_wait=1)
+    assert limiter.get_stats()["queue_length"] == 0
+
+
+def test_cancel_leaves_the_queue():
+    limiter = RateLimiter(rpm=60, tpm=1000)
+    limiter.acquire(1000)
+    cancel_event = threading.Event()
+    errors = []
+
+    def wait():
+        try:
+            limiter.acquire(1000, cancel_event=cancel_event)
+        except RateLimitCancelled as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.2)
+    assert limiter.get_stats()["queue_length"] == 1
+    cancel_event.set()
+    waiter.join(timeout=2)
+    assert not waiter.is_alive()
+    assert len(errors) == 1
+    stats = limiter.get_stats()
+    assert stats["queue_length"] == 0
+    assert stats["cancelled"] == 1
+    assert stats["granted"] == 1
+
+
+def test_cancelled_request_behind_the_head_does_not_block_the_next():
+    limiter = RateLimiter(rpm=60, tpm=1000)
+    limiter.acquire(1000)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(RateLimitCancelled):
+        limiter.acquire(10, cancel_event=cancel_event)
+    assert limiter.get_stats()["queue_length"] == 0
+
+
+def test_request_cancelled_at_its_turn_is_never_sent(monkeypatch):
+    cancel_event = threading.Event()
+    limiter = RateLimiter(rpm=60, tpm=100000)
+    breaker = CircuitBreaker()
+
+    class CancellingLimiter:
+        def acquire(self, estimated_tokens, on_wait=None, cancel_event=None):
+            reservation = limiter.acquire(estimated_tokens)
+            cancel_event.set()
+            return reservation
+
+    class NoClient:
+        def post(self, *args, **kwargs):
+            raise AssertionError("a cancelled request must not be sent")
+
+    monkeypatch.setattr(mock_test_creator, "get_rate_limiter", lambda: CancellingLimiter())
+    monkeypatch.setattr(mock_test_creator, "get_claude_breaker", lambda: breaker)
+    monkeypatch.setattr(mock_test_creator, "get_claude_client", lambda: NoClient())
+
+    with pytest.raises(mock_test_creator.GenerationCancelled):
+        mock_test_creator.request_questions("prompt", max_tokens=1000, cancel_event=cancel_event)
+    assert limiter.get_stats()["tokens_available"] == 100000
@@ -0,0 +1,65 @@
+import pytest
+import requests
+
+from src.components import mock_test_creator
+from src.components.circuit_breaker import CircuitBreaker
+
+
+class Reservation:
+    def reconcile(self, tokens):
+        pass
+
+
+class Limiter:
+    def acquire(self, estimated_tokens, on_wait=None, cancel_event=None):
+        return Reservation()
+
+
+class Client:
+    def __init__(self, post):
+        self.post = post
+
+
+class BrokenStream:
+    status_code = 200
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        yield 'data: {"type": "message_start", "message": {"usage": {"input_tokens": 10}}}'
+        raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+
+class UsageRecorder:
+    def __init__(self):
+        self.outcomes = []
+
+    def record(self, model, usage, seconds, outcome, **labels):
+        self.outcomes.append(outcome)
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    recorder = UsageRecorder()
+    monkeypatch.setattr(mock_test_creator, "get_claude_breaker", lambda: CircuitBreaker())
+    monkeypatch.setattr(mock_test_creator, "get_rate_limiter", lambda: Limiter())
+    monkeypatch.setattr(mock_test_creator, "get_usage_store", lambda: recorder)
+    return recorder
+
+
+def raise_invalid_url(*args, **kwargs):
+    raise requests.exceptions.InvalidURL("No host supplied")
+
+
+def test_request_errors_that_are_not_retried_come_back_in_the_tuple(monkeypatch, usage):
+    monkeypatch.setattr(mock_test_creator, "get_claude_client", lambda: Client(raise_invalid_url))
+    parsed, error, content = mock_test_creator.request_questions("prompt", max_tokens=100)
+    assert parsed is None and content is None
+    assert error.startswith("Request failed:")
+    assert usage.outcomes == ["request_error"]
+
+
+def test_connection_lost_mid_stream_is_a_request_error(monkeypatch, usage):
+    monkeypatch.setattr(mock_test_creator, "get_claude_client", lambda: Client(lambda *args, **kwargs: BrokenStream()))
+    parsed, error, _ = mock_test_creator.request_questions("prompt", max_tokens=100, stream=True)
+    assert parsed is None
+    assert error.startswith("Request failed:")
+    assert usage.outcomes == ["request_error"]
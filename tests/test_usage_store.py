@@ -0,0 +1,24 @@
+import pytest
+
+from src.components.usage_store import UsageStore, call_cost
+
+SONNET = "claude-3-5-sonnet-20241022"
+
+
+def test_call_cost_prices_every_token_kind():
+    usage = {"input_tokens": 1_000_000, "output_tokens": 1_000_000,
+             "cache_creation_input_tokens": 1_000_000, "cache_read_input_tokens": 1_000_000}
+    assert call_cost(SONNET, usage) == pytest.approx(3.00 + 15.00 + 3.75 + 0.30)
+    assert call_cost(SONNET, usage, batch=True) == pytest.approx((3.00 + 15.00 + 3.75 + 0.30) / 2)
+
+
+def test_explicit_nulls_count_as_zero(tmp_path):
+    usage = {"input_tokens": 1000, "output_tokens": 500,
+             "cache_creation_input_tokens": None, "cache_read_input_tokens": None}
+    assert call_cost(SONNET, usage) == pytest.approx((1000 * 3.00 + 500 * 15.00) / 1_000_000)
+
+    store = UsageStore(str(tmp_path / "usage.sqlite3"))
+    store.record(SONNET, usage, 1.5, "ok", questions=5, labels={"paper_id": "p1", "paper_type": "Unit Test"})
+    totals = store.totals()
+    assert totals["calls"] == 1
+    assert totals["input_tokens"] == 1000
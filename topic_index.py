@@ -0,0 +1,126 @@
+import math
+import re
+from collections import defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Longest first; a suffix is only stripped when at least three characters remain
+STEM_SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "es", "ed", "s")
+# Ranking weights: a shared token, a shared stem only, a query word inside the topic
+# (e.g. "photo" in "photosynthesis") and the whole query containing or inside the topic
+TOKEN_WEIGHT = 1.0
+STEM_WEIGHT = 0.6
+PARTIAL_WEIGHT = 0.3
+PHRASE_WEIGHT = 1.5
+# Query words shorter than this never count as partial matches, as in the original validation loop
+MIN_WORD_LENGTH = 3
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def stem(token):
+    """Light suffix stripping so "reactions", "reacting" and "reacted" share a stem"""
+    for suffix in STEM_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return token
+
+
+class TopicIndex:
+    """Inverted index over the curriculum topics of one (board, grade, subject)
+
+    Tokens and stems map to topics for ranking. The original validation's
+    substring rules are answered from the index too, with work that follows
+    the query rather than the topic list:
+
+    - a query word inside a topic: query words never contain whitespace, so the
+      word sits inside one whitespace-separated segment of the topic, and every
+      fragment of every segment is a key of self._fragments;
+    - a topic inside the query: one regex pass over the query finds the longest
+      topic starting at each position, and self._prefixes adds the shorter
+      topics that are prefixes of it (any topic matching there is one of those);
+    - the query inside a topic: each of its long words must then be a fragment
+      of that topic, so only topics holding all of them are checked.
+    """
+
+    def __init__(self, topics):
+        self.topics = tuple(topics)
+        self._clean = [str(topic).lower() for topic in self.topics]
+        self._tokens = defaultdict(set)
+        self._stems = defaultdict(set)
+        self._fragments = defaultdict(set)
+        by_text = defaultdict(set)
+        for topic_id, topic_clean in enumerate(self._clean):
+            by_text[topic_clean].add(topic_id)
+            for token in tokenize(topic_clean):
+                self._tokens[token].add(topic_id)
+                self._stems[stem(token)].add(topic_id)
+            for segment in topic_clean.split():
+                for start in range(len(segment) - MIN_WORD_LENGTH + 1):
+                    for end in range(start + MIN_WORD_LENGTH, len(segment) + 1):
+                        self._fragments[segment[start:end]].add(topic_id)
+        # Tuples rather than sets: there are tens of fragments per topic and most belong to one topic
+        self._fragments = {fragment: tuple(sorted(ids)) for fragment, ids in self._fragments.items()}
+        # Longest first, so at each position the regex reports the longest topic there
+        texts = sorted(by_text, key=len, reverse=True)
+        self._phrase_pattern = re.compile("(?=(" + "|".join(re.escape(text) for text in texts) + "))") if texts else None
+        self._prefixes = {
+            text: set().union(*(ids for other, ids in by_text.items() if text.startswith(other)))
+            for text in texts
+        }
+
+    def _idf(self, postings):
+        return math.log(1 + len(self.topics) / len(postings))
+
+    def _long_words(self, topic_clean):
+        return [word for word in topic_clean.split() if len(word) >= MIN_WORD_LENGTH]
+
+    def _inside_query(self, topic_clean):
+        """Topic ids whose lowercased text occurs in the query"""
+        found = set()
+        if self._phrase_pattern is not None:
+            for match in self._phrase_pattern.finditer(topic_clean):
+                found |= self._prefixes[match.group(1)]
+        return found
+
+    def _query_inside(self, topic_clean, long_words):
+        """Topic ids whose lowercased text contains the whole query"""
+        if not long_words:
+            # Only short words (or none): a few characters, checked against each topic directly
+            return {topic_id for topic_id, text in enumerate(self._clean) if topic_clean in text}
+        postings = [self._fragments.get(word, ()) for word in long_words]
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {topic_id for topic_id in candidates if topic_clean in self._clean[topic_id]}
+
+    def any_match(self, topic):
+        """The original validation's decision: does any curriculum topic match?"""
+        topic_clean = str(topic).lower().strip()
+        long_words = self._long_words(topic_clean)
+        if any(word in self._fragments for word in long_words):
+            return True
+        if self._phrase_pattern is not None and self._phrase_pattern.search(topic_clean):
+            return True
+        # With a long word present, the query inside a topic would have matched its fragments above
+        return not long_words and any(topic_clean in text for text in self._clean)
+
+    def rank(self, topic, limit=None):
+        """[(curriculum topic, score), ...] best first; ties keep curriculum order"""
+        topic_clean = str(topic).lower().strip()
+        long_words = self._long_words(topic_clean)
+        scores = defaultdict(float)
+        for token in set(tokenize(topic_clean)):
+            token_hits = self._tokens.get(token, set())
+            for topic_id in token_hits:
+                scores[topic_id] += TOKEN_WEIGHT * self._idf(token_hits)
+            stem_hits = self._stems.get(stem(token), set())
+            for topic_id in stem_hits - token_hits:
+                scores[topic_id] += STEM_WEIGHT * self._idf(stem_hits)
+        for topic_id in self._inside_query(topic_clean) | self._query_inside(topic_clean, long_words):
+            scores[topic_id] += PHRASE_WEIGHT
+        for topic_id in set().union(*(self._fragments.get(word, ()) for word in set(long_words))):
+            scores[topic_id] += PARTIAL_WEIGHT
+        ranked = sorted(scores, key=lambda topic_id: (-scores[topic_id], topic_id))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(self.topics[topic_id], round(scores[topic_id], 3)) for topic_id in ranked]
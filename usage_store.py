@@ -0,0 +1,180 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding one row per Claude call; "off" disables recording
+USAGE_DB_FILE = os.environ.get("USAGE_DB_FILE", ".usage.sqlite3")
+
+# USD per million tokens: (input, output, cache write, cache read)
+MODEL_PRICES = {
+    "claude-3-5-sonnet-20241022": (3.00, 15.00, 3.75, 0.30),
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 1.00, 0.08)
+}
+# Models missing from the table are priced like the standard tier, so costs are never silently zero
+DEFAULT_PRICES = MODEL_PRICES["claude-3-5-sonnet-20241022"]
+# Message Batches are billed at half price
+BATCH_DISCOUNT = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    paper_id TEXT,
+    kind TEXT NOT NULL,
+    board TEXT,
+    grade TEXT,
+    subject TEXT,
+    paper_type TEXT,
+    model TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_write_tokens INTEGER NOT NULL DEFAULT 0,
+    cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+    questions INTEGER NOT NULL DEFAULT 0,
+    latency REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    cost REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS api_calls_timestamp ON api_calls (timestamp);
+CREATE INDEX IF NOT EXISTS api_calls_paper_type ON api_calls (paper_type);
+"""
+
+
+def call_cost(model, usage, batch=False):
+    """USD cost of one call from its usage block"""
+    input_price, output_price, cache_write_price, cache_read_price = MODEL_PRICES.get(model, DEFAULT_PRICES)
+    usage = usage or {}
+    # The API may send explicit nulls (e.g. "cache_creation_input_tokens": null)
+    cost = ((usage.get("input_tokens") or 0) * input_price
+            + (usage.get("output_tokens") or 0) * output_price
+            + (usage.get("cache_creation_input_tokens") or 0) * cache_write_price
+            + (usage.get("cache_read_input_tokens") or 0) * cache_read_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+class UsageStore:
+    """Per-call tokens, cost, latency, model and outcome, with aggregate views
+
+    One connection is shared by every session and worker thread; writes are
+    serialized by the lock and a failing database never fails a generation.
+    """
+
+    def __init__(self, db_file=USAGE_DB_FILE):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._connection = None
+        self.enabled = bool(db_file) and db_file.lower() != "off"
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def record(self, model, usage, latency, outcome, questions=0, labels=None, kind="generation", batch=False):
+        """Store one call; labels carries paper_id, board, grade, subject and paper_type"""
+        if not self.enabled:
+            return
+        labels = labels or {}
+        usage = usage or {}
+        row = (
+            time.time(), labels.get("paper_id"), kind, labels.get("board"),
+            str(labels["grade"]) if labels.get("grade") is not None else None,
+            labels.get("subject"), labels.get("paper_type"), model,
+            usage.get("input_tokens") or 0, usage.get("output_tokens") or 0,
+            usage.get("cache_creation_input_tokens") or 0, usage.get("cache_read_input_tokens") or 0,
+            questions, round(latency, 4), outcome, call_cost(model, usage, batch)
+        )
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT INTO api_calls (timestamp, paper_id, kind, board, grade, subject, paper_type, model, "
+                    "input_tokens, output_tokens, cache_write_tokens, cache_read_tokens, questions, latency, outcome, cost) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                )
+                connection.commit()
+        except sqlite3.Error as e:
+            logger.warning("could not record API usage in %s: %s", self.db_file, e)
+
+    def _query(self, sql, params=()):
+        if not self.enabled:
+            return []
+        try:
+            with self._lock:
+                return [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+        except sqlite3.Error as e:
+            logger.warning("could not read API usage from %s: %s", self.db_file, e)
+            return []
+
+    def totals(self, since=0):
+        rows = self._query(
+            "SELECT COUNT(*) AS calls, COUNT(DISTINCT paper_id) AS papers, COALESCE(SUM(input_tokens), 0) AS input_tokens, "
+            "COALESCE(SUM(output_tokens), 0) AS output_tokens, COALESCE(SUM(cost), 0) AS cost "
+            "FROM api_calls WHERE timestamp >= ?", (since,)
+        )
+        totals = rows[0] if rows else {"calls": 0, "papers": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+        totals["cost"] = round(totals["cost"], 4)
+        return totals
+
+    def by_paper_type(self, since=0):
+        """Tokens per question, cost and latency per paper for each paper type, most expensive first"""
+        rows = self._query(
+            "SELECT paper_type, model, COUNT(*) AS calls, COUNT(DISTINCT paper_id) AS papers, "
+            "SUM(questions) AS questions, SUM(input_tokens + cache_write_tokens + cache_read_tokens) AS input_tokens, "
+            "SUM(output_tokens) AS output_tokens, SUM(cost) AS cost, AVG(latency) AS avg_latency, MAX(latency) AS max_latency, "
+            "SUM(CASE WHEN outcome NOT IN ('ok', 'truncated', 'rejected') THEN 1 ELSE 0 END) AS failed_calls "
+            "FROM api_calls WHERE timestamp >= ? AND kind != 'ab_test' GROUP BY paper_type, model", (since,)
+        )
+        return sorted((self._per_unit(row) for row in rows), key=lambda row: row["cost_per_paper"], reverse=True)
+
+    def by_board(self, since=0):
+        """The same breakdown per board and grade, for tuning limits per board"""
+        rows = self._query(
+            "SELECT board, grade, COUNT(*) AS calls, COUNT(DISTINCT paper_id) AS papers, SUM(questions) AS questions, "
+            "SUM(input_tokens + cache_write_tokens + cache_read_tokens) AS input_tokens, SUM(output_tokens) AS output_tokens, "
+            "SUM(cost) AS cost, AVG(latency) AS avg_latency, MAX(latency) AS max_latency, "
+            "SUM(CASE WHEN outcome NOT IN ('ok', 'truncated', 'rejected') THEN 1 ELSE 0 END) AS failed_calls "
+            "FROM api_calls WHERE timestamp >= ? AND kind != 'ab_test' GROUP BY board, grade ORDER BY board, grade", (since,)
+        )
+        return [self._per_unit(row) for row in rows]
+
+    def per_hour(self, since=0):
+        """Calls, papers, questions, tokens and cost per hour (local time), newest first"""
+        rows = self._query(
+            "SELECT strftime('%Y-%m-%d %H:00', timestamp, 'unixepoch', 'localtime') AS hour, COUNT(*) AS calls, "
+            "COUNT(DISTINCT paper_id) AS papers, SUM(questions) AS questions, SUM(output_tokens) AS output_tokens, "
+            "SUM(cost) AS cost, AVG(latency) AS avg_latency "
+            "FROM api_calls WHERE timestamp >= ? GROUP BY hour ORDER BY hour DESC", (since,)
+        )
+        for row in rows:
+            row["cost"] = round(row["cost"] or 0.0, 4)
+            row["avg_latency"] = round(row["avg_latency"] or 0.0, 3)
+        return rows
+
+    @staticmethod
+    def _per_unit(row):
+        questions = row.get("questions") or 0
+        papers = row.get("papers") or 0
+        row.update({
+            "input_tokens_per_question": round(row["input_tokens"] / questions, 1) if questions else 0.0,
+            "output_tokens_per_question": round(row["output_tokens"] / questions, 1) if questions else 0.0,
+            "cost_per_paper": round(row["cost"] / papers, 4) if papers else 0.0,
+            "cost": round(row["cost"] or 0.0, 4),
+            "avg_latency": round(row["avg_latency"] or 0.0, 3),
+            "max_latency": round(row["max_latency"] or 0.0, 3)
+        })
+        return row
+
+
+_usage_store = UsageStore()
+
+
+def get_usage_store():
+    return _usage_store